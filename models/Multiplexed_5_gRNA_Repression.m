@@ -1,10 +1,21 @@
-function [time_interval, species_names, y_out, y] = Multiplexed_5_gRNA_Repression(time_span, parameters, initial, step)
+function [time_interval, species_names, y_out, y] = Multiplexed_5_gRNA_Repression(time_span, parameters, initial, step, parameter_index)
 % time_span is the hours values [start, stop]
-% parameters is a Map of names to numbers (e.g., rate constants, decay rates, Hill coefficients)
+% parameters is a Map of names to numbers (e.g., rate constants, decay rates, Hill coefficients),
+%   or a numeric vector of parameter values indexed by parameter_index
 % initial is a Map of variable names to initial values
 % step is the number of hours between samples in output; defaults to 1
+% parameter_index is a Map of parameter names to their index in a numeric parameters vector
 % Returns vector of time, matrix of output levels at those time points, matrix of all species
-    if nargin < 4, step = 1; end
+    if nargin < 4 || isempty(step), step = 1; end
+
+    % Resolve the parameters to a vector in the order used by the ODE (once per solve)
+    parameter_names = {'Cas_gRNA_binding', 'K_R', 'alpha_p_GFP', 'alpha_p_dCas9', 'alpha_r_gRNA1', 'alpha_r_gRNA2', 'alpha_r_gRNA3', 'alpha_r_gRNA4', 'alpha_r_gRNA5', 'delta_g', 'lambda', 'n'};
+    if nargin < 5
+        p = cell2mat(values(parameters, parameter_names));
+    else
+        p = parameters(cell2mat(values(parameter_index, parameter_names)));
+    end
+    p = [reshape(p, 1, []), invariants(p)]; % Append the parameter-only subexpressions
     
     % Define names for input/output variable indexes
     GFP = 1;
@@ -18,9 +29,15 @@ function [time_interval, species_names, y_out, y] = Multiplexed_5_gRNA_Repressio
 
     % Set the species names (in the same order as in the ODE)
     species_names = ["GFP", "V1", "V2", "dCas9", "dCas9_gRNA1", "dCas9_gRNA2", "dCas9_gRNA3", "dCas9_gRNA4", "dCas9_gRNA5", "gRNA1", "gRNA2", "gRNA3", "gRNA4", "gRNA5"];
+
+    % Set the Jacobian and its sparsity pattern (row and column of each non-zero entry)
+    j_rows = [1, 1, 1, 1, 1, 1, 1, 2, 3, 4, 4, 4, 4, 4, 4, 4, 5, 5, 5, 6, 6, 6, 7, 7, 7, 8, 8, 8, 9, 9, 9, 10, 10, 10, 11, 11, 11, 12, 12, 12, 13, 13, 13, 14, 14, 14];
+    j_cols = [1, 3, 5, 6, 7, 8, 9, 2, 3, 3, 4, 10, 11, 12, 13, 14, 4, 5, 10, 4, 6, 11, 4, 7, 12, 4, 8, 13, 4, 9, 14, 2, 4, 10, 2, 4, 11, 2, 4, 12, 2, 4, 13, 2, 4, 14];
+    options = odeset('Jacobian', @(t,x) jacobian(t, x, p, j_rows, j_cols), ...
+        'JPattern', sparse(j_rows, j_cols, 1, 14, 14));
     
     % Run ODE
-    solution = ode15s(@(t,x) diff_eq(t, x, parameters, species_names), time_span, y0);
+    solution = ode15s(@(t,x) diff_eq(t, x, p), time_span, y0, options);
     
     % Evaluate species levels at given times
     time_interval = time_span(1):step:time_span(end);
@@ -29,42 +46,198 @@ function [time_interval, species_names, y_out, y] = Multiplexed_5_gRNA_Repressio
 end
 
 % ODE differential function
-function dx=diff_eq(t, x, parameters, species_names)
-    % Unpack parameters from parameter map (and the i_matrix)
-    Cas_gRNA_binding = parameters('Cas_gRNA_binding');
-	K_R = parameters('K_R');
-	alpha_p_GFP = parameters('alpha_p_GFP');
-	alpha_p_dCas9 = parameters('alpha_p_dCas9');
-	alpha_r_gRNA1 = parameters('alpha_r_gRNA1');
-	alpha_r_gRNA2 = parameters('alpha_r_gRNA2');
-	alpha_r_gRNA3 = parameters('alpha_r_gRNA3');
-	alpha_r_gRNA4 = parameters('alpha_r_gRNA4');
-	alpha_r_gRNA5 = parameters('alpha_r_gRNA5');
-	delta_g = parameters('delta_g');
-	lambda = parameters('lambda');
-	n = parameters('n');
-    
+function dx=diff_eq(t, x, p)
+    % Unpack parameters from parameter vector (and the i_matrix)
+    Cas_gRNA_binding = p(1);
+	K_R = p(2);
+	alpha_p_GFP = p(3);
+	alpha_p_dCas9 = p(4);
+	alpha_r_gRNA1 = p(5);
+	alpha_r_gRNA2 = p(6);
+	alpha_r_gRNA3 = p(7);
+	alpha_r_gRNA4 = p(8);
+	alpha_r_gRNA5 = p(9);
+	delta_g = p(10);
+	lambda = p(11);
+	n = p(12);
+	inv_1 = p(13);
+	inv_2 = p(14);
+	inv_3 = p(15);
+	inv_4 = p(16);
+	inv_5 = p(17);
+	inv_6 = p(18);
 
     % Unpack individual species from x
     x = max(1e-12,real(x)); % Truncate values just above zero
-    sp = packSpeciesStruct(species_names, x);
+    sp_GFP = x(1);
+	sp_V1 = x(2);
+	sp_V2 = x(3);
+	sp_dCas9 = x(4);
+	sp_dCas9_gRNA1 = x(5);
+	sp_dCas9_gRNA2 = x(6);
+	sp_dCas9_gRNA3 = x(7);
+	sp_dCas9_gRNA4 = x(8);
+	sp_dCas9_gRNA5 = x(9);
+	sp_gRNA1 = x(10);
+	sp_gRNA2 = x(11);
+	sp_gRNA3 = x(12);
+	sp_gRNA4 = x(13);
+	sp_gRNA5 = x(14);
 
     % Compute derivative for each species
-    d_V2 = - lambda*sp.V2;
-	d_gRNA1 =  alpha_r_gRNA1*sp.V1 - Cas_gRNA_binding*sp.gRNA1*sp.dCas9 - delta_g*sp.gRNA1 - lambda*sp.gRNA1;
-	d_dCas9_gRNA1 =  Cas_gRNA_binding*sp.gRNA1*sp.dCas9 - lambda*sp.dCas9_gRNA1;
-	d_gRNA2 =  alpha_r_gRNA2*sp.V1 - Cas_gRNA_binding*sp.gRNA2*sp.dCas9 - delta_g*sp.gRNA2 - lambda*sp.gRNA2;
-	d_dCas9_gRNA2 =  Cas_gRNA_binding*sp.gRNA2*sp.dCas9 - lambda*sp.dCas9_gRNA2;
-	d_gRNA3 =  alpha_r_gRNA3*sp.V1 - Cas_gRNA_binding*sp.gRNA3*sp.dCas9 - delta_g*sp.gRNA3 - lambda*sp.gRNA3;
-	d_dCas9_gRNA3 =  Cas_gRNA_binding*sp.gRNA3*sp.dCas9 - lambda*sp.dCas9_gRNA3;
-	d_gRNA4 =  alpha_r_gRNA4*sp.V1 - Cas_gRNA_binding*sp.gRNA4*sp.dCas9 - delta_g*sp.gRNA4 - lambda*sp.gRNA4;
-	d_dCas9_gRNA4 =  Cas_gRNA_binding*sp.gRNA4*sp.dCas9 - lambda*sp.dCas9_gRNA4;
-	d_gRNA5 =  alpha_r_gRNA5*sp.V1 - Cas_gRNA_binding*sp.gRNA5*sp.dCas9 - delta_g*sp.gRNA5 - lambda*sp.gRNA5;
-	d_dCas9_gRNA5 =  Cas_gRNA_binding*sp.gRNA5*sp.dCas9 - lambda*sp.dCas9_gRNA5;
-	d_dCas9 =  alpha_p_dCas9*sp.V2 - Cas_gRNA_binding*sp.gRNA1*sp.dCas9 - Cas_gRNA_binding*sp.gRNA2*sp.dCas9 - Cas_gRNA_binding*sp.gRNA3*sp.dCas9 - Cas_gRNA_binding*sp.gRNA4*sp.dCas9 - Cas_gRNA_binding*sp.gRNA5*sp.dCas9 - lambda*sp.dCas9;
-	d_GFP =  alpha_p_GFP*(K_R^n)/(K_R^n + (sp.dCas9_gRNA1)^n)*(K_R^n)/(K_R^n + (sp.dCas9_gRNA2)^n)*(K_R^n)/(K_R^n + (sp.dCas9_gRNA3)^n)*(K_R^n)/(K_R^n + (sp.dCas9_gRNA4)^n)*(K_R^n)/(K_R^n + (sp.dCas9_gRNA5)^n)*sp.V2 - lambda*sp.GFP;
-	d_V1 = - lambda*sp.V1;
+    cse_1 = Cas_gRNA_binding*sp_gRNA1*sp_dCas9;
+	cse_2 = Cas_gRNA_binding*sp_gRNA2*sp_dCas9;
+	cse_3 = Cas_gRNA_binding*sp_gRNA3*sp_dCas9;
+	cse_4 = Cas_gRNA_binding*sp_gRNA4*sp_dCas9;
+	cse_5 = Cas_gRNA_binding*sp_gRNA5*sp_dCas9;
+	d_V2 = -lambda*sp_V2;
+	d_gRNA1 = alpha_r_gRNA1*sp_V1 - cse_1 - delta_g*sp_gRNA1 - lambda*sp_gRNA1;
+	d_dCas9_gRNA1 = cse_1 - lambda*sp_dCas9_gRNA1;
+	d_gRNA2 = alpha_r_gRNA2*sp_V1 - cse_2 - delta_g*sp_gRNA2 - lambda*sp_gRNA2;
+	d_dCas9_gRNA2 = cse_2 - lambda*sp_dCas9_gRNA2;
+	d_gRNA3 = alpha_r_gRNA3*sp_V1 - cse_3 - delta_g*sp_gRNA3 - lambda*sp_gRNA3;
+	d_dCas9_gRNA3 = cse_3 - lambda*sp_dCas9_gRNA3;
+	d_gRNA4 = alpha_r_gRNA4*sp_V1 - cse_4 - delta_g*sp_gRNA4 - lambda*sp_gRNA4;
+	d_dCas9_gRNA4 = cse_4 - lambda*sp_dCas9_gRNA4;
+	d_gRNA5 = alpha_r_gRNA5*sp_V1 - cse_5 - delta_g*sp_gRNA5 - lambda*sp_gRNA5;
+	d_dCas9_gRNA5 = cse_5 - lambda*sp_dCas9_gRNA5;
+	d_dCas9 = alpha_p_dCas9*sp_V2 - cse_1 - cse_2 - cse_3 - cse_4 - cse_5 - lambda*sp_dCas9;
+	d_GFP = inv_2*sp_V2/((inv_1 + sp_dCas9_gRNA1^n)*(inv_1 + sp_dCas9_gRNA2^n)*(inv_1 + sp_dCas9_gRNA3^n)*(inv_1 + sp_dCas9_gRNA4^n)*(inv_1 + sp_dCas9_gRNA5^n)) - lambda*sp_GFP;
+	d_V1 = -lambda*sp_V1;
 
     % Pack derivatives for return, ensuring none are complex or go below zero
     dx = max(-x,real([d_GFP, d_V1, d_V2, d_dCas9, d_dCas9_gRNA1, d_dCas9_gRNA2, d_dCas9_gRNA3, d_dCas9_gRNA4, d_dCas9_gRNA5, d_gRNA1, d_gRNA2, d_gRNA3, d_gRNA4, d_gRNA5])');
 end
+
+% Jacobian of the ODE differential function (not including the truncation at zero)
+function J=jacobian(t, x, p, j_rows, j_cols)
+    % Unpack parameters from parameter vector (and the i_matrix)
+    Cas_gRNA_binding = p(1);
+	K_R = p(2);
+	alpha_p_GFP = p(3);
+	alpha_p_dCas9 = p(4);
+	alpha_r_gRNA1 = p(5);
+	alpha_r_gRNA2 = p(6);
+	alpha_r_gRNA3 = p(7);
+	alpha_r_gRNA4 = p(8);
+	alpha_r_gRNA5 = p(9);
+	delta_g = p(10);
+	lambda = p(11);
+	n = p(12);
+	inv_1 = p(13);
+	inv_2 = p(14);
+	inv_3 = p(15);
+	inv_4 = p(16);
+	inv_5 = p(17);
+	inv_6 = p(18);
+
+    % Unpack individual species from x
+    x = max(1e-12,real(x)); % Truncate values just above zero
+    sp_GFP = x(1);
+	sp_V1 = x(2);
+	sp_V2 = x(3);
+	sp_dCas9 = x(4);
+	sp_dCas9_gRNA1 = x(5);
+	sp_dCas9_gRNA2 = x(6);
+	sp_dCas9_gRNA3 = x(7);
+	sp_dCas9_gRNA4 = x(8);
+	sp_dCas9_gRNA5 = x(9);
+	sp_gRNA1 = x(10);
+	sp_gRNA2 = x(11);
+	sp_gRNA3 = x(12);
+	sp_gRNA4 = x(13);
+	sp_gRNA5 = x(14);
+
+    % Compute each non-zero entry of the Jacobian
+    values = zeros(46, 1);
+    cse_6 = inv_1 + sp_dCas9_gRNA1^n;
+	cse_7 = inv_1 + sp_dCas9_gRNA2^n;
+	cse_8 = inv_1 + sp_dCas9_gRNA3^n;
+	cse_9 = inv_1 + sp_dCas9_gRNA4^n;
+	cse_10 = inv_1 + sp_dCas9_gRNA5^n;
+	cse_11 = cse_6*cse_7*cse_8*cse_9*cse_10;
+	cse_12 = cse_11^2;
+	cse_13 = Cas_gRNA_binding*sp_gRNA1;
+	cse_14 = Cas_gRNA_binding*sp_gRNA2;
+	cse_15 = Cas_gRNA_binding*sp_gRNA3;
+	cse_16 = Cas_gRNA_binding*sp_gRNA4;
+	cse_17 = Cas_gRNA_binding*sp_gRNA5;
+	cse_18 = Cas_gRNA_binding*sp_dCas9;
+	cse_19 = inv_6 - cse_18;
+	values(1) = -lambda; % d(d_GFP)/d(GFP)
+	values(2) = inv_2/cse_11; % d(d_GFP)/d(V2)
+	values(3) = -inv_4*sp_V2*sp_dCas9_gRNA1^inv_5*cse_7*cse_8*cse_9*cse_10/cse_12; % d(d_GFP)/d(dCas9_gRNA1)
+	values(4) = -inv_4*sp_V2*cse_6*sp_dCas9_gRNA2^inv_5*cse_8*cse_9*cse_10/cse_12; % d(d_GFP)/d(dCas9_gRNA2)
+	values(5) = -inv_4*sp_V2*cse_6*cse_7*sp_dCas9_gRNA3^inv_5*cse_9*cse_10/cse_12; % d(d_GFP)/d(dCas9_gRNA3)
+	values(6) = -inv_4*sp_V2*cse_6*cse_7*cse_8*sp_dCas9_gRNA4^inv_5*cse_10/cse_12; % d(d_GFP)/d(dCas9_gRNA4)
+	values(7) = -inv_4*sp_V2*cse_6*cse_7*cse_8*cse_9*sp_dCas9_gRNA5^inv_5/cse_12; % d(d_GFP)/d(dCas9_gRNA5)
+	values(8) = -lambda; % d(d_V1)/d(V1)
+	values(9) = -lambda; % d(d_V2)/d(V2)
+	values(10) = alpha_p_dCas9; % d(d_dCas9)/d(V2)
+	values(11) = -cse_13 - cse_14 - cse_15 - cse_16 - cse_17 - lambda; % d(d_dCas9)/d(dCas9)
+	values(12) = -cse_18; % d(d_dCas9)/d(gRNA1)
+	values(13) = -cse_18; % d(d_dCas9)/d(gRNA2)
+	values(14) = -cse_18; % d(d_dCas9)/d(gRNA3)
+	values(15) = -cse_18; % d(d_dCas9)/d(gRNA4)
+	values(16) = -cse_18; % d(d_dCas9)/d(gRNA5)
+	values(17) = cse_13; % d(d_dCas9_gRNA1)/d(dCas9)
+	values(18) = -lambda; % d(d_dCas9_gRNA1)/d(dCas9_gRNA1)
+	values(19) = cse_18; % d(d_dCas9_gRNA1)/d(gRNA1)
+	values(20) = cse_14; % d(d_dCas9_gRNA2)/d(dCas9)
+	values(21) = -lambda; % d(d_dCas9_gRNA2)/d(dCas9_gRNA2)
+	values(22) = cse_18; % d(d_dCas9_gRNA2)/d(gRNA2)
+	values(23) = cse_15; % d(d_dCas9_gRNA3)/d(dCas9)
+	values(24) = -lambda; % d(d_dCas9_gRNA3)/d(dCas9_gRNA3)
+	values(25) = cse_18; % d(d_dCas9_gRNA3)/d(gRNA3)
+	values(26) = cse_16; % d(d_dCas9_gRNA4)/d(dCas9)
+	values(27) = -lambda; % d(d_dCas9_gRNA4)/d(dCas9_gRNA4)
+	values(28) = cse_18; % d(d_dCas9_gRNA4)/d(gRNA4)
+	values(29) = cse_17; % d(d_dCas9_gRNA5)/d(dCas9)
+	values(30) = -lambda; % d(d_dCas9_gRNA5)/d(dCas9_gRNA5)
+	values(31) = cse_18; % d(d_dCas9_gRNA5)/d(gRNA5)
+	values(32) = alpha_r_gRNA1; % d(d_gRNA1)/d(V1)
+	values(33) = -cse_13; % d(d_gRNA1)/d(dCas9)
+	values(34) = cse_19; % d(d_gRNA1)/d(gRNA1)
+	values(35) = alpha_r_gRNA2; % d(d_gRNA2)/d(V1)
+	values(36) = -cse_14; % d(d_gRNA2)/d(dCas9)
+	values(37) = cse_19; % d(d_gRNA2)/d(gRNA2)
+	values(38) = alpha_r_gRNA3; % d(d_gRNA3)/d(V1)
+	values(39) = -cse_15; % d(d_gRNA3)/d(dCas9)
+	values(40) = cse_19; % d(d_gRNA3)/d(gRNA3)
+	values(41) = alpha_r_gRNA4; % d(d_gRNA4)/d(V1)
+	values(42) = -cse_16; % d(d_gRNA4)/d(dCas9)
+	values(43) = cse_19; % d(d_gRNA4)/d(gRNA4)
+	values(44) = alpha_r_gRNA5; % d(d_gRNA5)/d(V1)
+	values(45) = -cse_17; % d(d_gRNA5)/d(dCas9)
+	values(46) = cse_19; % d(d_gRNA5)/d(gRNA5)
+
+    % Pack entries into a sparse matrix
+    J = sparse(j_rows, j_cols, real(values), 14, 14);
+end
+
+% Parameter-only subexpressions of the ODE, hoisted out of it so that they are computed once per solve
+function q=invariants(p)
+    % Unpack parameters from parameter vector (and the i_matrix)
+    Cas_gRNA_binding = p(1);
+	K_R = p(2);
+	alpha_p_GFP = p(3);
+	alpha_p_dCas9 = p(4);
+	alpha_r_gRNA1 = p(5);
+	alpha_r_gRNA2 = p(6);
+	alpha_r_gRNA3 = p(7);
+	alpha_r_gRNA4 = p(8);
+	alpha_r_gRNA5 = p(9);
+	delta_g = p(10);
+	lambda = p(11);
+	n = p(12);
+
+    % Compute each parameter-only subexpression
+    inv_1 = K_R^n;
+	inv_2 = alpha_p_GFP*inv_1^5;
+	inv_3 = inv_1^5;
+	inv_4 = alpha_p_GFP*inv_3*n;
+	inv_5 = n - 1;
+	inv_6 = -delta_g - lambda;
+
+    q = [inv_1, inv_2, inv_3, inv_4, inv_5, inv_6];
+end
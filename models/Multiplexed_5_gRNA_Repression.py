@@ -0,0 +1,286 @@
+"""Multiplexed_5_gRNA_Repression: ODE simulation model generated from http://bbn.com/apt-dcas9-regulation/Multiplexed_5_gRNA_Repression
+
+Do not edit by hand: regenerate with sbol/sbol_to_python.py
+"""
+import numpy as np
+from scipy.integrate import solve_ivp
+from scipy.sparse import csc_matrix
+
+SPECIES = ['GFP', 'V1', 'V2', 'dCas9', 'dCas9_gRNA1', 'dCas9_gRNA2', 'dCas9_gRNA3', 'dCas9_gRNA4', 'dCas9_gRNA5', 'gRNA1', 'gRNA2', 'gRNA3', 'gRNA4', 'gRNA5']
+"""Species names, in the order of the state vector"""
+PARAMETERS = ['Cas_gRNA_binding', 'K_R', 'alpha_p_GFP', 'alpha_p_dCas9', 'alpha_r_gRNA1', 'alpha_r_gRNA2', 'alpha_r_gRNA3', 'alpha_r_gRNA4', 'alpha_r_gRNA5', 'delta_g', 'lambda', 'n']
+"""Parameter names, in the order of the parameter vector"""
+INPUTS = ['V1', 'V2']
+"""Species whose initial values are set from the initial map"""
+OUTPUTS = ['GFP']
+"""Species returned as the output of a simulation"""
+OUTPUT_INDICES = [SPECIES.index(v) for v in OUTPUTS]
+JACOBIAN_ROWS = np.array([0, 0, 0, 0, 0, 0, 0, 1, 2, 3, 3, 3, 3, 3, 3, 3, 4, 4, 4, 5, 5, 5, 6, 6, 6, 7, 7, 7, 8, 8, 8, 9, 9, 9, 10, 10, 10, 11, 11, 11, 12, 12, 12, 13, 13, 13], dtype=int)
+JACOBIAN_COLUMNS = np.array([0, 2, 4, 5, 6, 7, 8, 1, 2, 2, 3, 9, 10, 11, 12, 13, 3, 4, 9, 3, 5, 10, 3, 6, 11, 3, 7, 12, 3, 8, 13, 1, 3, 9, 1, 3, 10, 1, 3, 11, 1, 3, 12, 1, 3, 13], dtype=int)
+"""Row and column of each non-zero entry of the Jacobian"""
+
+
+def pack_parameters(parameters):
+    """Convert a dictionary of parameter names to values into a parameter vector"""
+    return np.array([parameters[p] for p in PARAMETERS], dtype=float)
+
+
+def pack_initial(initial):
+    """Convert a dictionary of input names to initial values into a state vector"""
+    y0 = np.zeros(len(SPECIES))
+    for v in INPUTS:
+        y0[SPECIES.index(v)] = initial[v]
+    return y0
+
+
+def rhs(t, x, p):
+    """ODE differential function: x is indexed by SPECIES, p by PARAMETERS
+
+    Either a single state (x is a vector) or a batch of states (x is len(SPECIES) x n_sets, with p
+    len(PARAMETERS) x n_sets) can be evaluated in one call.
+    """
+    # Unpack parameters from the parameter vector
+    Cas_gRNA_binding = p[0]
+    K_R = p[1]
+    alpha_p_GFP = p[2]
+    alpha_p_dCas9 = p[3]
+    alpha_r_gRNA1 = p[4]
+    alpha_r_gRNA2 = p[5]
+    alpha_r_gRNA3 = p[6]
+    alpha_r_gRNA4 = p[7]
+    alpha_r_gRNA5 = p[8]
+    delta_g = p[9]
+    lambda_ = p[10]
+    n = p[11]
+
+    # Unpack individual species from x
+    x = np.maximum(1e-12, x)  # Truncate values just above zero
+    sp_GFP = x[0]
+    sp_V1 = x[1]
+    sp_V2 = x[2]
+    sp_dCas9 = x[3]
+    sp_dCas9_gRNA1 = x[4]
+    sp_dCas9_gRNA2 = x[5]
+    sp_dCas9_gRNA3 = x[6]
+    sp_dCas9_gRNA4 = x[7]
+    sp_dCas9_gRNA5 = x[8]
+    sp_gRNA1 = x[9]
+    sp_gRNA2 = x[10]
+    sp_gRNA3 = x[11]
+    sp_gRNA4 = x[12]
+    sp_gRNA5 = x[13]
+
+    # Compute derivative for each species
+    d_V2 = - lambda_*sp_V2
+    d_gRNA1 = alpha_r_gRNA1*sp_V1 - Cas_gRNA_binding*sp_gRNA1*sp_dCas9 - delta_g*sp_gRNA1 - lambda_*sp_gRNA1
+    d_dCas9_gRNA1 = Cas_gRNA_binding*sp_gRNA1*sp_dCas9 - lambda_*sp_dCas9_gRNA1
+    d_gRNA2 = alpha_r_gRNA2*sp_V1 - Cas_gRNA_binding*sp_gRNA2*sp_dCas9 - delta_g*sp_gRNA2 - lambda_*sp_gRNA2
+    d_dCas9_gRNA2 = Cas_gRNA_binding*sp_gRNA2*sp_dCas9 - lambda_*sp_dCas9_gRNA2
+    d_gRNA3 = alpha_r_gRNA3*sp_V1 - Cas_gRNA_binding*sp_gRNA3*sp_dCas9 - delta_g*sp_gRNA3 - lambda_*sp_gRNA3
+    d_dCas9_gRNA3 = Cas_gRNA_binding*sp_gRNA3*sp_dCas9 - lambda_*sp_dCas9_gRNA3
+    d_gRNA4 = alpha_r_gRNA4*sp_V1 - Cas_gRNA_binding*sp_gRNA4*sp_dCas9 - delta_g*sp_gRNA4 - lambda_*sp_gRNA4
+    d_dCas9_gRNA4 = Cas_gRNA_binding*sp_gRNA4*sp_dCas9 - lambda_*sp_dCas9_gRNA4
+    d_gRNA5 = alpha_r_gRNA5*sp_V1 - Cas_gRNA_binding*sp_gRNA5*sp_dCas9 - delta_g*sp_gRNA5 - lambda_*sp_gRNA5
+    d_dCas9_gRNA5 = Cas_gRNA_binding*sp_gRNA5*sp_dCas9 - lambda_*sp_dCas9_gRNA5
+    d_dCas9 = alpha_p_dCas9*sp_V2 - Cas_gRNA_binding*sp_gRNA1*sp_dCas9 - Cas_gRNA_binding*sp_gRNA2*sp_dCas9 - Cas_gRNA_binding*sp_gRNA3*sp_dCas9 - Cas_gRNA_binding*sp_gRNA4*sp_dCas9 - Cas_gRNA_binding*sp_gRNA5*sp_dCas9 - lambda_*sp_dCas9
+    d_GFP = alpha_p_GFP*(K_R**n)/(K_R**n + (sp_dCas9_gRNA1)**n)*(K_R**n)/(K_R**n + (sp_dCas9_gRNA2)**n)*(K_R**n)/(K_R**n + (sp_dCas9_gRNA3)**n)*(K_R**n)/(K_R**n + (sp_dCas9_gRNA4)**n)*(K_R**n)/(K_R**n + (sp_dCas9_gRNA5)**n)*sp_V2 - lambda_*sp_GFP
+    d_V1 = - lambda_*sp_V1
+
+    # Pack derivatives for return, ensuring none go below zero
+    dx = np.empty_like(x)
+    dx[0] = d_GFP
+    dx[1] = d_V1
+    dx[2] = d_V2
+    dx[3] = d_dCas9
+    dx[4] = d_dCas9_gRNA1
+    dx[5] = d_dCas9_gRNA2
+    dx[6] = d_dCas9_gRNA3
+    dx[7] = d_dCas9_gRNA4
+    dx[8] = d_dCas9_gRNA5
+    dx[9] = d_gRNA1
+    dx[10] = d_gRNA2
+    dx[11] = d_gRNA3
+    dx[12] = d_gRNA4
+    dx[13] = d_gRNA5
+    return np.maximum(-x, dx)
+
+
+def jacobian_values(x, p):
+    """Compute the non-zero entries of the Jacobian, in the order of JACOBIAN_ROWS and JACOBIAN_COLUMNS
+
+    Like rhs, either a single state or a batch of states can be evaluated in one call.
+    """
+    # Unpack parameters from the parameter vector
+    Cas_gRNA_binding = p[0]
+    K_R = p[1]
+    alpha_p_GFP = p[2]
+    alpha_p_dCas9 = p[3]
+    alpha_r_gRNA1 = p[4]
+    alpha_r_gRNA2 = p[5]
+    alpha_r_gRNA3 = p[6]
+    alpha_r_gRNA4 = p[7]
+    alpha_r_gRNA5 = p[8]
+    delta_g = p[9]
+    lambda_ = p[10]
+    n = p[11]
+
+    # Unpack individual species from x
+    x = np.maximum(1e-12, x)  # Truncate values just above zero
+    sp_GFP = x[0]
+    sp_V1 = x[1]
+    sp_V2 = x[2]
+    sp_dCas9 = x[3]
+    sp_dCas9_gRNA1 = x[4]
+    sp_dCas9_gRNA2 = x[5]
+    sp_dCas9_gRNA3 = x[6]
+    sp_dCas9_gRNA4 = x[7]
+    sp_dCas9_gRNA5 = x[8]
+    sp_gRNA1 = x[9]
+    sp_gRNA2 = x[10]
+    sp_gRNA3 = x[11]
+    sp_gRNA4 = x[12]
+    sp_gRNA5 = x[13]
+
+    # Compute each non-zero entry of the Jacobian
+    values = np.empty((len(JACOBIAN_ROWS),) + np.shape(x)[1:])
+    values[0] = -lambda_  # d(d_GFP)/d(GFP)
+    values[1] = alpha_p_GFP*K_R**n*K_R**n*K_R**n*K_R**n*K_R**n/((K_R**n + sp_dCas9_gRNA1**n)*(K_R**n + sp_dCas9_gRNA2**n)*(K_R**n + sp_dCas9_gRNA3**n)*(K_R**n + sp_dCas9_gRNA4**n)*(K_R**n + sp_dCas9_gRNA5**n))  # d(d_GFP)/d(V2)
+    values[2] = -alpha_p_GFP*K_R**n*K_R**n*K_R**n*K_R**n*K_R**n*sp_V2*n*sp_dCas9_gRNA1**(n - 1)*(K_R**n + sp_dCas9_gRNA2**n)*(K_R**n + sp_dCas9_gRNA3**n)*(K_R**n + sp_dCas9_gRNA4**n)*(K_R**n + sp_dCas9_gRNA5**n)/((K_R**n + sp_dCas9_gRNA1**n)*(K_R**n + sp_dCas9_gRNA2**n)*(K_R**n + sp_dCas9_gRNA3**n)*(K_R**n + sp_dCas9_gRNA4**n)*(K_R**n + sp_dCas9_gRNA5**n))**2  # d(d_GFP)/d(dCas9_gRNA1)
+    values[3] = -alpha_p_GFP*K_R**n*K_R**n*K_R**n*K_R**n*K_R**n*sp_V2*(K_R**n + sp_dCas9_gRNA1**n)*n*sp_dCas9_gRNA2**(n - 1)*(K_R**n + sp_dCas9_gRNA3**n)*(K_R**n + sp_dCas9_gRNA4**n)*(K_R**n + sp_dCas9_gRNA5**n)/((K_R**n + sp_dCas9_gRNA1**n)*(K_R**n + sp_dCas9_gRNA2**n)*(K_R**n + sp_dCas9_gRNA3**n)*(K_R**n + sp_dCas9_gRNA4**n)*(K_R**n + sp_dCas9_gRNA5**n))**2  # d(d_GFP)/d(dCas9_gRNA2)
+    values[4] = -alpha_p_GFP*K_R**n*K_R**n*K_R**n*K_R**n*K_R**n*sp_V2*(K_R**n + sp_dCas9_gRNA1**n)*(K_R**n + sp_dCas9_gRNA2**n)*n*sp_dCas9_gRNA3**(n - 1)*(K_R**n + sp_dCas9_gRNA4**n)*(K_R**n + sp_dCas9_gRNA5**n)/((K_R**n + sp_dCas9_gRNA1**n)*(K_R**n + sp_dCas9_gRNA2**n)*(K_R**n + sp_dCas9_gRNA3**n)*(K_R**n + sp_dCas9_gRNA4**n)*(K_R**n + sp_dCas9_gRNA5**n))**2  # d(d_GFP)/d(dCas9_gRNA3)
+    values[5] = -alpha_p_GFP*K_R**n*K_R**n*K_R**n*K_R**n*K_R**n*sp_V2*(K_R**n + sp_dCas9_gRNA1**n)*(K_R**n + sp_dCas9_gRNA2**n)*(K_R**n + sp_dCas9_gRNA3**n)*n*sp_dCas9_gRNA4**(n - 1)*(K_R**n + sp_dCas9_gRNA5**n)/((K_R**n + sp_dCas9_gRNA1**n)*(K_R**n + sp_dCas9_gRNA2**n)*(K_R**n + sp_dCas9_gRNA3**n)*(K_R**n + sp_dCas9_gRNA4**n)*(K_R**n + sp_dCas9_gRNA5**n))**2  # d(d_GFP)/d(dCas9_gRNA4)
+    values[6] = -alpha_p_GFP*K_R**n*K_R**n*K_R**n*K_R**n*K_R**n*sp_V2*(K_R**n + sp_dCas9_gRNA1**n)*(K_R**n + sp_dCas9_gRNA2**n)*(K_R**n + sp_dCas9_gRNA3**n)*(K_R**n + sp_dCas9_gRNA4**n)*n*sp_dCas9_gRNA5**(n - 1)/((K_R**n + sp_dCas9_gRNA1**n)*(K_R**n + sp_dCas9_gRNA2**n)*(K_R**n + sp_dCas9_gRNA3**n)*(K_R**n + sp_dCas9_gRNA4**n)*(K_R**n + sp_dCas9_gRNA5**n))**2  # d(d_GFP)/d(dCas9_gRNA5)
+    values[7] = -lambda_  # d(d_V1)/d(V1)
+    values[8] = -lambda_  # d(d_V2)/d(V2)
+    values[9] = alpha_p_dCas9  # d(d_dCas9)/d(V2)
+    values[10] = -Cas_gRNA_binding*sp_gRNA1 - Cas_gRNA_binding*sp_gRNA2 - Cas_gRNA_binding*sp_gRNA3 - Cas_gRNA_binding*sp_gRNA4 - Cas_gRNA_binding*sp_gRNA5 - lambda_  # d(d_dCas9)/d(dCas9)
+    values[11] = -Cas_gRNA_binding*sp_dCas9  # d(d_dCas9)/d(gRNA1)
+    values[12] = -Cas_gRNA_binding*sp_dCas9  # d(d_dCas9)/d(gRNA2)
+    values[13] = -Cas_gRNA_binding*sp_dCas9  # d(d_dCas9)/d(gRNA3)
+    values[14] = -Cas_gRNA_binding*sp_dCas9  # d(d_dCas9)/d(gRNA4)
+    values[15] = -Cas_gRNA_binding*sp_dCas9  # d(d_dCas9)/d(gRNA5)
+    values[16] = Cas_gRNA_binding*sp_gRNA1  # d(d_dCas9_gRNA1)/d(dCas9)
+    values[17] = -lambda_  # d(d_dCas9_gRNA1)/d(dCas9_gRNA1)
+    values[18] = Cas_gRNA_binding*sp_dCas9  # d(d_dCas9_gRNA1)/d(gRNA1)
+    values[19] = Cas_gRNA_binding*sp_gRNA2  # d(d_dCas9_gRNA2)/d(dCas9)
+    values[20] = -lambda_  # d(d_dCas9_gRNA2)/d(dCas9_gRNA2)
+    values[21] = Cas_gRNA_binding*sp_dCas9  # d(d_dCas9_gRNA2)/d(gRNA2)
+    values[22] = Cas_gRNA_binding*sp_gRNA3  # d(d_dCas9_gRNA3)/d(dCas9)
+    values[23] = -lambda_  # d(d_dCas9_gRNA3)/d(dCas9_gRNA3)
+    values[24] = Cas_gRNA_binding*sp_dCas9  # d(d_dCas9_gRNA3)/d(gRNA3)
+    values[25] = Cas_gRNA_binding*sp_gRNA4  # d(d_dCas9_gRNA4)/d(dCas9)
+    values[26] = -lambda_  # d(d_dCas9_gRNA4)/d(dCas9_gRNA4)
+    values[27] = Cas_gRNA_binding*sp_dCas9  # d(d_dCas9_gRNA4)/d(gRNA4)
+    values[28] = Cas_gRNA_binding*sp_gRNA5  # d(d_dCas9_gRNA5)/d(dCas9)
+    values[29] = -lambda_  # d(d_dCas9_gRNA5)/d(dCas9_gRNA5)
+    values[30] = Cas_gRNA_binding*sp_dCas9  # d(d_dCas9_gRNA5)/d(gRNA5)
+    values[31] = alpha_r_gRNA1  # d(d_gRNA1)/d(V1)
+    values[32] = -Cas_gRNA_binding*sp_gRNA1  # d(d_gRNA1)/d(dCas9)
+    values[33] = -Cas_gRNA_binding*sp_dCas9 - delta_g - lambda_  # d(d_gRNA1)/d(gRNA1)
+    values[34] = alpha_r_gRNA2  # d(d_gRNA2)/d(V1)
+    values[35] = -Cas_gRNA_binding*sp_gRNA2  # d(d_gRNA2)/d(dCas9)
+    values[36] = -Cas_gRNA_binding*sp_dCas9 - delta_g - lambda_  # d(d_gRNA2)/d(gRNA2)
+    values[37] = alpha_r_gRNA3  # d(d_gRNA3)/d(V1)
+    values[38] = -Cas_gRNA_binding*sp_gRNA3  # d(d_gRNA3)/d(dCas9)
+    values[39] = -Cas_gRNA_binding*sp_dCas9 - delta_g - lambda_  # d(d_gRNA3)/d(gRNA3)
+    values[40] = alpha_r_gRNA4  # d(d_gRNA4)/d(V1)
+    values[41] = -Cas_gRNA_binding*sp_gRNA4  # d(d_gRNA4)/d(dCas9)
+    values[42] = -Cas_gRNA_binding*sp_dCas9 - delta_g - lambda_  # d(d_gRNA4)/d(gRNA4)
+    values[43] = alpha_r_gRNA5  # d(d_gRNA5)/d(V1)
+    values[44] = -Cas_gRNA_binding*sp_gRNA5  # d(d_gRNA5)/d(dCas9)
+    values[45] = -Cas_gRNA_binding*sp_dCas9 - delta_g - lambda_  # d(d_gRNA5)/d(gRNA5)
+    return values
+
+
+def jacobian(t, x, p):
+    """Jacobian of the ODE differential function (not including the truncation at zero), as a sparse matrix"""
+    return csc_matrix((jacobian_values(x, p), (JACOBIAN_ROWS, JACOBIAN_COLUMNS)), shape=(len(SPECIES), len(SPECIES)))
+
+
+def jacobian_options(method, jac):
+    """Get the solve_ivp options for passing a sparse Jacobian function to the given method"""
+    if method in ('BDF', 'Radau'):
+        return {'jac': jac}
+    if method == 'LSODA':
+        return {'jac': lambda *args: jac(*args).toarray()}
+    return {}  # explicit methods do not use a Jacobian
+
+
+def simulate(time_span, parameters, initial, step=1, method='BDF'):
+    """Simulate the model
+
+    :param time_span: hours values [start, stop]
+    :param parameters: dictionary of names to numbers (e.g., rate constants, decay rates, Hill coefficients)
+    :param initial: dictionary of input variable names to initial values
+    :param step: number of hours between samples in output; defaults to 1
+    :param method: scipy.integrate.solve_ivp method to use
+    :return: vector of time, species names, matrix of output levels at those time points, matrix of all species
+    """
+    solution = solve_ivp(rhs, (time_span[0], time_span[-1]), pack_initial(initial), method=method,
+                         args=(pack_parameters(parameters),), dense_output=True, **jacobian_options(method, jacobian))
+    if not solution.success:
+        raise RuntimeError(f'Simulation failed: {solution.message}')
+
+    # Evaluate species levels at given times
+    time_interval = np.arange(time_span[0], time_span[-1] + step / 2, step)
+    y = solution.sol(time_interval)
+    y_out = y[OUTPUT_INDICES, :]
+    return time_interval, SPECIES, y_out, y
+
+
+def simulate_group(time_span, parameter_sets, initial_states, time_interval, method, rtol, atol):
+    """Integrate a group of parameter sets as one batched system, returning n_sets x species x times levels"""
+    n_sets, n_species = initial_states.shape
+    p = parameter_sets.T
+
+    def batched_rhs(t, y):
+        return rhs(t, y.reshape(n_sets, n_species).T, p).T.ravel()
+
+    # The batched Jacobian is block diagonal, with one block per member
+    offsets = np.repeat(np.arange(n_sets) * n_species, len(JACOBIAN_ROWS))
+    rows = offsets + np.tile(JACOBIAN_ROWS, n_sets)
+    columns = offsets + np.tile(JACOBIAN_COLUMNS, n_sets)
+
+    def batched_jacobian(t, y):
+        values = jacobian_values(y.reshape(n_sets, n_species).T, p)
+        return csc_matrix((values.T.ravel(), (rows, columns)), shape=(y.size, y.size))
+
+    # The solver controls the RMS error over the whole group, so tighten the tolerances enough that
+    # every member meets them on its own
+    scale = np.sqrt(n_sets)
+    solution = solve_ivp(batched_rhs, (time_span[0], time_span[-1]), initial_states.ravel(), method=method,
+                         dense_output=True, rtol=rtol / scale, atol=atol / scale,
+                         **jacobian_options(method, batched_jacobian))
+    if not solution.success:
+        raise RuntimeError(f'Simulation failed: {solution.message}')
+    return solution.sol(time_interval).reshape(n_sets, n_species, len(time_interval))
+
+
+def simulate_ensemble(time_span, parameter_sets, initial_states, step=1, method='BDF', group_size=64,
+                      rtol=1e-3, atol=1e-6):
+    """Simulate many parameter sets, evaluating the model for a whole group of sets in each call
+
+    :param time_span: hours values [start, stop]
+    :param parameter_sets: matrix of parameter values, n_sets x len(PARAMETERS) (see pack_parameters)
+    :param initial_states: matrix of initial states, n_sets x len(SPECIES), or one state for all sets
+    :param step: number of hours between samples in output; defaults to 1
+    :param method: scipy.integrate.solve_ivp method to use
+    :param group_size: number of parameter sets to integrate together as one batched system
+    :param rtol: relative tolerance that each member must meet
+    :param atol: absolute tolerance that each member must meet
+    :return: vector of time, species names, n_sets x outputs x times array of output levels,
+        n_sets x species x times array of all species
+    """
+    parameter_sets = np.atleast_2d(np.asarray(parameter_sets, dtype=float))
+    n_sets = parameter_sets.shape[0]
+    initial_states = np.broadcast_to(np.asarray(initial_states, dtype=float), (n_sets, len(SPECIES)))
+
+    # Integrate each group of parameter sets as one system
+    time_interval = np.arange(time_span[0], time_span[-1] + step / 2, step)
+    y = np.empty((n_sets, len(SPECIES), len(time_interval)))
+    for start in range(0, n_sets, group_size):
+        group = slice(start, min(start + group_size, n_sets))
+        y[group] = simulate_group(time_span, parameter_sets[group], initial_states[group], time_interval,
+                                  method, rtol, atol)
+    y_out = y[:, OUTPUT_INDICES, :]
+    return time_interval, SPECIES, y_out, y
@@ -1,10 +1,21 @@
-function [time_interval, species_names, y_out, y] = Multisite_2_gRNA_Repression(time_span, parameters, initial, step)
+function [time_interval, species_names, y_out, y] = Multisite_2_gRNA_Repression(time_span, parameters, initial, step, parameter_index)
 % time_span is the hours values [start, stop]
-% parameters is a Map of names to numbers (e.g., rate constants, decay rates, Hill coefficients)
+% parameters is a Map of names to numbers (e.g., rate constants, decay rates, Hill coefficients),
+%   or a numeric vector of parameter values indexed by parameter_index
 % initial is a Map of variable names to initial values
 % step is the number of hours between samples in output; defaults to 1
+% parameter_index is a Map of parameter names to their index in a numeric parameters vector
 % Returns vector of time, matrix of output levels at those time points, matrix of all species
-    if nargin < 4, step = 1; end
+    if nargin < 4 || isempty(step), step = 1; end
+
+    % Resolve the parameters to a vector in the order used by the ODE (once per solve)
+    parameter_names = {'Cas_gRNA_binding', 'K_R', 'alpha_p_GFP', 'alpha_p_dCas9', 'alpha_r_gRNA1', 'delta_g', 'lambda', 'n'};
+    if nargin < 5
+        p = cell2mat(values(parameters, parameter_names));
+    else
+        p = parameters(cell2mat(values(parameter_index, parameter_names)));
+    end
+    p = [reshape(p, 1, []), invariants(p)]; % Append the parameter-only subexpressions
     
     % Define names for input/output variable indexes
     GFP = 1;
@@ -18,9 +29,15 @@ function [time_interval, species_names, y_out, y] = Multisite_2_gRNA_Repression(
 
     % Set the species names (in the same order as in the ODE)
     species_names = ["GFP", "V1", "V2", "dCas9", "dCas9_gRNA1", "gRNA1"];
+
+    % Set the Jacobian and its sparsity pattern (row and column of each non-zero entry)
+    j_rows = [1, 1, 1, 2, 3, 4, 4, 4, 5, 5, 5, 6, 6, 6];
+    j_cols = [1, 3, 5, 2, 3, 3, 4, 6, 4, 5, 6, 2, 4, 6];
+    options = odeset('Jacobian', @(t,x) jacobian(t, x, p, j_rows, j_cols), ...
+        'JPattern', sparse(j_rows, j_cols, 1, 6, 6));
     
     % Run ODE
-    solution = ode15s(@(t,x) diff_eq(t, x, parameters, species_names), time_span, y0);
+    solution = ode15s(@(t,x) diff_eq(t, x, p), time_span, y0, options);
     
     % Evaluate species levels at given times
     time_interval = time_span(1):step:time_span(end);
@@ -29,30 +46,116 @@ function [time_interval, species_names, y_out, y] = Multisite_2_gRNA_Repression(
 end
 
 % ODE differential function
-function dx=diff_eq(t, x, parameters, species_names)
-    % Unpack parameters from parameter map (and the i_matrix)
-    Cas_gRNA_binding = parameters('Cas_gRNA_binding');
-	K_R = parameters('K_R');
-	alpha_p_GFP = parameters('alpha_p_GFP');
-	alpha_p_dCas9 = parameters('alpha_p_dCas9');
-	alpha_r_gRNA1 = parameters('alpha_r_gRNA1');
-	delta_g = parameters('delta_g');
-	lambda = parameters('lambda');
-	n = parameters('n');
-    
+function dx=diff_eq(t, x, p)
+    % Unpack parameters from parameter vector (and the i_matrix)
+    Cas_gRNA_binding = p(1);
+	K_R = p(2);
+	alpha_p_GFP = p(3);
+	alpha_p_dCas9 = p(4);
+	alpha_r_gRNA1 = p(5);
+	delta_g = p(6);
+	lambda = p(7);
+	n = p(8);
+	inv_1 = p(9);
+	inv_2 = p(10);
+	inv_3 = p(11);
+	inv_4 = p(12);
+	inv_5 = p(13);
+	inv_6 = p(14);
 
     % Unpack individual species from x
     x = max(1e-12,real(x)); % Truncate values just above zero
-    sp = packSpeciesStruct(species_names, x);
+    sp_GFP = x(1);
+	sp_V1 = x(2);
+	sp_V2 = x(3);
+	sp_dCas9 = x(4);
+	sp_dCas9_gRNA1 = x(5);
+	sp_gRNA1 = x(6);
 
     % Compute derivative for each species
-    d_V2 = - lambda*sp.V2;
-	d_gRNA1 =  alpha_r_gRNA1*sp.V1 - Cas_gRNA_binding*sp.gRNA1*sp.dCas9 - delta_g*sp.gRNA1 - lambda*sp.gRNA1;
-	d_dCas9_gRNA1 =  Cas_gRNA_binding*sp.gRNA1*sp.dCas9 - lambda*sp.dCas9_gRNA1;
-	d_dCas9 =  alpha_p_dCas9*sp.V2 - Cas_gRNA_binding*sp.gRNA1*sp.dCas9 - lambda*sp.dCas9;
-	d_GFP =  alpha_p_GFP*(K_R^n)/(K_R^n + (sp.dCas9_gRNA1)^n)*(K_R^n)/(K_R^n + (sp.dCas9_gRNA1)^n)*sp.V2 - lambda*sp.GFP;
-	d_V1 = - lambda*sp.V1;
+    cse_1 = Cas_gRNA_binding*sp_gRNA1*sp_dCas9;
+	d_V2 = -lambda*sp_V2;
+	d_gRNA1 = alpha_r_gRNA1*sp_V1 - cse_1 - delta_g*sp_gRNA1 - lambda*sp_gRNA1;
+	d_dCas9_gRNA1 = cse_1 - lambda*sp_dCas9_gRNA1;
+	d_dCas9 = alpha_p_dCas9*sp_V2 - cse_1 - lambda*sp_dCas9;
+	d_GFP = inv_2*sp_V2/(inv_1 + sp_dCas9_gRNA1^n)^2 - lambda*sp_GFP;
+	d_V1 = -lambda*sp_V1;
 
     % Pack derivatives for return, ensuring none are complex or go below zero
     dx = max(-x,real([d_GFP, d_V1, d_V2, d_dCas9, d_dCas9_gRNA1, d_gRNA1])');
 end
+
+% Jacobian of the ODE differential function (not including the truncation at zero)
+function J=jacobian(t, x, p, j_rows, j_cols)
+    % Unpack parameters from parameter vector (and the i_matrix)
+    Cas_gRNA_binding = p(1);
+	K_R = p(2);
+	alpha_p_GFP = p(3);
+	alpha_p_dCas9 = p(4);
+	alpha_r_gRNA1 = p(5);
+	delta_g = p(6);
+	lambda = p(7);
+	n = p(8);
+	inv_1 = p(9);
+	inv_2 = p(10);
+	inv_3 = p(11);
+	inv_4 = p(12);
+	inv_5 = p(13);
+	inv_6 = p(14);
+
+    % Unpack individual species from x
+    x = max(1e-12,real(x)); % Truncate values just above zero
+    sp_GFP = x(1);
+	sp_V1 = x(2);
+	sp_V2 = x(3);
+	sp_dCas9 = x(4);
+	sp_dCas9_gRNA1 = x(5);
+	sp_gRNA1 = x(6);
+
+    % Compute each non-zero entry of the Jacobian
+    values = zeros(14, 1);
+    cse_2 = inv_1 + sp_dCas9_gRNA1^n;
+	cse_3 = cse_2^2;
+	cse_4 = Cas_gRNA_binding*sp_gRNA1;
+	cse_5 = Cas_gRNA_binding*sp_dCas9;
+	values(1) = -lambda; % d(d_GFP)/d(GFP)
+	values(2) = inv_2/cse_3; % d(d_GFP)/d(V2)
+	values(3) = -inv_4*sp_V2*cse_2*sp_dCas9_gRNA1^inv_5/cse_3^2; % d(d_GFP)/d(dCas9_gRNA1)
+	values(4) = -lambda; % d(d_V1)/d(V1)
+	values(5) = -lambda; % d(d_V2)/d(V2)
+	values(6) = alpha_p_dCas9; % d(d_dCas9)/d(V2)
+	values(7) = -cse_4 - lambda; % d(d_dCas9)/d(dCas9)
+	values(8) = -cse_5; % d(d_dCas9)/d(gRNA1)
+	values(9) = cse_4; % d(d_dCas9_gRNA1)/d(dCas9)
+	values(10) = -lambda; % d(d_dCas9_gRNA1)/d(dCas9_gRNA1)
+	values(11) = cse_5; % d(d_dCas9_gRNA1)/d(gRNA1)
+	values(12) = alpha_r_gRNA1; % d(d_gRNA1)/d(V1)
+	values(13) = -cse_4; % d(d_gRNA1)/d(dCas9)
+	values(14) = inv_6 - cse_5; % d(d_gRNA1)/d(gRNA1)
+
+    % Pack entries into a sparse matrix
+    J = sparse(j_rows, j_cols, real(values), 6, 6);
+end
+
+% Parameter-only subexpressions of the ODE, hoisted out of it so that they are computed once per solve
+function q=invariants(p)
+    % Unpack parameters from parameter vector (and the i_matrix)
+    Cas_gRNA_binding = p(1);
+	K_R = p(2);
+	alpha_p_GFP = p(3);
+	alpha_p_dCas9 = p(4);
+	alpha_r_gRNA1 = p(5);
+	delta_g = p(6);
+	lambda = p(7);
+	n = p(8);
+
+    % Compute each parameter-only subexpression
+    inv_1 = K_R^n;
+	inv_2 = alpha_p_GFP*inv_1^2;
+	inv_3 = inv_1^2;
+	inv_4 = 2*alpha_p_GFP*inv_3*n;
+	inv_5 = n - 1;
+	inv_6 = -delta_g - lambda;
+
+    q = [inv_1, inv_2, inv_3, inv_4, inv_5, inv_6];
+end
@@ -1,10 +1,20 @@
-function [time_interval, species_names, y_out, y] = No_gRNA_control(time_span, parameters, initial, step)
+function [time_interval, species_names, y_out, y] = No_gRNA_control(time_span, parameters, initial, step, parameter_index)
 % time_span is the hours values [start, stop]
-% parameters is a Map of names to numbers (e.g., rate constants, decay rates, Hill coefficients)
+% parameters is a Map of names to numbers (e.g., rate constants, decay rates, Hill coefficients),
+%   or a numeric vector of parameter values indexed by parameter_index
 % initial is a Map of variable names to initial values
 % step is the number of hours between samples in output; defaults to 1
+% parameter_index is a Map of parameter names to their index in a numeric parameters vector
 % Returns vector of time, matrix of output levels at those time points, matrix of all species
-    if nargin < 4, step = 1; end
+    if nargin < 4 || isempty(step), step = 1; end
+
+    % Resolve the parameters to a vector in the order used by the ODE (once per solve)
+    parameter_names = {'alpha_p_GFP', 'alpha_p_dCas9', 'lambda'};
+    if nargin < 5
+        p = cell2mat(values(parameters, parameter_names));
+    else
+        p = parameters(cell2mat(values(parameter_index, parameter_names)));
+    end
     
     % Define names for input/output variable indexes
     GFP = 1;
@@ -16,9 +26,15 @@ function [time_interval, species_names, y_out, y] = No_gRNA_control(time_span, p
 
     % Set the species names (in the same order as in the ODE)
     species_names = ["GFP", "V2", "dCas9"];
+
+    % Set the Jacobian and its sparsity pattern (row and column of each non-zero entry)
+    j_rows = [1, 1, 2, 3, 3];
+    j_cols = [1, 2, 2, 2, 3];
+    options = odeset('Jacobian', @(t,x) jacobian(t, x, p, j_rows, j_cols), ...
+        'JPattern', sparse(j_rows, j_cols, 1, 3, 3));
     
     % Run ODE
-    solution = ode15s(@(t,x) diff_eq(t, x, parameters, species_names), time_span, y0);
+    solution = ode15s(@(t,x) diff_eq(t, x, p), time_span, y0, options);
     
     % Evaluate species levels at given times
     time_interval = time_span(1):step:time_span(end);
@@ -27,22 +43,48 @@ function [time_interval, species_names, y_out, y] = No_gRNA_control(time_span, p
 end
 
 % ODE differential function
-function dx=diff_eq(t, x, parameters, species_names)
-    % Unpack parameters from parameter map (and the i_matrix)
-    alpha_p_GFP = parameters('alpha_p_GFP');
-	alpha_p_dCas9 = parameters('alpha_p_dCas9');
-	lambda = parameters('lambda');
-    
+function dx=diff_eq(t, x, p)
+    % Unpack parameters from parameter vector (and the i_matrix)
+    alpha_p_GFP = p(1);
+	alpha_p_dCas9 = p(2);
+	lambda = p(3);
 
     % Unpack individual species from x
     x = max(1e-12,real(x)); % Truncate values just above zero
-    sp = packSpeciesStruct(species_names, x);
+    sp_GFP = x(1);
+	sp_V2 = x(2);
+	sp_dCas9 = x(3);
 
     % Compute derivative for each species
-    d_V2 = - lambda*sp.V2;
-	d_dCas9 =  alpha_p_dCas9*sp.V2 - lambda*sp.dCas9;
-	d_GFP =  alpha_p_GFP*sp.V2 - lambda*sp.GFP;
+    d_V2 = -lambda*sp_V2;
+	d_dCas9 = alpha_p_dCas9*sp_V2 - lambda*sp_dCas9;
+	d_GFP = alpha_p_GFP*sp_V2 - lambda*sp_GFP;
 
     % Pack derivatives for return, ensuring none are complex or go below zero
     dx = max(-x,real([d_GFP, d_V2, d_dCas9])');
 end
+
+% Jacobian of the ODE differential function (not including the truncation at zero)
+function J=jacobian(t, x, p, j_rows, j_cols)
+    % Unpack parameters from parameter vector (and the i_matrix)
+    alpha_p_GFP = p(1);
+	alpha_p_dCas9 = p(2);
+	lambda = p(3);
+
+    % Unpack individual species from x
+    x = max(1e-12,real(x)); % Truncate values just above zero
+    sp_GFP = x(1);
+	sp_V2 = x(2);
+	sp_dCas9 = x(3);
+
+    % Compute each non-zero entry of the Jacobian
+    values = zeros(5, 1);
+    values(1) = -lambda; % d(d_GFP)/d(GFP)
+	values(2) = alpha_p_GFP; % d(d_GFP)/d(V2)
+	values(3) = -lambda; % d(d_V2)/d(V2)
+	values(4) = alpha_p_dCas9; % d(d_dCas9)/d(V2)
+	values(5) = -lambda; % d(d_dCas9)/d(dCas9)
+
+    % Pack entries into a sparse matrix
+    J = sparse(j_rows, j_cols, real(values), 3, 3);
+end
@@ -0,0 +1,92 @@
+from typing import Iterable, List, NamedTuple, Tuple
+
+import sbol3
+from sbol_utilities.component import add_feature, add_interaction
+
+import builders
+
+
+class Architecture(NamedTuple):
+    """Design of a dCas9 gRNA repression system, in terms of the target sites of each gRNA"""
+    display_id: str
+    """Display ID of the system component"""
+    name: str
+    """Human-readable name of the system"""
+    sites: Tuple[int, ...]
+    """Number of target sites of each gRNA in the GFP promoter; empty for constitutive GFP expression"""
+
+
+def multiplexed(n_sites: int) -> Architecture:
+    """Design with n_sites heterogeneous target sites, each targeted by its own gRNA"""
+    return Architecture(f'Multiplexed_{n_sites}_gRNA_Repression', f'{n_sites} Heterogeneous Target Sites',
+                        (1,) * n_sites)
+
+
+def multisite(n_sites: int) -> Architecture:
+    """Design with n_sites identical target sites, all targeted by a single gRNA"""
+    return Architecture(f'Multisite_{n_sites}_gRNA_Repression', f'{n_sites} Identical Target Sites', (n_sites,))
+
+
+def mixed(n_gRNAs: int, n_sites: int) -> Architecture:
+    """Design with n_sites target sites spread as evenly as possible across n_gRNAs distinct gRNAs
+
+    For example, 2 gRNAs across 5 sites gives the first gRNA 3 sites and the second 2.
+    """
+    if not 0 < n_gRNAs <= n_sites:
+        raise ValueError(f'Need between 1 and {n_sites} gRNAs for {n_sites} sites, but got {n_gRNAs}')
+    sites = tuple(n_sites // n_gRNAs + (1 if i < n_sites % n_gRNAs else 0) for i in range(n_gRNAs))
+    return Architecture(f'Mixed_{n_gRNAs}_gRNA_{n_sites}_Site_Repression',
+                        f'{n_sites} Target Sites for {n_gRNAs} gRNAs', sites)
+
+
+def standard_architectures(max_sites: int = 6) -> List[Architecture]:
+    """Get the designs in sbol/gRNA_models.nt: no gRNA, a single site, then the multiplexed and multisite
+    designs for 2 to max_sites sites
+
+    :param max_sites: largest number of target sites
+    :return: designs in the order that they are added to the document
+    """
+    return ([Architecture('No_gRNA_control', '0 Target Sites', ()),
+             Architecture('Single_gRNA_repression', '1 Target Site', (1,))]
+            + [multiplexed(n) for n in range(2, max_sites + 1)]
+            + [multisite(n) for n in range(2, max_sites + 1)])
+
+
+def make_system(doc: sbol3.Document, architecture: Architecture) -> sbol3.Component:
+    """Build the system for a design and add it to the document
+
+    GFP and dCas9 are expressed from vector V2. If the design has any gRNAs, they are expressed from
+    vector V1 and repress the GFP promoter; otherwise GFP is expressed constitutively.
+
+    :param doc: document to add the system to
+    :param architecture: design to build
+    :return: system component
+    """
+    system = sbol3.Component(architecture.display_id, sbol3.SBO_FUNCTIONAL_ENTITY, name=architecture.name)
+    doc.add(system)
+    # Create a GFP-CRISPRa system
+    vector_2 = add_feature(system, sbol3.LocalSubComponent([sbol3.SBO_DNA], name='V2'))
+    add_interaction(sbol3.SBO_DEGRADATION, name='Vector degradation', participants={vector_2: sbol3.SBO_REACTANT})
+    dCas9_pro, gfp_promoter, gfp_pro = builders.make_gfp_dCas9_module(vector_2)
+    if not architecture.sites:
+        builders.constitutive_in(vector_2, gfp_promoter)
+        system.interface = sbol3.Interface(inputs=[vector_2], outputs=[gfp_pro])
+        return system
+    # Create the gRNA systems on a separate vector
+    vector_1 = add_feature(system, sbol3.LocalSubComponent([sbol3.SBO_DNA], name='V1'))
+    add_interaction(sbol3.SBO_DEGRADATION, name='Vector degradation', participants={vector_1: sbol3.SBO_REACTANT})
+    for idx_gRNA, n_interactions in enumerate(architecture.sites, start=1):
+        builders.make_gRNA_module(vector_1, dCas9_pro, gfp_promoter, True, idx_gRNA, n_interactions)
+    # Set the inputs and outputs as an interface, for generating the ODEs
+    system.interface = sbol3.Interface(inputs=[vector_1, vector_2], outputs=[gfp_pro])
+    return system
+
+
+def make_systems(doc: sbol3.Document, architectures: Iterable[Architecture]) -> List[sbol3.Component]:
+    """Build the systems for a collection of designs into one document
+
+    :param doc: document to add the systems to
+    :param architectures: designs to build
+    :return: system components, in the same order as the designs
+    """
+    return [make_system(doc, a) for a in architectures]
@@ -0,0 +1,152 @@
+"""Benchmark building, serializing, parsing, and exporting circuit models as the number of target sites grows
+
+For each N, a Multiplexed_N and a Multisite_N system are built through the builders, and each stage is timed.
+The rows are appended to a CSV file together with the commit they were measured at, so that the results of
+different commits can be compared, e.g.:
+
+    python sbol/benchmark_generation.py --output benchmarks.csv
+"""
+import argparse
+import csv
+import os
+import subprocess
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+import sbol3
+
+import architectures
+import latex_generation
+import matlab_generation
+from reaction_network import make_reaction_network
+
+BENCHMARK_NAMESPACE = 'http://bbn.com/apt-dcas9-regulation/benchmark'
+SITE_COUNTS = [1, 2, 4, 8, 16, 32, 64]
+STAGES = ['construct', 'serialize', 'parse', 'network', 'matlab', 'latex']
+"""Stages timed for each system, in the order that they are run"""
+COLUMNS = ['commit', 'system', 'sites', 'interactions', *(f'{s}_s' for s in STAGES), 'peak_memory_mb']
+
+
+def best_time(function: Callable[[], object], repeats: int) -> float:
+    """Get the fastest of several runs of a function, in seconds"""
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def peak_memory_mb(function: Callable[[], object]) -> float:
+    """Get the peak memory allocated by Python during one run of a function, in MB"""
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1] / (1 << 20)
+    finally:
+        tracemalloc.stop()
+
+
+def current_commit() -> str:
+    """Get the abbreviated hash of the checked-out commit, marked '+' if the tree has changes, or 'unknown'"""
+    directory = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=directory, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        changes = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=directory,
+                                 capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    return commit + ('+' if changes else '')
+
+
+def build(architecture: architectures.Architecture) -> sbol3.Document:
+    """Build a design into a document of its own"""
+    doc = sbol3.Document()
+    architectures.make_system(doc, architecture)
+    return doc
+
+
+def parse(data: str) -> sbol3.Document:
+    """Parse a document serialized as sorted N-Triples"""
+    doc = sbol3.Document()
+    doc.read_string(data, sbol3.SORTED_NTRIPLES)
+    return doc
+
+
+def export(architecture: architectures.Architecture):
+    """Run every stage once for a design: build, serialize, parse, and generate its models"""
+    data = build(architecture).write_string(sbol3.SORTED_NTRIPLES)
+    system = parse(data).find(architecture.display_id)
+    network = make_reaction_network(system)
+    matlab_generation.make_matlab_model(system, network=network)
+    latex_generation.make_latex_model(system, network=network)
+
+
+def benchmark(site_counts: List[int] = SITE_COUNTS, repeats: int = 3, commit: str = '') -> List[Dict[str, object]]:
+    """Time the stages of building and exporting Multiplexed_N and Multisite_N systems
+
+    Each stage is run on its own, so its time does not include the others. Memory is measured in a separate
+    run of all stages, since tracing allocations slows them down.
+
+    :param site_counts: numbers of target sites to benchmark
+    :param repeats: number of runs of each stage; the fastest is reported
+    :param commit: commit that the benchmark is run at, to record in each row
+    :return: one row per system, with the time of each stage in seconds and the peak memory in MB
+    """
+    sbol3.set_namespace(BENCHMARK_NAMESPACE)
+    rows = []
+    for n in site_counts:
+        for architecture in (architectures.multiplexed(n), architectures.multisite(n)):
+            data = build(architecture).write_string(sbol3.SORTED_NTRIPLES)
+            doc = parse(data)
+            system = doc.find(architecture.display_id)
+            network = make_reaction_network(system)
+            times = dict(
+                construct=best_time(lambda: build(architecture), repeats),
+                serialize=best_time(lambda: doc.write_string(sbol3.SORTED_NTRIPLES), repeats),
+                parse=best_time(lambda: parse(data), repeats),
+                network=best_time(lambda: make_reaction_network(system), repeats),
+                matlab=best_time(lambda: matlab_generation.make_matlab_model(system, network=network), repeats),
+                latex=best_time(lambda: latex_generation.make_latex_model(system, network=network), repeats))
+            rows.append(dict(commit=commit, system=architecture.display_id, sites=n,
+                             interactions=len(system.interactions),
+                             **{f'{s}_s': round(times[s], 6) for s in STAGES},
+                             peak_memory_mb=round(peak_memory_mb(lambda: export(architecture)), 3)))
+    return rows
+
+
+def write_rows(path: str, rows: List[Dict[str, object]]):
+    """Append rows to a CSV file of benchmark results, writing the header if the file is new"""
+    new = not os.path.exists(path) or os.path.getsize(path) == 0
+    with open(path, 'a', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS)
+        if new:
+            writer.writeheader()
+        writer.writerows(rows)
+
+
+def print_rows(rows: List[Dict[str, object]]):
+    """Print benchmark results as a table"""
+    print(f'{"system":<34}{"interactions":>13}' + ''.join(f'{s + " (s)":>14}' for s in STAGES) + f'{"memory (MB)":>13}')
+    for row in rows:
+        print(f'{row["system"]:<34}{row["interactions"]:>13}' + ''.join(f'{row[f"{s}_s"]:>14.4f}' for s in STAGES)
+              + f'{row["peak_memory_mb"]:>13.1f}')
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', help='CSV file to append the results to')
+    parser.add_argument('--sites', type=int, nargs='+', default=SITE_COUNTS, help='Numbers of target sites')
+    parser.add_argument('--repeats', type=int, default=3, help='Runs of each stage; the fastest is reported')
+    args = parser.parse_args(argv)
+    rows = benchmark(args.sites, args.repeats, current_commit())
+    print_rows(rows)
+    if args.output:
+        write_rows(args.output, rows)
+        print(f'Appended {len(rows)} rows to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,6 @@
 from typing import Tuple
 
 import sbol3
-import tyto
 
 ###########################
 # Modules:
@@ -9,14 +8,41 @@ from sbol_utilities.workarounds import get_toplevel
 from sbol_utilities.component import (
                                       add_feature,
                                       add_interaction,
-                                      constitutive,
                                       contains,
                                       order,
                                       regulate)
 
+import ontology
+import profiling
 from shared_global_names import RECOMBINATION
 
 
+@profiling.timed('builders.constitutive_in')
+def constitutive_in(vector: sbol3.Feature, target: sbol3.Feature) -> sbol3.Feature:
+    """Add a constitutive promoter regulating a target that is contained only in the given vector
+
+    This is equivalent to sbol_utilities' constitutive, but since the container is known it avoids
+    searching every constraint in the system for the target's containers, which makes building systems
+    with many gRNAs quadratic. It also takes the promoter role from the bundled ontology table rather
+    than a live ontology lookup.
+
+    Arguments:
+        vector (sbol3.Feature): Vector that contains the target
+        target (sbol3.Feature): Feature for the promoter to regulate
+
+    Returns:
+        promoter (sbol3.Feature): Newly created constitutive promoter
+    """
+    system = get_toplevel(vector)
+    promoter = add_feature(system,
+                           sbol3.LocalSubComponent([sbol3.SBO_DNA],
+                                                   roles=[ontology.SO_CONSTITUTIVE_PROMOTER]))
+    regulate(promoter, target, system)
+    contains(vector, promoter, system)
+    return promoter
+
+
+@profiling.timed('builders.make_gfp_dCas9_module')
 def make_gfp_dCas9_module(vector: sbol3.Feature) -> Tuple[sbol3.Feature]:
     """Add a module with GFP and dCas9 expression to the system
 
@@ -43,9 +69,9 @@ def make_gfp_dCas9_module(vector: sbol3.Feature) -> Tuple[sbol3.Feature]:
     # R, V2?)
     dCas9_cds = contains(vector,
                          sbol3.LocalSubComponent([sbol3.SBO_DNA],
-                                                 roles=[tyto.SO.CDS],
+                                                 roles=[sbol3.SO_CDS],
                                                  name="dCas9-coding"))
-    constitutive(dCas9_cds)
+    constitutive_in(vector, dCas9_cds)
     dCas9 = add_feature(system,
                         sbol3.LocalSubComponent([sbol3.SBO_PROTEIN],
                                                 name="dCas9"))
@@ -62,11 +88,11 @@ def make_gfp_dCas9_module(vector: sbol3.Feature) -> Tuple[sbol3.Feature]:
     ###########################################################################
     # Create GFP's promoter as part of the vector
     gfp_promoter = contains(vector, sbol3.LocalSubComponent([sbol3.SBO_DNA],
-                            roles=[tyto.SO.promoter]))
+                            roles=[sbol3.SO_PROMOTER]))
     # Create GFP's coding region
     gfp_cds = contains(vector,
                        sbol3.LocalSubComponent([sbol3.SBO_DNA],
-                                               roles=[tyto.SO.CDS],
+                                               roles=[sbol3.SO_CDS],
                                                name="GFP-coding"))
     # Add GFP protein to the system
     gfp = add_feature(system,
@@ -89,6 +115,7 @@ def make_gfp_dCas9_module(vector: sbol3.Feature) -> Tuple[sbol3.Feature]:
     return dCas9, gfp_promoter, gfp
 
 
+@profiling.timed('builders.make_gRNA_module')
 def make_gRNA_module(vector: sbol3.Feature,
                      dCas9: sbol3.Feature,
                      promoter: sbol3.Feature,
@@ -125,10 +152,10 @@ def make_gRNA_module(vector: sbol3.Feature,
     # Add constitutive expression of gRNA
     gRNA_cds = contains(vector,
                         sbol3.LocalSubComponent([sbol3.SBO_DNA],
-                                                roles=[tyto.SO.CDS],
+                                                roles=[sbol3.SO_CDS],
                                                 name="gRNA" + str(idx_gRNA)
                                                 + "-coding"))
-    constitutive(gRNA_cds)
+    constitutive_in(vector, gRNA_cds)
     gRNA = add_feature(system,
                        sbol3.LocalSubComponent([sbol3.SBO_RNA],
                                                name="gRNA" + str(idx_gRNA)))
@@ -168,6 +195,7 @@ def make_gRNA_module(vector: sbol3.Feature,
     return dCas9_gRNA
 
 
+@profiling.timed('builders.make_crispr_module')
 def make_crispr_module(vector: sbol3.Feature) -> Tuple[sbol3.Feature, sbol3.Feature]:
     """Add a CRISPR module to the system, comprising both genome editing and kill switch
 
@@ -180,16 +208,16 @@ def make_crispr_module(vector: sbol3.Feature) -> Tuple[sbol3.Feature, sbol3.Feat
         raise ValueError(f'System should be a component but was not: {system}')
 
     # Add constitutive Cas9 expression # TODO: Change so that it isn't always constitutive
-    cas9_cds = contains(vector, sbol3.LocalSubComponent([sbol3.SBO_DNA], roles=[tyto.SO.CDS], name="Cas9-coding"))
-    constitutive(cas9_cds)
+    cas9_cds = contains(vector, sbol3.LocalSubComponent([sbol3.SBO_DNA], roles=[sbol3.SO_CDS], name="Cas9-coding"))
+    constitutive_in(vector, cas9_cds)
     cas9 = add_feature(system, sbol3.LocalSubComponent([sbol3.SBO_PROTEIN], name="Cas9"))
     add_interaction(sbol3.SBO_GENETIC_PRODUCTION, {cas9_cds: sbol3.SBO_TEMPLATE, cas9: sbol3.SBO_PRODUCT})
     add_interaction(sbol3.SBO_DEGRADATION, name='Cas degradation', participants={cas9: sbol3.SBO_REACTANT})
 
     # Add the sgRNA coding regions
-    sgRNA1_dna = contains(vector, sbol3.LocalSubComponent([sbol3.SBO_DNA], roles=[tyto.SO.sgRNA], name="sgRNA1-coding"))
-    sgRNA2_dna = contains(vector, sbol3.LocalSubComponent([sbol3.SBO_DNA], roles=[tyto.SO.sgRNA], name="sgRNA2-coding"))
-    constitutive(sgRNA2_dna)
+    sgRNA1_dna = contains(vector, sbol3.LocalSubComponent([sbol3.SBO_DNA], roles=[ontology.SO_SGRNA], name="sgRNA1-coding"))
+    sgRNA2_dna = contains(vector, sbol3.LocalSubComponent([sbol3.SBO_DNA], roles=[ontology.SO_SGRNA], name="sgRNA2-coding"))
+    constitutive_in(vector, sgRNA2_dna)
 
     # Then their products and binding to Cas9
     sgRNA1 = add_feature(system, sbol3.LocalSubComponent([sbol3.SBO_RNA], name="sgRNA1"))
@@ -210,10 +238,10 @@ def make_crispr_module(vector: sbol3.Feature) -> Tuple[sbol3.Feature, sbol3.Feat
     ex_Cas9_1 = add_feature(system, sbol3.LocalSubComponent([sbol3.SBO_NON_COVALENT_COMPLEX], name="postedit Cas9-sgRNA1"))
     ex_Cas9_2 = add_feature(system, sbol3.LocalSubComponent([sbol3.SBO_NON_COVALENT_COMPLEX], name="postedit Cas9-sgRNA2"))
     edited_genome = add_feature(system, sbol3.LocalSubComponent([sbol3.SBO_DNA], name='edited genome'))
-    add_interaction(tyto.SBO.cleavage, name='Cas cleavage',
+    add_interaction(ontology.SBO_CLEAVAGE, name='Cas cleavage',
                     participants={Cas9_sgRNA1: sbol3.SBO_REACTANT, vector: sbol3.SBO_REACTANT,
                                   ex_Cas9_1: sbol3.SBO_PRODUCT})
-    add_interaction(tyto.SBO.cleavage, name='Cas cleavage',
+    add_interaction(ontology.SBO_CLEAVAGE, name='Cas cleavage',
                     participants={Cas9_sgRNA2: sbol3.SBO_REACTANT, genome: sbol3.SBO_REACTANT,
                                   edited_genome: sbol3.SBO_PRODUCT, ex_Cas9_2: sbol3.SBO_PRODUCT})
     add_interaction(sbol3.SBO_DEGRADATION, name='Cas degradation', participants={Cas9_sgRNA1: sbol3.SBO_REACTANT})
@@ -225,6 +253,7 @@ def make_crispr_module(vector: sbol3.Feature) -> Tuple[sbol3.Feature, sbol3.Feat
     return sgRNA1_dna, genome
 
 
+@profiling.timed('builders.make_tf_module')
 def make_tf_module(vector: sbol3.Feature, repressor: bool, second: bool = False) -> Tuple[sbol3.Feature, sbol3.Feature]:
     """Add a transcription factor regulation module to the system
 
@@ -241,13 +270,13 @@ def make_tf_module(vector: sbol3.Feature, repressor: bool, second: bool = False)
     name = "TF2" if second else "TF"
 
     # Add the cds of the TF, the TF, and the production relation between them
-    tf_cds = contains(vector, sbol3.LocalSubComponent([sbol3.SBO_DNA], roles=[tyto.SO.CDS], name=f'{name}-coding'))
+    tf_cds = contains(vector, sbol3.LocalSubComponent([sbol3.SBO_DNA], roles=[sbol3.SO_CDS], name=f'{name}-coding'))
     tf = add_feature(system, sbol3.LocalSubComponent([sbol3.SBO_PROTEIN], name=name))
     add_interaction(sbol3.SBO_GENETIC_PRODUCTION, {tf_cds: sbol3.SBO_TEMPLATE, tf: sbol3.SBO_PRODUCT})
     add_interaction(sbol3.SBO_DEGRADATION, name=f'{name} degradation', participants={tf: sbol3.SBO_REACTANT})
 
     # Make the promoter that is regulated by the TF and add its regulation
-    promoter = contains(vector, sbol3.LocalSubComponent([sbol3.SBO_DNA], roles=[tyto.SO.promoter]))
+    promoter = contains(vector, sbol3.LocalSubComponent([sbol3.SBO_DNA], roles=[sbol3.SO_PROMOTER]))
     if repressor:
         add_interaction(sbol3.SBO_INHIBITION, name=f'TF Repression',
                         participants={tf: sbol3.SBO_INHIBITOR, promoter: sbol3.SBO_INHIBITED})
@@ -259,6 +288,7 @@ def make_tf_module(vector: sbol3.Feature, repressor: bool, second: bool = False)
     return tf_cds, promoter
 
 
+@profiling.timed('builders.make_recombinase_module')
 def make_recombinase_module(vector: sbol3.Feature, cre_on: bool, second: bool = False) -> Tuple[sbol3.Feature, sbol3.Feature]:
     """Add a Cre-recombinase regulation module to the system
 
@@ -275,17 +305,17 @@ def make_recombinase_module(vector: sbol3.Feature, cre_on: bool, second: bool =
     name = "CreH" if second else "Cre"
 
     # Add the cds of the TF, the TF, and the production relation between them
-    cre_cds = contains(vector, sbol3.LocalSubComponent([sbol3.SBO_DNA], roles=[tyto.SO.CDS], name=f'{name}-coding'))
+    cre_cds = contains(vector, sbol3.LocalSubComponent([sbol3.SBO_DNA], roles=[sbol3.SO_CDS], name=f'{name}-coding'))
     cre = add_feature(system, sbol3.LocalSubComponent([sbol3.SBO_PROTEIN], name=name))
     add_interaction(sbol3.SBO_GENETIC_PRODUCTION, {cre_cds: sbol3.SBO_TEMPLATE, cre: sbol3.SBO_PRODUCT})
     add_interaction(sbol3.SBO_DEGRADATION, name=f'{name} degradation', participants={cre: sbol3.SBO_REACTANT})
 
     # Make the promoter region that is regulated by the TF and add its regulation
-    cre_region = contains(vector, sbol3.LocalSubComponent([sbol3.SBO_DNA], roles=[tyto.SO.engineered_region], name=f'{name} regulated region'))
-    edited_cre_region = contains(vector, sbol3.LocalSubComponent([sbol3.SBO_DNA], roles=[tyto.SO.engineered_region], name=f'edited {name} regulated region'))
-    promoter = contains(cre_region, sbol3.LocalSubComponent([sbol3.SBO_DNA], roles=[tyto.SO.promoter], name=f'{name} region promoter'))
-    cre_target1 = contains(cre_region, sbol3.LocalSubComponent([sbol3.SBO_DNA], roles=[tyto.SO.binding_site], name=f'{name} 5\' target'))
-    cre_target2 = contains(cre_region, sbol3.LocalSubComponent([sbol3.SBO_DNA], roles=[tyto.SO.binding_site], name=f'{name} 3\' target'))
+    cre_region = contains(vector, sbol3.LocalSubComponent([sbol3.SBO_DNA], roles=[sbol3.SO_ENGINEERED_REGION], name=f'{name} regulated region'))
+    edited_cre_region = contains(vector, sbol3.LocalSubComponent([sbol3.SBO_DNA], roles=[sbol3.SO_ENGINEERED_REGION], name=f'edited {name} regulated region'))
+    promoter = contains(cre_region, sbol3.LocalSubComponent([sbol3.SBO_DNA], roles=[sbol3.SO_PROMOTER], name=f'{name} region promoter'))
+    cre_target1 = contains(cre_region, sbol3.LocalSubComponent([sbol3.SBO_DNA], roles=[ontology.SO_BINDING_SITE], name=f'{name} 5\' target'))
+    cre_target2 = contains(cre_region, sbol3.LocalSubComponent([sbol3.SBO_DNA], roles=[ontology.SO_BINDING_SITE], name=f'{name} 3\' target'))
     if cre_on:  # wrap the targets around a terminator for Cre to turn off expression
         terminator = contains(cre_region, sbol3.LocalSubComponent([sbol3.SBO_DNA], roles=[sbol3.SO_TERMINATOR], name=f'{name}-targeted terminator'))
         order(promoter, cre_target1)
@@ -305,6 +335,7 @@ def make_recombinase_module(vector: sbol3.Feature, cre_on: bool, second: bool =
     return cre_cds, cre_region
 
 
+@profiling.timed('builders.add_complex_interference')
 def add_complex_interference(regulator: sbol3.feature, interferers: list):
     """Add interference reaction between the given gRNAs
 
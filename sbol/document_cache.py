@@ -0,0 +1,88 @@
+import hashlib
+import glob
+import os
+import pickle
+import tempfile
+import time
+from typing import NamedTuple, Optional
+
+import sbol3
+
+import profiling
+
+SNAPSHOT_DIRECTORY = '.snapshots'
+"""Default directory for snapshots, relative to the directory of the SBOL file"""
+
+
+class LoadedDocument(NamedTuple):
+    """Document read by load_document, with how it was loaded"""
+    document: sbol3.Document
+    """Parsed document"""
+    from_snapshot: bool
+    """True if the document was loaded from a snapshot, false if the SBOL file was parsed"""
+    seconds: float
+    """Wall-clock time taken to load the document"""
+
+
+def content_hash(path: str) -> str:
+    """Compute the SHA-256 hash of the contents of a file
+
+    :param path: file to hash
+    :return: hexadecimal digest
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def snapshot_path(path: str, digest: str, cache_dir: str) -> str:
+    """Get the snapshot file for a given content of an SBOL file
+
+    The name includes the pySBOL3 version, since snapshots hold its objects directly.
+
+    :param path: SBOL file
+    :param digest: content hash of the SBOL file
+    :param cache_dir: directory holding the snapshots
+    :return: path of the snapshot file
+    """
+    return os.path.join(cache_dir, f'{os.path.basename(path)}.{digest[:16]}.sbol3-{sbol3.__version__}.pickle')
+
+
+def load_document(path: str, cache_dir: Optional[str] = None) -> LoadedDocument:
+    """Read an SBOL file, reusing a snapshot of the parsed document if the file is unchanged since the last read
+
+    Parsing the RDF takes most of the time of the export scripts, so the parsed document is pickled into the
+    cache directory under a hash of the file contents. Snapshots of earlier contents of the same file are removed
+    when a new one is written, and a snapshot that cannot be loaded is ignored and replaced.
+
+    :param path: SBOL file to read
+    :param cache_dir: directory holding the snapshots; defaults to SNAPSHOT_DIRECTORY beside the SBOL file
+    :return: loaded document
+    """
+    start = time.perf_counter()
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(path)), SNAPSHOT_DIRECTORY)
+    with profiling.timer('snapshot.hash'):
+        snapshot = snapshot_path(path, content_hash(path), cache_dir)
+    if os.path.exists(snapshot):
+        try:
+            with profiling.timer('snapshot.load'), open(snapshot, 'rb') as f:
+                doc = pickle.load(f)
+            return LoadedDocument(doc, True, time.perf_counter() - start)
+        except (OSError, pickle.UnpicklingError, AttributeError, EOFError, ImportError):
+            pass  # fall through to parsing, which overwrites the bad snapshot
+
+    doc = sbol3.Document()
+    with profiling.timer('rdf.parse'):
+        doc.read(path)
+    os.makedirs(cache_dir, exist_ok=True)
+    for stale in glob.glob(os.path.join(cache_dir, f'{glob.escape(os.path.basename(path))}.*.pickle')):
+        os.remove(stale)
+    # Write to a temporary file first, so that concurrent readers never see a partial snapshot
+    handle, temporary = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    with profiling.timer('snapshot.write'), os.fdopen(handle, 'wb') as f:
+        pickle.dump(doc, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary, snapshot)
+    return LoadedDocument(doc, False, time.perf_counter() - start)
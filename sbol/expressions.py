@@ -0,0 +1,430 @@
+import re
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+
+class Expression:
+    """Base class for the nodes of a parsed rate law"""
+
+
+@dataclass(frozen=True)
+class Number(Expression):
+    value: float
+
+
+@dataclass(frozen=True)
+class Symbol(Expression):
+    name: str
+
+
+@dataclass(frozen=True)
+class Sum(Expression):
+    terms: Tuple[Expression, ...]
+
+
+@dataclass(frozen=True)
+class Negation(Expression):
+    operand: Expression
+
+
+@dataclass(frozen=True)
+class Product(Expression):
+    factors: Tuple[Expression, ...]
+
+
+@dataclass(frozen=True)
+class Quotient(Expression):
+    numerator: Expression
+    denominator: Expression
+
+
+@dataclass(frozen=True)
+class Power(Expression):
+    base: Expression
+    exponent: Expression
+
+
+@dataclass(frozen=True)
+class Function(Expression):
+    name: str
+    argument: Expression
+
+
+ZERO = Number(0)
+ONE = Number(1)
+
+
+###############################################################################
+# Constructors: these perform the light simplification needed to keep derivatives readable
+
+
+def add(*terms: Expression) -> Expression:
+    """Sum a set of expressions, flattening nested sums and folding constants"""
+    flat = []
+    constant = 0
+    for t in terms:
+        for s in (t.terms if isinstance(t, Sum) else (t,)):
+            if isinstance(s, Number):
+                constant += s.value
+            else:
+                flat.append(s)
+    if constant:
+        flat.append(Number(constant))
+    if not flat:
+        return ZERO
+    return flat[0] if len(flat) == 1 else Sum(tuple(flat))
+
+
+def neg(operand: Expression) -> Expression:
+    """Negate an expression"""
+    if isinstance(operand, Number):
+        return Number(-operand.value)
+    if isinstance(operand, Negation):
+        return operand.operand
+    return Negation(operand)
+
+
+def mul(*factors: Expression) -> Expression:
+    """Multiply a set of expressions, flattening nested products and folding constants"""
+    flat = []
+    constant = 1
+    for f in factors:
+        for g in (f.factors if isinstance(f, Product) else (f,)):
+            if isinstance(g, Negation):
+                constant = -constant
+                g = g.operand
+            if isinstance(g, Number):
+                constant *= g.value
+            else:
+                flat.append(g)
+    if constant == 0:
+        return ZERO
+    if abs(constant) != 1:
+        flat.insert(0, Number(abs(constant)))
+    product = ONE if not flat else flat[0] if len(flat) == 1 else Product(tuple(flat))
+    return neg(product) if constant < 0 else product
+
+
+def div(numerator: Expression, denominator: Expression) -> Expression:
+    """Divide one expression by another"""
+    if numerator == ZERO:
+        return ZERO
+    if isinstance(numerator, Negation):
+        return neg(div(numerator.operand, denominator))
+    if denominator == ONE:
+        return numerator
+    return Quotient(numerator, denominator)
+
+
+def power(base: Expression, exponent: Expression) -> Expression:
+    """Raise one expression to the power of another"""
+    if exponent == ZERO:
+        return ONE
+    if exponent == ONE:
+        return base
+    if isinstance(base, Number) and isinstance(exponent, Number):
+        return Number(base.value ** exponent.value)
+    return Power(base, exponent)
+
+
+def log(argument: Expression) -> Expression:
+    """Take the natural logarithm of an expression"""
+    if argument == ONE:
+        return ZERO
+    return Function('log', argument)
+
+
+###############################################################################
+# Parsing Matlab expressions, as generated by matlab_generation
+
+TOKEN_PATTERN = re.compile(r'\s*(?:(\d+\.?\d*(?:[eE][+-]?\d+)?)|([A-Za-z_]\w*(?:\.[A-Za-z_]\w*)?)|(.))')
+"""Pattern for one token: a number, a (possibly dotted) name, or a single-character operator"""
+
+
+def parse(text: str) -> Expression:
+    """Parse a Matlab expression into an expression tree
+
+    Products and quotients are gathered into a single numerator over a single denominator, which is
+    mathematically identical to Matlab's left-to-right evaluation.
+
+    :param text: Matlab expression, using only numbers, names, + - * / ^ and parentheses
+    :return: expression tree
+    """
+    tokens = [m.groups() for m in TOKEN_PATTERN.finditer(text.strip())]
+    position = 0
+
+    def peek() -> str:
+        return tokens[position][2] if position < len(tokens) else None
+
+    def take(operator: str):
+        nonlocal position
+        if peek() != operator:
+            raise ValueError(f'Expected "{operator}" at token {position} in expression: {text}')
+        position += 1
+
+    def parse_sum() -> Expression:
+        nonlocal position
+        terms = [parse_product()]
+        while peek() in ('+', '-'):
+            operator = peek()
+            position += 1
+            term = parse_product()
+            terms.append(term if operator == '+' else neg(term))
+        return add(*terms)
+
+    def parse_product() -> Expression:
+        nonlocal position
+        numerator = [parse_unary()]
+        denominator = []
+        while peek() in ('*', '/'):
+            operator = peek()
+            position += 1
+            (numerator if operator == '*' else denominator).append(parse_unary())
+        return div(mul(*numerator), mul(*denominator))
+
+    def parse_unary() -> Expression:
+        nonlocal position
+        if peek() in ('+', '-'):
+            operator = peek()
+            position += 1
+            operand = parse_unary()
+            return operand if operator == '+' else neg(operand)
+        return parse_power()
+
+    def parse_power() -> Expression:
+        nonlocal position
+        base = parse_primary()
+        while peek() == '^':
+            position += 1
+            base = power(base, parse_unary() if peek() in ('+', '-') else parse_primary())
+        return base
+
+    def parse_primary() -> Expression:
+        nonlocal position
+        if position >= len(tokens):
+            raise ValueError(f'Unexpected end of expression: {text}')
+        number, name, operator = tokens[position]
+        position += 1
+        if number:
+            return Number(float(number))
+        if name:
+            if peek() == '(':
+                take('(')
+                argument = parse_sum()
+                take(')')
+                return Function(name, argument)
+            return Symbol(name)
+        if operator == '(':
+            inner = parse_sum()
+            take(')')
+            return inner
+        raise ValueError(f'Unexpected "{operator}" at token {position - 1} in expression: {text}')
+
+    expression = parse_sum()
+    if position != len(tokens):
+        raise ValueError(f'Unexpected "{peek()}" at token {position} in expression: {text}')
+    return expression
+
+
+###############################################################################
+# Symbolic manipulation
+
+
+def symbols(expression: Expression) -> Set[str]:
+    """Collect the names of all of the symbols in an expression"""
+    if isinstance(expression, Symbol):
+        return {expression.name}
+    return set().union(*(symbols(c) for c in children(expression)))
+
+
+def children(expression: Expression) -> Tuple[Expression, ...]:
+    """Get the immediate sub-expressions of an expression"""
+    if isinstance(expression, Sum):
+        return expression.terms
+    if isinstance(expression, Product):
+        return expression.factors
+    if isinstance(expression, Negation):
+        return expression.operand,
+    if isinstance(expression, Quotient):
+        return expression.numerator, expression.denominator
+    if isinstance(expression, Power):
+        return expression.base, expression.exponent
+    if isinstance(expression, Function):
+        return expression.argument,
+    return ()
+
+
+def substitute(expression: Expression, values: Dict[str, Expression]) -> Expression:
+    """Replace symbols in an expression
+
+    :param expression: expression to rewrite
+    :param values: dictionary of symbol name to replacement expression
+    :return: rewritten expression
+    """
+    if isinstance(expression, Symbol):
+        return values.get(expression.name, expression)
+    if isinstance(expression, Sum):
+        return add(*(substitute(t, values) for t in expression.terms))
+    if isinstance(expression, Product):
+        return mul(*(substitute(f, values) for f in expression.factors))
+    if isinstance(expression, Negation):
+        return neg(substitute(expression.operand, values))
+    if isinstance(expression, Quotient):
+        return div(substitute(expression.numerator, values), substitute(expression.denominator, values))
+    if isinstance(expression, Power):
+        return power(substitute(expression.base, values), substitute(expression.exponent, values))
+    if isinstance(expression, Function):
+        return Function(expression.name, substitute(expression.argument, values))
+    return expression
+
+
+def differentiate(expression: Expression, name: str) -> Expression:
+    """Take the partial derivative of an expression with respect to a symbol
+
+    :param expression: expression to differentiate
+    :param name: name of the symbol to differentiate with respect to
+    :return: derivative expression, ZERO if the expression does not depend on the symbol
+    """
+    if isinstance(expression, Number):
+        return ZERO
+    if isinstance(expression, Symbol):
+        return ONE if expression.name == name else ZERO
+    if isinstance(expression, Sum):
+        return add(*(differentiate(t, name) for t in expression.terms))
+    if isinstance(expression, Negation):
+        return neg(differentiate(expression.operand, name))
+    if isinstance(expression, Product):
+        factors = expression.factors
+        terms = []
+        for i, f in enumerate(factors):
+            d = differentiate(f, name)
+            if d != ZERO:
+                terms.append(mul(*factors[:i], d, *factors[i + 1:]))
+        return add(*terms)
+    if isinstance(expression, Quotient):
+        numerator, denominator = expression.numerator, expression.denominator
+        d_numerator = differentiate(numerator, name)
+        d_denominator = differentiate(denominator, name)
+        if d_denominator == ZERO:
+            return div(d_numerator, denominator)
+        return div(add(mul(d_numerator, denominator), neg(mul(numerator, d_denominator))),
+                   power(denominator, Number(2)))
+    if isinstance(expression, Power):
+        base, exponent = expression.base, expression.exponent
+        d_base = differentiate(base, name)
+        d_exponent = differentiate(exponent, name)
+        if d_exponent == ZERO:
+            if d_base == ZERO:
+                return ZERO
+            return mul(exponent, power(base, add(exponent, Number(-1))), d_base)
+        if d_base == ZERO:
+            return mul(expression, log(base), d_exponent)
+        return mul(expression, add(mul(d_exponent, log(base)), div(mul(exponent, d_base), base)))
+    if isinstance(expression, Function):
+        if expression.name != 'log':
+            raise ValueError(f'Cannot differentiate function {expression.name}')
+        return div(differentiate(expression.argument, name), expression.argument)
+    raise ValueError(f'Cannot differentiate {expression}')
+
+
+###############################################################################
+# Serialization
+
+SUM, NEGATION, PRODUCT, POWER, ATOM = range(5)
+"""Operator precedence levels, lowest binding first"""
+
+
+def precedence(expression: Expression) -> int:
+    """Get the precedence level of the outermost operator of an expression"""
+    if isinstance(expression, Sum):
+        return SUM
+    if isinstance(expression, Negation) or (isinstance(expression, Number) and expression.value < 0):
+        return NEGATION
+    if isinstance(expression, (Product, Quotient)):
+        return PRODUCT
+    if isinstance(expression, Power):
+        return POWER
+    return ATOM
+
+
+def format_number(value: float) -> str:
+    """Serialize a number, dropping the fractional part of integers"""
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def serialize(expression: Expression, symbol: Callable[[str], str], power_operator: str,
+              function: Callable[[str], str]) -> str:
+    """Serialize an expression tree, parenthesizing only where needed
+
+    :param expression: expression to serialize
+    :param symbol: function mapping symbol names to target-language names
+    :param power_operator: exponentiation operator of the target language
+    :param function: function mapping function names to target-language names
+    :return: serialized expression
+    """
+    def wrap(e: Expression, minimum: int) -> str:
+        text = serialize(e, symbol, power_operator, function)
+        return f'({text})' if precedence(e) < minimum else text
+
+    if isinstance(expression, Number):
+        return format_number(expression.value)
+    if isinstance(expression, Symbol):
+        return symbol(expression.name)
+    if isinstance(expression, Sum):
+        text = wrap(expression.terms[0], SUM)
+        for t in expression.terms[1:]:
+            if isinstance(t, Negation):
+                text += f' - {wrap(t.operand, PRODUCT)}'
+            elif isinstance(t, Number) and t.value < 0:
+                text += f' - {format_number(-t.value)}'
+            else:
+                text += f' + {wrap(t, SUM)}'
+        return text
+    if isinstance(expression, Negation):
+        return f'-{wrap(expression.operand, PRODUCT)}'
+    if isinstance(expression, Product):
+        return '*'.join(wrap(f, PRODUCT) for f in expression.factors)
+    if isinstance(expression, Quotient):
+        return f'{wrap(expression.numerator, PRODUCT)}/{wrap(expression.denominator, POWER)}'
+    if isinstance(expression, Power):
+        return f'{wrap(expression.base, ATOM)}{power_operator}{wrap(expression.exponent, ATOM)}'
+    if isinstance(expression, Function):
+        return f'{function(expression.name)}({serialize(expression.argument, symbol, power_operator, function)})'
+    raise ValueError(f'Cannot serialize {expression}')
+
+
+def to_matlab(expression: Expression) -> str:
+    """Serialize an expression tree as a Matlab expression"""
+    return serialize(expression, lambda name: name, '^', lambda name: name)
+
+
+def to_python(expression: Expression, symbol: Callable[[str], str]) -> str:
+    """Serialize an expression tree as a Python expression over NumPy values
+
+    :param expression: expression to serialize
+    :param symbol: function mapping Matlab symbol names to Python variable names
+    :return: serialized expression
+    """
+    return serialize(expression, symbol, '**', lambda name: f'np.{name}')
+
+
+def jacobian_entries(derivatives: Dict[str, Expression], variables: List[str],
+                     wrt: Optional[List[str]] = None) -> List[Tuple[int, int, Expression]]:
+    """Compute the non-zero entries of the Jacobian of a system of derivatives
+
+    :param derivatives: dictionary of variable name to the expression for its derivative
+    :param variables: variable names, in state vector order
+    :param wrt: names of the symbols to differentiate with respect to (e.g., the parameters); defaults to the
+        variables
+    :return: list of (row, column, expression), with 0-based indices, sorted by row then column
+    """
+    entries = []
+    for row, v in enumerate(variables):
+        expression = derivatives[v]
+        present = symbols(expression)
+        for column, w in enumerate(variables if wrt is None else wrt):
+            if w in present:
+                entry = differentiate(expression, w)
+                if entry != ZERO:
+                    entries.append((row, column, entry))
+    return entries
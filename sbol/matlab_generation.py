@@ -1,16 +1,20 @@
-import logging
-from itertools import permutations, chain
+import re
+from itertools import permutations
 from collections import UserDict
-from typing import Dict, List, Optional, Union, Tuple
+from typing import Dict, List, NamedTuple, Optional, Union, Tuple
 
 import sbol3
-import tyto
-from sbol_utilities.helper_functions import id_sort
-from sbol_utilities.component import in_role, all_in_role
 
+import expressions
+import ontology
+import optimization
+import profiling
+from reaction_network import Modulation, ReactionNetwork, Term, interfering_regulators, make_reaction_network
 from shared_global_names import RECOMBINATION
 
 SPECIES_PREFIX = 'sp.'
+SPECIES_PATTERN = re.compile(r'(?<![\w.])sp\.\w+')
+"""Pattern matching a species reference in a Matlab expression"""
 
 
 class VariableDictionary(UserDict):
@@ -72,76 +76,61 @@ def differential(variable: Union[sbol3.Feature, str]) -> str:
     return f'd_{variable}'
 
 
-def regulation_term(interaction: sbol3.Interaction,
-                    all_interactions: Dict[sbol3.Feature,
-                                           List[sbol3.Interaction]],
+def regulation_term(modulation: Modulation,
+                    network: ReactionNetwork,
                     parameters: ParameterDictionary,
                     variables: VariableDictionary,
                     i_matrix_entries) -> str:
     """Generate a term for regulation by transcription factor or recombinase
 
-    :param interaction: Regulation interaction to serialize
-    :param all_interactions: 
+    :param modulation: Regulation to serialize
+    :param network: Reaction network of the system
     :param parameters: Known parameters for system
     :param variables: Known variables for system
     :param i_matrix_entries:
     :return: Matlab equation term
     """
-    # Need i_type to see what type of regulation is happening
-    i_type = interaction.types[0]
+    if modulation.regulator is None:
+        return ''
     # Make TF Equations
-    if i_type == sbol3.SBO_INHIBITION:
-        species = in_role(interaction, sbol3.SBO_INHIBITOR)
+    if modulation.kind == sbol3.SBO_INHIBITION:
         # TODO: Consider replacing K and n with variables
         k = parameters['K_R']
         n = parameters['n']
-    elif i_type == sbol3.SBO_STIMULATION:
-        species = in_role(interaction, sbol3.SBO_STIMULATOR)
+    elif modulation.kind == sbol3.SBO_STIMULATION:
         # TODO: Consider replacing K and n with variables
         k = parameters['K_A']
         n = parameters['n']
+    # Make Cre equations
+    else:
+        return f'({variables[modulation.regulator]}/AAV)' # TODO: replace AAV w. variable
     # Get the effective concentration of the regulator
     # If you are assuming that there is no interference between the gRNAs, the
     # effective concentration is just the concentration of the species
-    effective_regulator_concentration = variables[species]
+    effective_regulator_concentration = variables[modulation.regulator]
     # If there is interference between the gRNAs, include the interference
     # coefficients in the effective concentration with the following line
-    # effective_regulator_concentration = effective_concentration(species, all_interactions, variables, i_matrix_entries)
-    if i_type == sbol3.SBO_INHIBITION:
+    # effective_regulator_concentration = effective_concentration(modulation.regulator, network, variables, i_matrix_entries)
+    if modulation.kind == sbol3.SBO_INHIBITION:
         # The parentheses are unnecessary when you are assuming that there is
         # no interference, but included to make it easy to include interference
         return f'({k}^{n})/({k}^{n} + ({effective_regulator_concentration})^{n})'
-    elif i_type == sbol3.SBO_STIMULATION:
-        return f'({variables[species]}^{n})/({k}^{n} + ({effective_regulator_concentration})^{n})'
-    # Make Cre equations
-    elif i_type == RECOMBINATION:
-        target = in_role(interaction, sbol3.SBO_MODIFIED)
-        if any(tyto.SO.promoter.is_ancestor_of(r) for r in target.roles):  # Cre-off
-            original = in_role(interaction, sbol3.SBO_REACTANT)
-            return f'({variables[original]}/AAV)' # TODO: replace AAV w. variable
-        elif any(tyto.SO.terminator.is_ancestor_of(r) for r in target.roles):  # Cre-on
-            recombined = in_role(interaction, sbol3.SBO_PRODUCT)
-            return f'({variables[recombined]}/AAV)' # TODO: replace AAV w. variable
-        else:
-            raise ValueError(f'Cannot give term for recombination on roles {target.roles} in {interaction.identity}')
     else:
-        logging.warning(f'Cannot serialize regulation {interaction.identity}, type {tyto.SBO.get_term_by_uri(i_type)}')
-        return ''
+        return f'({variables[modulation.regulator]}^{n})/({k}^{n} + ({effective_regulator_concentration})^{n})'
 
 
-def effective_concentration(feature: sbol3.Feature, all_interactions: Dict[sbol3.Feature, List[sbol3.Interaction]], variables, i_matrix_entries):
+def effective_concentration(feature: sbol3.Feature, network: ReactionNetwork, variables, i_matrix_entries):
     """Create a string of the effective concentration of a regulator, based on
     its concentration and the concentration of the other regulators that
     interfere with its action
 
     :param feature: Feature for the regulator of interests
-    :param all_interactions:
+    :param network: Reaction network of the system
     :return: matlab variable for feature, possibly modulated by interferers
     """
-    # TODO: See if I can regenerate the all_interactions dict here, rather than needing to pass it down
     symbol = variables[feature]
     # Look for interference interactions with other regulators
-    interferers = find_interfering_regulators(feature, all_interactions)
+    interferers = interfering_regulators(network, feature)
     # For every interference interaction
     for interferer in interferers:
         # Get the parameter for the interaction term
@@ -152,127 +141,41 @@ def effective_concentration(feature: sbol3.Feature, all_interactions: Dict[sbol3
     return symbol
 
 
-def find_interfering_regulators(feature: sbol3.feature,
-                                all_interactions: Dict[sbol3.Feature,
-                                                       List[sbol3.Interaction]]) -> list:
-    """Find all other regulators that interfere with a given regulator
-
-    :param feature: Feature for the regulator of interest
-    :param all_interactions: (TODO: SEE IF THERE IS A WAY I CAN GET RID OF THIS)
-    :return: a list of sbol features that interfere with the given regulator
-    """
-    # Get the interactions just for this feature
-    interactions = all_interactions[feature]
-    # Filter the interactions to get just the "Control" interactions
-    control_interactions = [interaction
-                            for interaction in interactions
-                            if sbol3.SBO_CONTROL in interaction.types]
-    # Search those interactions for the interactions where this feature is the
-    # thing being controlled (modified), and then save the modifier to a list
-    interfering_regulators = []
-    for interaction in control_interactions:
-        for participant in interaction.participations:
-            # The participant that is not our main feature and does the
-            # modifying is our interferer
-            if (participant.participant != feature.identity) and (sbol3.SBO_MODIFIER in participant.roles):
-                # Add the feature for that interferer to our list
-                # TODO: I didn't know you could access the document from a
-                # lower level object like this, see if I can use that anywhere
-                # to simplify the variables I have to pass down!
-                interfering_regulators.append(participant.document.find(participant.participant))
-
-    return id_sort(interfering_regulators)
-
-
-def interaction_to_term(feature: sbol3.Feature,
-                        interaction: sbol3.Interaction,
-                        all_interactions: Dict[sbol3.Feature,
-                                               List[sbol3.Interaction]],
-                        regulation: Dict[sbol3.Feature,
-                                         List[sbol3.Interaction]],
-                        containers: Dict[sbol3.Feature, List[sbol3.Feature]],
+@profiling.timed('matlab.interaction_to_term')
+def interaction_to_term(term: Term,
+                        network: ReactionNetwork,
                         parameters: ParameterDictionary,
                         variables: VariableDictionary,
                         i_matrix_entries: IntMatrixDictionary) -> Optional[str]:
-    """Generate an equation term for a given interaction, with respect to the
-    included feature
+    """Generate an equation term for a given term of the reaction network
 
-    :param feature: Target of the term
-    :param interaction: Interaction to get an equation for
-    :param regulation: Dictionary of regulation interactions in system
-    :param containers: Dictionary of container relationships in system
+    :param term: Term to serialize
+    :param network: Reaction network of the system
     :param parameters: Known parameters for system
     :param variables: Known variables for system
     :param i_matrix_entries: Known interference matrix entries for this system
     :return: Matlab equation term
     """
-    if len(interaction.types) != 1:
-        raise ValueError(f'Expected 1 interaction type but found {len(interaction.types)} in {interaction.identity}')
-    if len(feature.types) != 1:
-        raise ValueError(f'Expected 1 feature type but found {len(feature.types)} in {feature.identity}')
-    # find the participation for this feature and its role therein
-    feature_participation = [p for p in interaction.participations if p.participant == feature.identity]
-    if len(feature_participation) != 1:
-        raise ValueError(f'Expected feature in 1 participant, but found {len(feature_participation)} in {interaction.identity}')
-    if len(feature_participation[0].roles) != 1:
-        raise ValueError(f'Do not know how to serialize multi-role participation {feature_participation[0]}')
-    i_type = interaction.types[0]
+    feature = term.species
     f_type = feature.types[0]
-    role = feature_participation[0].roles[0]
-
-    # serialize based on interaction type and role
-    if i_type == sbol3.SBO_GENETIC_PRODUCTION:
-        if role == sbol3.SBO_TEMPLATE:
-            return None  # templates don't get equations
-        elif role == sbol3.SBO_PRODUCT:
-            species_name = matlab_name(feature)
-            template = in_role(interaction, sbol3.SBO_TEMPLATE)
-            # modulation is the regulation of either the template or the product
-            modulators = id_sort(regulation[feature] + regulation[template])
-            # If all modulators work on the same participants (by default 1
-            # modulator can only work on the same participants) use the 
-            # original regulation term so I don't add the interaction terms
-            # This assumes that the interaction only has 2 participants
-            modulation_participants = set()
-            for interaction in modulators:
-                for participation in interaction.participations:
-                    modulation_participants.add(str(participation.participant))
-            modulation = '*'.join(regulation_term(r, all_interactions, parameters, variables, i_matrix_entries)
-                                    for r in modulators)
-            # context is the constraints of the template
-            context = ''.join(variables[ct] for ct in containers[template])
-            if f_type == sbol3.SBO_RNA:
-                prod_rate = parameters[f'alpha_r_{species_name}']
-            elif f_type == sbol3.SBO_PROTEIN:
-                prod_rate = parameters[f'alpha_p_{species_name}']
-            else:
-                raise ValueError(f'Cannot handle type '
-                                 f'{tyto.SBO.get_term_by_uri(f_type)} in '
-                                 f'{feature_participation[0]}')
-            return f'+ {"*".join(filter(None, [prod_rate, modulation, context]))}'
-        else:
-            logging.warning(f'Cannot serialize role in {interaction.identity}'
-                            f' , type {tyto.SBO.get_term_by_uri(i_type)}')
-    elif i_type == tyto.SBO.cleavage:
-        if interaction.name == 'Cas cleavage':
-            reactants = [variables[f] for f in all_in_role(interaction, sbol3.SBO_REACTANT)]
-            [variables[f] for f in all_in_role(interaction, sbol3.SBO_PRODUCT)] # Get products into the variable table
-            rate = parameters['k_cat']
-            if role == sbol3.SBO_REACTANT:
-                sign = '-'
-            elif role == sbol3.SBO_PRODUCT:
-                sign = '+'
-            else:
-                raise ValueError (f'Unexpected role in {interaction.identity}: {tyto.SBO.get_term_by_uri(role)}')
-            return f'{sign} {rate}*' + '*'.join(reactants)
+
+    # serialize based on interaction type
+    if term.kind == sbol3.SBO_GENETIC_PRODUCTION:
+        species_name = matlab_name(feature)
+        modulation = '*'.join(regulation_term(m, network, parameters, variables, i_matrix_entries)
+                              for m in term.modulators)
+        context = '*'.join(variables[ct] for ct in term.context)
+        if f_type == sbol3.SBO_RNA:
+            prod_rate = parameters[f'alpha_r_{species_name}']
         else:
-            raise ValueError(f'No model for cleavage {interaction.name} in '
-                             f'{interaction.identity}')
-    elif i_type == sbol3.SBO_DEGRADATION:
-        if len(interaction.participations) != 1:
-            raise ValueError(f'Degradation assumed to have 1 participant, '
-                             f'found {len(interaction.participations)} in '
-                             f'{interaction.identity}')
+            prod_rate = parameters[f'alpha_p_{species_name}']
+        return f'+ {"*".join(filter(None, [prod_rate, modulation, context]))}'
+    elif term.kind == ontology.SBO_CLEAVAGE:
+        reactants = [variables[f] for f in term.reactants]
+        [variables[f] for f in term.products] # Get products into the variable table
+        rate = parameters['k_cat']
+        return f'{term.sign} {rate}*' + '*'.join(reactants)
+    elif term.kind == sbol3.SBO_DEGRADATION:
         if f_type == sbol3.SBO_RNA:
             deg_rate = parameters[f'delta_g']
             dilution_rate = parameters['lambda']
@@ -280,107 +183,247 @@ def interaction_to_term(feature: sbol3.Feature,
         elif f_type == sbol3.SBO_PROTEIN or f_type == f_type == sbol3.SBO_DNA or f_type == sbol3.SBO_NON_COVALENT_COMPLEX:
             dilution_rate = parameters['lambda']
             return f'- {dilution_rate}*{variables[feature]}'
-    elif i_type == sbol3.SBO_NON_COVALENT_BINDING:
-        reactants = [variables[f] for f in all_in_role(interaction, sbol3.SBO_REACTANT)]
-        [variables[f] for f in all_in_role(interaction, sbol3.SBO_PRODUCT)]  # Get products into the variable table
-        rate = parameters[interaction]  # TODO: move this into actual parameters rather than name
-        if role == sbol3.SBO_REACTANT:
-            sign = '-'
-        elif role == sbol3.SBO_PRODUCT:
-            sign = '+'
-        else:
-            raise ValueError(f'Cannot handle type {tyto.SBO.get_term_by_uri(f_type)} in {interaction.identity}')
-        return f'{sign} {rate}*' + '*'.join(reactants)
-    elif i_type == sbol3.SBO_INHIBITION or i_type == sbol3.SBO_STIMULATION:
-        # Pass for the regulation interactions that are taken care of in the other function, so you don't get a warning
-        pass
-    elif i_type == RECOMBINATION:
-        if role == sbol3.SBO_MODIFIER or role == sbol3.SBO_MODIFIED:
-            return None  # no effect on Cre concentration, not modeling excised element
-        reactant = in_role(interaction, sbol3.SBO_REACTANT)
-        recombinase = variables[in_role(interaction, sbol3.SBO_MODIFIER)]
-        ct = containers[reactant]
-        if len(ct) != 1:
-            raise ValueError(f'Recombination expected 1 context, got {len(ct)} in {interaction.identity}')
-        context = ct[0]
+    elif term.kind == sbol3.SBO_NON_COVALENT_BINDING:
+        reactants = [variables[f] for f in term.reactants]
+        [variables[f] for f in term.products]  # Get products into the variable table
+        rate = parameters[term.interaction]  # TODO: move this into actual parameters rather than name
+        return f'{term.sign} {rate}*' + '*'.join(reactants)
+    elif term.kind == RECOMBINATION:
+        reactant = term.reactants[0]
+        recombinase = variables[term.modifier]
+        context = term.context[0]
         rate = parameters['k_cre'] # TODO: move this into actual parameters rather than name
-        if role == sbol3.SBO_REACTANT:
-            sign = '-'
-        elif role == sbol3.SBO_PRODUCT:
-            sign = '+'
-        else:
-            raise ValueError(f'Cannot handle type {tyto.SBO.get_term_by_uri(f_type)} in {interaction.identity}')
-        return f'{sign} {rate}*{variables[reactant]}*{recombinase}^4 + ' \
+        return f'{term.sign} {rate}*{variables[reactant]}*{recombinase}^4 + ' \
                f'({variables[feature]}/{variables[context]})*{differential(context)}'
-    else:
-        logging.warning(f'Cannot serialize interaction {interaction.identity} of type {tyto.SBO.get_term_by_uri(i_type)}')
-        return None
+    return None
 
 # TODO: consider switch from ode45 to ode15s
-ode_template = '''function [time_interval, species_names, y_out, y] = {}(time_span, parameters, initial, step)
+ode_template = '''function [time_interval, species_names, y_out, y{18}] = {0}(time_span, parameters, initial, step, parameter_index)
 % time_span is the hours values [start, stop]
-% parameters is a Map of names to numbers (e.g., rate constants, decay rates, Hill coefficients)
+% parameters is a Map of names to numbers (e.g., rate constants, decay rates, Hill coefficients),
+%   or a numeric vector of parameter values indexed by parameter_index
 % initial is a Map of variable names to initial values
 % step is the number of hours between samples in output; defaults to 1
+% parameter_index is a Map of parameter names to their index in a numeric parameters vector
 % Returns vector of time, matrix of output levels at those time points, matrix of all species
-    if nargin < 4, step = 1; end
+    if nargin < 4 || isempty(step), step = 1; end
+
+    % Resolve the parameters to a vector in the order used by the ODE (once per solve)
+    parameter_names = {{{7}}};
+    if nargin < 5
+        p = cell2mat(values(parameters, parameter_names));
+    else
+        p = parameters(cell2mat(values(parameter_index, parameter_names)));
+    end{16}
     
     % Define names for input/output variable indexes
-    {}
+    {1}
 
     % Set initial values
-    y0=zeros(1,{});
-    {}
+    y0=zeros(1,{2});
+    {3}
 
     % Set the species names (in the same order as in the ODE)
-    species_names = {};
+    species_names = {4};
+
+    % Set the Jacobian and its sparsity pattern (row and column of each non-zero entry)
+    j_rows = [{10}];
+    j_cols = [{11}];
+    options = odeset('Jacobian', @(t,x) jacobian(t, x, p, j_rows, j_cols), ...
+        'JPattern', sparse(j_rows, j_cols, 1, {2}, {2}));{19}
     
     % Run ODE
-    solution = {}(@(t,x) diff_eq(t, x, parameters, species_names), time_span, y0);
+    solution = {5}(@(t,x) diff_eq(t, x, p), time_span, y0, options);
     
     % Evaluate species levels at given times
     time_interval = time_span(1):step:time_span(end);
     y = deval(solution, time_interval);
-    y_out = y([{}],:);
+    y_out = y([{6}],:);
 end
 
 % ODE differential function
-function dx=diff_eq(t, x, parameters, species_names)
-    % Unpack parameters from parameter map (and the i_matrix)
-    {}
-    {}
+function dx=diff_eq(t, x, p)
+    % Unpack parameters from parameter vector (and the i_matrix)
+    {8}
 
     % Unpack individual species from x
     x = max(1e-12,real(x)); % Truncate values just above zero
-    sp = packSpeciesStruct(species_names, x);
+    {9}
 
     % Compute derivative for each species
-    {}
+    {12}
 
     % Pack derivatives for return, ensuring none are complex or go below zero
-    dx = max(-x,real([{}])');
+    dx = max(-x,real([{13}])');
 end
-'''
-"""Template for the Matlab simulation, including both the runner and the step function.
+
+% Jacobian of the ODE differential function (not including the truncation at zero)
+function J=jacobian(t, x, p, j_rows, j_cols)
+    % Unpack parameters from parameter vector (and the i_matrix)
+    {8}
+
+    % Unpack individual species from x
+    x = max(1e-12,real(x)); % Truncate values just above zero
+    {9}
+
+    % Compute each non-zero entry of the Jacobian
+    values = zeros({14}, 1);
+    {15}
+
+    % Pack entries into a sparse matrix
+    J = sparse(j_rows, j_cols, real(values), {2}, {2});
+end
+{17}{20}'''
+
+"""Template for the Matlab simulation, including the runner, the step function, and its Jacobian.
 Format parameters are:
 
- 1 protocol name
- 2 Input/output variable names: VARIABLE = i
- 3 Number of variables (integer)
- 4 Initial value assignments for input variables: y0(VARIABLE) = initial(i)
+ 0 protocol name
+ 1 Input/output variable names: VARIABLE = i
+ 2 Number of variables (integer)
+ 3 Initial value assignments for input variables: y0(VARIABLE) = initial(i)
+ 4 Species names: ["VARIABLE", "VARIABLE", ...]
  5 ODE function (ode45 or ode15s)
  6 Output indices: VARIABLE, VARIABLE, ...
- 7 Parameter names: PARAMETER = i
- 8 Unpacking of variables from x value: VARIABLE = x(i)
- 9 Derivative equations for each species: dVARIABLE = EXPRESSION
- 10 Packing of derivatives for return value: dVARIABLE, dVARIABLE, ...
+ 7 Parameter names, including interference matrix entries: 'PARAMETER', 'PARAMETER', ...
+ 8 Parameter unpacking: PARAMETER = p(i)
+ 9 Species unpacking: sp_VARIABLE = x(i)
+ 10 Jacobian row of each non-zero entry: i, i, ...
+ 11 Jacobian column of each non-zero entry: j, j, ...
+ 12 Derivative equations for each species: dVARIABLE = EXPRESSION
+ 13 Packing of derivatives for return value: dVARIABLE, dVARIABLE, ...
+ 14 Number of non-zero Jacobian entries (integer)
+ 15 Jacobian entry equations: values(k) = EXPRESSION
+ 16 Appending of the hoisted subexpressions to the parameter vector, if optimized
+ 17 Function computing the hoisted subexpressions, if optimized
+ 18 Sensitivities output, if the model has sensitivity equations: , sensitivities
+ 19 Solve of the sensitivity system, if the model has sensitivity equations (see sensitivity_solve_template)
+ 20 Functions of the sensitivity system, if the model has sensitivity equations (see sensitivity_functions_template)
+"""
+
+invariants_template = '''
+% Parameter-only subexpressions of the ODE, hoisted out of it so that they are computed once per solve
+function q=invariants(p)
+    % Unpack parameters from parameter vector (and the i_matrix)
+    {0}
+
+    % Compute each parameter-only subexpression
+    {1}
+
+    q = [{2}];
+end
+'''
+"""Template for the function computing the hoisted subexpressions of an optimized Matlab model.
+Format parameters are:
+
+ 0 Parameter unpacking: PARAMETER = p(i)
+ 1 Subexpression equations: inv_k = EXPRESSION
+ 2 Packing of subexpressions for return value: inv_k, inv_k, ...
 """
 
+sensitivity_solve_template = '''
+
+    % Solve the states together with their sensitivities to every parameter
+    % (species x parameters x times, in the order of parameter_names), if
+    % they are asked for
+    if nargout > 4
+        pj_rows = [{0}];
+        pj_cols = [{1}];
+        options = odeset('Jacobian', @(t,z) sensitivity_jacobian(t, z, p, j_rows, j_cols));
+        solution = {2}(@(t,z) sensitivity_eq(t, z, p, j_rows, j_cols, pj_rows, pj_cols), ...
+            time_span, [y0, zeros(1, {3}*{4})], options);
+        time_interval = time_span(1):step:time_span(end);
+        z = deval(solution, time_interval);
+        y = z(1:{3}, :);
+        y_out = y([{5}],:);
+        sensitivities = reshape(z({3}+1:end, :), {3}, {4}, []);
+        return
+    end'''
+"""Template for solving the forward sensitivity system in the runner of a Matlab model. Format parameters are:
+
+ 0 Parameter Jacobian row (species) of each non-zero entry: i, i, ...
+ 1 Parameter Jacobian column (parameter) of each non-zero entry: j, j, ...
+ 2 ODE function (ode45 or ode15s)
+ 3 Number of variables (integer)
+ 4 Number of parameters, including interference matrix entries (integer)
+ 5 Output indices: VARIABLE, VARIABLE, ...
+"""
+
+sensitivity_functions_template = '''
+% Forward sensitivity system: the state followed by the sensitivity of each
+% species to each parameter, parameter by parameter (not including the
+% truncation at zero)
+function dz=sensitivity_eq(t, z, p, j_rows, j_cols, pj_rows, pj_cols)
+    x = z(1:{0});
+    s = reshape(z({0}+1:end), {0}, {1});
+    ds = jacobian(t, x, p, j_rows, j_cols)*s + parameter_jacobian(t, x, p, pj_rows, pj_cols);
+    dz = [diff_eq(t, x, p); ds(:)];
+end
+
+% Jacobian of the sensitivity system, leaving out the dependence of the
+% sensitivity equations on x (which only slows the solver's Newton
+% iterations, without changing the solution)
+function J=sensitivity_jacobian(t, z, p, j_rows, j_cols)
+    J = kron(speye({2}), jacobian(t, z(1:{0}), p, j_rows, j_cols));
+end
+
+% Derivative of the ODE differential function with respect to the parameters
+function P=parameter_jacobian(t, x, p, pj_rows, pj_cols)
+    % Unpack parameters from parameter vector (and the i_matrix)
+    {3}
+
+    % Unpack individual species from x
+    x = max(1e-12,real(x)); % Truncate values just above zero
+    {4}
+
+    % Compute each non-zero entry of the derivative with respect to the parameters
+    values = zeros({5}, 1);
+    {6}
 
+    % Pack entries into a sparse matrix
+    P = sparse(pj_rows, pj_cols, real(values), {0}, {1});
+end
+'''
+"""Template for the functions of the forward sensitivity system of a Matlab model. Format parameters are:
+
+ 0 Number of variables (integer)
+ 1 Number of parameters, including interference matrix entries (integer)
+ 2 Number of blocks of the sensitivity system, i.e. the number of parameters plus one (integer)
+ 3 Parameter unpacking: PARAMETER = p(i)
+ 4 Species unpacking: sp_VARIABLE = x(i)
+ 5 Number of non-zero entries of the parameter Jacobian (integer)
+ 6 Parameter Jacobian entry equations: values(k) = EXPRESSION
+"""
+
+
+def species_local(variable: str) -> str:
+    """Get the local Matlab variable that a species is unpacked into by the ODE function
+
+    :param variable: variable name, including the species prefix
+    :return: Matlab variable name
+    """
+    return f'sp_{variable.removeprefix(SPECIES_PREFIX)}'
+
+
+def species_locals(expression: str) -> str:
+    """Rewrite the species references (sp.X) in a Matlab expression to their unpacked local variables
+
+    :param expression: Matlab expression or statement
+    :return: Matlab expression or statement reading species from local variables
+    """
+    return SPECIES_PATTERN.sub(lambda m: species_local(m.group(0)), expression)
+
+
+@profiling.timed('matlab.format')
 def format_model(name: str, parameters: List[str], variables: List[str],
                  i_matrix_indices: List[str],
                  inputs: List[str], outputs: List[str],
-                 derivatives: List[str], ode: str = 'ode45') -> str:
+                 derivatives: List[str], jacobian: List[Tuple[int, int, expressions.Expression]],
+                 ode: str = 'ode45',
+                 invariants: Optional[List[Tuple[str, expressions.Expression]]] = None,
+                 temporaries: Optional[List[Tuple[str, expressions.Expression]]] = None,
+                 jacobian_temporaries: Optional[List[Tuple[str, expressions.Expression]]] = None,
+                 parameter_jacobian: Optional[List[Tuple[int, int, expressions.Expression]]] = None) -> str:
     """Generate a Matlab ODE simulation from the provided inputs
 
     :param name: protocol name
@@ -390,12 +433,22 @@ def format_model(name: str, parameters: List[str], variables: List[str],
     :param inputs: list of names of input variables
     :param outputs: list of names of output variables
     :param derivatives: list of Matlab equations expressing the derivative for each variable
+    :param jacobian: list of (row, column, expression) for the non-zero Jacobian entries, 0-indexed
     :param ode: Matlab ODE function to use, defaults to ode45
+    :param invariants: parameter-only subexpressions to compute once per solve, from optimization
+    :param temporaries: subexpressions to compute before the derivatives, from optimization
+    :param jacobian_temporaries: subexpressions to compute before the Jacobian entries, from optimization
+    :param parameter_jacobian: list of (row, column, expression) for the non-zero entries of the derivatives
+        with respect to the parameters, 0-indexed; if given, the model can also solve for its forward sensitivities
     :return: string containing contents for Matlab simulation file
     """
+    invariants = invariants or []
     # Make the substructures
-    parameter_names = "\n\t".join(f'{p} = parameters(\'{p}\');' for p in parameters)
-    i_matrix_names = "\n\t".join(f'int_matrix_{i[0]}_{i[1]} = parameters(\'int_matrix_{i[0]}_{i[1]}\');' for i in i_matrix_indices)
+    all_parameters = parameters + [f'int_matrix_{i[0]}_{i[1]}' for i in i_matrix_indices]
+    parameter_names = ", ".join(f"'{p}'" for p in all_parameters)
+    parameter_unpacking = "\n\t".join(f'{p} = p({i});' for i, p in enumerate(all_parameters, 1))
+    # Hoisted subexpressions are appended to the parameter vector, and unpacked along with the parameters
+    unpacking = "\n\t".join(f'{p} = p({i});' for i, p in enumerate(all_parameters + [v for v, _ in invariants], 1))
     variable_names = [v.removeprefix(SPECIES_PREFIX) for v in variables]
     input_names = [v.removeprefix(SPECIES_PREFIX) for v in inputs]
     output_names = [v.removeprefix(SPECIES_PREFIX) for v in outputs]
@@ -403,63 +456,184 @@ def format_model(name: str, parameters: List[str], variables: List[str],
                                     if v in (set(input_names) | set(output_names)))
     initializations = "\n\t".join(f'y0({v}) = initial(\'{v}\');' for v in input_names)
     species_names = "[" + (', ').join('"' + name + '"' for name in variable_names) + "]"
+    species_unpacking = "\n\t".join(f'{species_local(v)} = x({i});' for i, v in enumerate(variables, 1))
+    equations = [f'{v} = {species_locals(expressions.to_matlab(e))};' for v, e in temporaries or []] + \
+                [species_locals(d) for d in derivatives]
     pack_derivatives = ", ".join(f'{differential(v)}' for v in variable_names)
-    return ode_template.format(name, io_variable_names, len(variables), initializations, species_names, ode, ", ".join(output_names),
-                               parameter_names, i_matrix_names, "\n\t".join(derivatives), pack_derivatives)
-
-
-def make_matlab_model(system: sbol3.Component, ode: str='ode45') -> Tuple[str, List[str]]:
-    """Generate a set of LaTeX equations for the identified system:
+    jacobian_rows = ", ".join(str(row + 1) for row, _, _ in jacobian)
+    jacobian_columns = ", ".join(str(column + 1) for _, column, _ in jacobian)
+    jacobian_values = [f'{v} = {species_locals(expressions.to_matlab(e))};' for v, e in jacobian_temporaries or []] + \
+                      [f'values({k}) = {species_locals(expressions.to_matlab(e))}; '
+                       f'% d({differential(variable_names[row])})/d({variable_names[column]})'
+                       for k, (row, column, e) in enumerate(jacobian, 1)]
+    if invariants:
+        hoisting = '\n    p = [reshape(p, 1, []), invariants(p)]; % Append the parameter-only subexpressions'
+        invariant_function = invariants_template.format(
+            parameter_unpacking, "\n\t".join(f'{v} = {expressions.to_matlab(e)};' for v, e in invariants),
+            ", ".join(v for v, _ in invariants))
+    else:
+        hoisting = invariant_function = ''
+    if parameter_jacobian is not None:
+        sensitivities_output = ', sensitivities'
+        sensitivity_solve = sensitivity_solve_template.format(
+            ", ".join(str(row + 1) for row, _, _ in parameter_jacobian),
+            ", ".join(str(column + 1) for _, column, _ in parameter_jacobian), ode, len(variables),
+            len(all_parameters), ", ".join(output_names))
+        parameter_jacobian_values = [f'values({k}) = {species_locals(expressions.to_matlab(e))}; '
+                                     f'% d({differential(variable_names[row])})/d({all_parameters[column]})'
+                                     for k, (row, column, e) in enumerate(parameter_jacobian, 1)]
+        sensitivity_functions = sensitivity_functions_template.format(
+            len(variables), len(all_parameters), len(all_parameters) + 1, parameter_unpacking, species_unpacking,
+            len(parameter_jacobian), "\n\t".join(parameter_jacobian_values))
+    else:
+        sensitivities_output = sensitivity_solve = sensitivity_functions = ''
+    return ode_template.format(name, io_variable_names, len(variables), initializations, species_names, ode,
+                               ", ".join(output_names), parameter_names, unpacking, species_unpacking,
+                               jacobian_rows, jacobian_columns, "\n\t".join(equations),
+                               pack_derivatives, len(jacobian), "\n\t".join(jacobian_values), hoisting,
+                               invariant_function, sensitivities_output, sensitivity_solve, sensitivity_functions)
+
+
+class ModelEquations(NamedTuple):
+    """Equations and symbols generated for a system, shared by the code exporters"""
+    parameters: List[str]
+    """Sorted parameter names"""
+    variables: List[str]
+    """Sorted variable names, including the species prefix"""
+    i_matrix_indices: List[Tuple[int, int]]
+    """Sorted indices of the interference matrix entries in use"""
+    inputs: List[str]
+    """Sorted names of the input variables, including the species prefix"""
+    outputs: List[str]
+    """Sorted names of the output variables, including the species prefix"""
+    derivatives: List[Tuple[str, str]]
+    """Pairs of species name and Matlab expression for its derivative"""
+
+
+@profiling.timed('matlab.equations')
+def make_model_equations(system: sbol3.Component, network: Optional[ReactionNetwork] = None) -> ModelEquations:
+    """Generate the derivative expressions and symbol tables for the identified system
 
     :param system: system for which a model is to be generated
-    :param ode: Matlab ODE function to use, defaults to ode45
-    :return: string serialization of LaTeX equation collection
+    :param network: reaction network of the system, if already built
+    :return: equations and symbols for the system
     """
-    # for each feature, collect all of the interactions and constraints that it participates in
-    interactions = {f: [i for i in system.interactions if [p for p in i.participations if p.participant == f.identity]]
-                    for f in system.features}
-    containers = {f: [c.subject.lookup() for c in system.constraints if c.restriction == sbol3.SBOL_CONTAINS and c.object == f.identity]
-                  for f in system.features}
-    regulators = {f: [c.subject.lookup() for c in system.constraints if c.restriction == sbol3.SBOL_MEETS and c.object == f.identity]
-                  for f in system.features}
-    regulation = {f: list(chain(*(interactions[r] for r in regulators[f]))) for f in regulators}
-
-    # generate an ODE based on the roles in the interactions
+    network = network or make_reaction_network(system)
+
+    # generate an ODE based on the terms of the reaction network
     parameters = ParameterDictionary()  # dictionary of Interaction/string : parameter_name
     variables = VariableDictionary()  # dictionary of Feature: variable_name
     i_matrix_entries = IntMatrixDictionary() # Dictionary of tuple of modulators: indices of I matrix
     derivatives = []
 
     terms_added = set()
-    for f in id_sort(system.features):
-        interaction_terms = [t for t in [interaction_to_term(f,
-                                                             i,
-                                                             interactions,
-                                                             regulation,
-                                                             containers,
+    for f in network.species:
+        interaction_terms = [t for t in [interaction_to_term(term,
+                                                             network,
                                                              parameters,
                                                              variables,
                                                              i_matrix_entries)
-                                         for i in id_sort(interactions[f])] if t]
+                                         for term in network.terms[f]] if t]
         # If there is at least one term, then add an equation
         if interaction_terms:
             terms_added.add(f)
-            derivatives.append(f'{differential(f)} = {" ".join(sorted(interaction_terms)).removeprefix("+")};')
+            derivatives.append((matlab_name(f), " ".join(sorted(interaction_terms)).removeprefix("+")))
 
     missing_terms = variables.keys() - terms_added
-    derivatives = [f'{differential(f)} = 0;' for f in missing_terms] + derivatives
+    derivatives = [(matlab_name(f), '0') for f in missing_terms] + derivatives
 
     # TODO: add d_VAR = 0 equations for any variables that didn't get an interaction term
 
-    # Generate the actual document
-    # TODO: interfaces will change to interface after resolution of https://github.com/SynBioDex/pySBOL3/issues/316
-    # TODO: input/ouput will change to plural after resolution of https://github.com/SynBioDex/pySBOL3/issues/315
-    parameter_names = sorted(set(parameters.values()))
-    variable_names = sorted(variables.values())
-    i_matrix_indices = sorted(i_matrix_entries.values())
-    inputs = sorted([v for k, v in variables.items() if k.identity in (str(x) for x in system.interface.inputs)])
-    outputs = sorted([v for k, v in variables.items() if k.identity in (str(x) for x in system.interface.outputs)])
-    model = format_model(system.display_id, parameter_names, variable_names,
-                         i_matrix_indices, inputs, outputs, derivatives, ode)
-
-    return model, parameter_names
+    # Collect the symbols
+    return ModelEquations(
+        parameters=sorted(set(parameters.values())),
+        variables=sorted(variables.values()),
+        i_matrix_indices=sorted(i_matrix_entries.values()),
+        inputs=sorted([v for k, v in variables.items() if k in network.inputs]),
+        outputs=sorted([v for k, v in variables.items() if k in network.outputs]),
+        derivatives=derivatives)
+
+
+def parse_derivatives(equations: ModelEquations) -> Dict[str, expressions.Expression]:
+    """Parse the derivative expressions of a model, inlining any references to other derivatives
+
+    :param equations: equations and symbols for the system
+    :return: dictionary of variable name (including the species prefix) to the expression for its derivative
+    """
+    parsed = {v: expressions.parse(e) for v, e in equations.derivatives}
+    # Inline any references to other derivatives (e.g., the context of a recombination)
+    differentials = {differential(v): e for v, e in parsed.items()}
+    return {SPECIES_PREFIX + v: expressions.substitute(e, differentials) for v, e in parsed.items()}
+
+
+@profiling.timed('matlab.jacobian')
+def make_jacobian(equations: ModelEquations) -> List[Tuple[int, int, expressions.Expression]]:
+    """Differentiate the derivative expressions of a model to get the non-zero entries of its Jacobian
+
+    :param equations: equations and symbols for the system
+    :return: list of (row, column, expression), with 0-based indices into the variables
+    """
+    return expressions.jacobian_entries(parse_derivatives(equations), equations.variables)
+
+
+def parameter_vector_names(equations: ModelEquations) -> List[str]:
+    """Get the names of the entries of the parameter vector of a model: its parameters, then the entries of the
+    interference matrix that it uses
+
+    :param equations: equations and symbols for the system
+    :return: parameter names, in parameter vector order
+    """
+    return equations.parameters + [f'int_matrix_{i[0]}_{i[1]}' for i in equations.i_matrix_indices]
+
+
+@profiling.timed('matlab.parameter_jacobian')
+def make_parameter_jacobian(equations: ModelEquations) -> List[Tuple[int, int, expressions.Expression]]:
+    """Differentiate the derivative expressions of a model with respect to its parameters, giving the source
+    terms of its forward sensitivity equations
+
+    :param equations: equations and symbols for the system
+    :return: list of (row, column, expression), with 0-based indices into the variables and parameter_vector_names
+    """
+    return expressions.jacobian_entries(parse_derivatives(equations), equations.variables,
+                                        parameter_vector_names(equations))
+
+
+@profiling.timed('matlab.make_model')
+def make_matlab_model(system: sbol3.Component, ode: str='ode45', optimize: bool = False,
+                      sensitivities: bool = False, network: Optional[ReactionNetwork] = None) -> Tuple[str, List[str]]:
+    """Generate a set of LaTeX equations for the identified system:
+
+    :param system: system for which a model is to be generated
+    :param ode: Matlab ODE function to use, defaults to ode45
+    :param optimize: if true, share common subexpressions, fold repeated factors into powers, and hoist
+        parameter-only subexpressions out of the ODE; otherwise keep the equations in their readable form
+    :param sensitivities: if true, also generate the forward sensitivity equations, which the model solves when
+        asked for a fifth output
+    :param network: reaction network of the system, if already built
+    :return: string serialization of LaTeX equation collection
+    """
+    equations = make_model_equations(system, network)
+    if not optimize:
+        derivatives = [f'{differential(v)} = {expression};' for v, expression in equations.derivatives]
+
+        # Generate the actual document
+        model = format_model(system.display_id, equations.parameters, equations.variables,
+                             equations.i_matrix_indices, equations.inputs, equations.outputs, derivatives,
+                             make_jacobian(equations), ode,
+                             parameter_jacobian=make_parameter_jacobian(equations) if sensitivities else None)
+        return model, equations.parameters
+
+    # Fold the powers before differentiating, so that the Jacobian is taken of the simpler form
+    with profiling.timer('matlab.optimize'):
+        folded = {v: optimization.fold_powers(e) for v, e in parse_derivatives(equations).items()}
+        optimized = optimization.optimize_equations(folded, expressions.jacobian_entries(folded, equations.variables),
+                                                    equations.variables)
+    derivatives = [f'{differential(v.removeprefix(SPECIES_PREFIX))} = {expressions.to_matlab(e)};'
+                   for v, e in optimized.derivatives]
+    model = format_model(system.display_id, equations.parameters, equations.variables,
+                         equations.i_matrix_indices, equations.inputs, equations.outputs, derivatives,
+                         optimized.jacobian, ode, optimized.invariants, optimized.temporaries,
+                         optimized.jacobian_temporaries,
+                         expressions.jacobian_entries(folded, equations.variables, parameter_vector_names(equations))
+                         if sensitivities else None)
+    return model, equations.parameters
@@ -0,0 +1,126 @@
+import logging
+import os
+from functools import lru_cache
+from typing import Dict, Tuple
+
+import sbol3
+
+import profiling
+
+LIVE_FALLBACK = os.environ.get('SBOL_LIVE_ONTOLOGY', '') == '1'
+"""If true, terms missing from TERMS are looked up with tyto, which needs access to the ontology services.
+Set the environment variable SBOL_LIVE_ONTOLOGY=1 to enable."""
+
+# Sequence Ontology terms used by the builders and exporters, which sbol3 does not define
+SO_CONSTITUTIVE_PROMOTER = sbol3.SO_NS + '0002050'
+SO_SGRNA = sbol3.SO_NS + '0001998'
+SO_BINDING_SITE = sbol3.SO_NS + '0000409'
+# Systems Biology Ontology terms used by the builders and exporters, which sbol3 does not define
+SBO_CLEAVAGE = sbol3.SBO_NS + '0000178'
+
+TERMS: Dict[str, Tuple[str, Tuple[str, ...]]] = {
+    # Sequence Ontology
+    sbol3.SO_PROMOTER: ('promoter', ()),
+    SO_CONSTITUTIVE_PROMOTER: ('constitutive_promoter', (sbol3.SO_PROMOTER,)),
+    sbol3.SO_CDS: ('CDS', ()),
+    sbol3.SO_TERMINATOR: ('terminator', ()),
+    sbol3.SO_ENGINEERED_REGION: ('engineered_region', ()),
+    SO_SGRNA: ('sgRNA', ()),
+    SO_BINDING_SITE: ('binding_site', ()),
+    # Systems Biology Ontology: interaction types
+    sbol3.SBO_CONTROL: ('control', ()),
+    sbol3.SBO_INHIBITION: ('inhibition', (sbol3.SBO_CONTROL,)),
+    sbol3.SBO_STIMULATION: ('stimulation', (sbol3.SBO_CONTROL,)),
+    sbol3.SBO_BIOCHEMICAL_REACTION: ('biochemical reaction', ()),
+    sbol3.SBO_NON_COVALENT_BINDING: ('non-covalent binding', ()),
+    sbol3.SBO_DEGRADATION: ('degradation', ()),
+    sbol3.SBO_GENETIC_PRODUCTION: ('genetic production', ()),
+    SBO_CLEAVAGE: ('cleavage', ()),
+    # Systems Biology Ontology: participant roles
+    sbol3.SBO_REACTANT: ('reactant', ()),
+    sbol3.SBO_PRODUCT: ('product', ()),
+    sbol3.SBO_TEMPLATE: ('template', ()),
+    sbol3.SBO_MODIFIER: ('modifier', ()),
+    sbol3.SBO_INHIBITOR: ('inhibitor', (sbol3.SBO_MODIFIER,)),
+    sbol3.SBO_STIMULATOR: ('stimulator', (sbol3.SBO_MODIFIER,)),
+    sbol3.SBO_MODIFIED: ('modified', ()),
+    sbol3.SBO_INHIBITED: ('inhibited', (sbol3.SBO_MODIFIED,)),
+    sbol3.SBO_STIMULATED: ('stimulated', (sbol3.SBO_MODIFIED,)),
+    # Systems Biology Ontology: participant types
+    sbol3.SBO_DNA: ('deoxyribonucleic acid', ()),
+    sbol3.SBO_RNA: ('ribonucleic acid', ()),
+    sbol3.SBO_PROTEIN: ('polypeptide chain', ()),
+    sbol3.SBO_NON_COVALENT_COMPLEX: ('non-covalent complex', ()),
+    sbol3.SBO_SIMPLE_CHEMICAL: ('simple chemical', ()),
+    sbol3.SBO_FUNCTIONAL_ENTITY: ('functional entity', ()),
+}
+"""Label and direct parents of each ontology term that the project uses, precomputed from SO and SBO.
+Only parents that are themselves in the table are listed."""
+
+
+def _live_uri(uri: str):
+    """Wrap a term as a tyto URI, importing tyto only when a live lookup is actually needed"""
+    import tyto
+    return tyto.URI(uri, tyto.SO if uri.startswith(sbol3.SO_NS) else tyto.SBO)
+
+
+@lru_cache(maxsize=None)
+def ancestors(uri: str) -> frozenset:
+    """Get all ancestors of a term in the bundled table, including the term itself
+
+    :param uri: term to look up
+    :return: set of URIs of the term and its ancestors
+    """
+    result = {uri}
+    for parent in TERMS.get(uri, ('', ()))[1]:
+        result |= ancestors(parent)
+    return frozenset(result)
+
+
+def is_ancestor_of(ancestor: str, descendant: str) -> bool:
+    """Check if one term subsumes another, where a term subsumes itself, e.g., promoter subsumes constitutive_promoter
+
+    Terms in the bundled table are answered from it. Otherwise, the live ontology is queried if LIVE_FALLBACK is
+    set, and if not only identical terms are taken to subsume each other.
+
+    :param ancestor: URI of the putative ancestor
+    :param descendant: URI of the putative descendant
+    :return: true if the ancestor subsumes the descendant
+    """
+    profiling.count('ontology.queries')
+    return _is_ancestor_of(ancestor, descendant)
+
+
+@lru_cache(maxsize=None)
+def _is_ancestor_of(ancestor: str, descendant: str) -> bool:
+    """Cached lookup for is_ancestor_of"""
+    if descendant in TERMS:
+        return ancestor in ancestors(descendant)
+    if LIVE_FALLBACK:
+        profiling.count('ontology.live_queries')
+        with profiling.timer('ontology.live'):
+            return ancestor == descendant or bool(_live_uri(ancestor).is_ancestor_of(descendant))
+    logging.warning(f'Term {descendant} is not in the bundled ontology table; set SBOL_LIVE_ONTOLOGY=1 to look it up')
+    return ancestor == descendant
+
+
+def label(uri: str) -> str:
+    """Get the human-readable label of a term, e.g., for error messages
+
+    :param uri: URI of the term
+    :return: label from the bundled table or, if LIVE_FALLBACK is set, from the live ontology; otherwise the URI
+    """
+    profiling.count('ontology.queries')
+    return _label(uri)
+
+
+@lru_cache(maxsize=None)
+def _label(uri: str) -> str:
+    """Cached lookup for label"""
+    if uri in TERMS:
+        return TERMS[uri][0]
+    if LIVE_FALLBACK:
+        profiling.count('ontology.live_queries')
+        with profiling.timer('ontology.live'):
+            return str(_live_uri(uri).ontology.get_term_by_uri(uri))
+    return uri
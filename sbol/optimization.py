@@ -0,0 +1,211 @@
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, NamedTuple, Set, Tuple
+
+from expressions import Expression, Number, Symbol, Sum, Negation, Product, Quotient, Power, Function, \
+    children, symbols
+
+
+class OptimizedEquations(NamedTuple):
+    """Derivatives and Jacobian entries of a model, rewritten to share their common subexpressions"""
+    invariants: List[Tuple[str, Expression]]
+    """Parameter-only subexpressions, in dependency order, to be computed once per solve"""
+    temporaries: List[Tuple[str, Expression]]
+    """Common subexpressions of the derivatives, in dependency order, to be computed on each call"""
+    derivatives: List[Tuple[str, Expression]]
+    """Pairs of variable name and expression for its derivative"""
+    jacobian_temporaries: List[Tuple[str, Expression]]
+    """Common subexpressions of the Jacobian entries, in dependency order, to be computed on each call"""
+    jacobian: List[Tuple[int, int, Expression]]
+    """Non-zero Jacobian entries, as (row, column, expression) with 0-based indices"""
+
+
+INVARIANT_PREFIX = 'inv_'
+TEMPORARY_PREFIX = 'cse_'
+
+
+def with_children(expression: Expression, new_children: List[Expression]) -> Expression:
+    """Rebuild an expression node with new immediate sub-expressions, without any simplification"""
+    if isinstance(expression, Sum):
+        return Sum(tuple(new_children))
+    if isinstance(expression, Product):
+        return Product(tuple(new_children))
+    if isinstance(expression, Negation):
+        return Negation(new_children[0])
+    if isinstance(expression, Quotient):
+        return Quotient(*new_children)
+    if isinstance(expression, Power):
+        return Power(*new_children)
+    if isinstance(expression, Function):
+        return Function(expression.name, new_children[0])
+    return expression
+
+
+def fold_powers(expression: Expression) -> Expression:
+    """Fold repeated identical factors of each product into a single power, e.g., a*b*a becomes a^2*b
+
+    :param expression: expression to rewrite
+    :return: mathematically identical expression
+    """
+    expression = with_children(expression, [fold_powers(c) for c in children(expression)])
+    if not isinstance(expression, Product):
+        return expression
+    # Count the factors, keeping them in order of first appearance
+    multiplicity = Counter(expression.factors)
+    folded = [f if multiplicity[f] == 1 else Power(f, Number(multiplicity[f])) for f in multiplicity]
+    return folded[0] if len(folded) == 1 else Product(tuple(folded))
+
+
+def group_invariants(expression: Expression, is_invariant: Callable[[Expression], bool]) -> Expression:
+    """Gather the parameter-only terms of each sum and factors of each product into a sub-expression of
+    their own, e.g., a*x*b becomes (a*b)*x, so that they can be hoisted together
+
+    :param expression: expression to rewrite
+    :param is_invariant: function telling if an expression depends only on parameters
+    :return: mathematically identical expression
+    """
+    expression = with_children(expression, [group_invariants(c, is_invariant) for c in children(expression)])
+    if not isinstance(expression, (Sum, Product)):
+        return expression
+    operands = children(expression)
+    invariant = [o for o in operands if is_invariant(o) or isinstance(o, Number)]
+    if len(invariant) < 2 or len(invariant) == len(operands):
+        return expression
+    varying = [o for o in operands if o not in invariant]
+    return with_children(expression, [with_children(expression, invariant)] + varying)
+
+
+def canonical(expression: Expression) -> Expression:
+    """Get a key for an expression that is the same for any order of the terms of its sums and the factors of
+    its products, so that equal subexpressions written in different orders can share a name
+
+    :param expression: expression to make a key for
+    :return: expression with the operands of every sum and product sorted
+    """
+    expression = with_children(expression, [canonical(c) for c in children(expression)])
+    if isinstance(expression, (Sum, Product)):
+        return with_children(expression, sorted(children(expression), key=repr))
+    return expression
+
+
+def count_subexpressions(roots: Iterable[Expression]) -> Counter:
+    """Count the number of distinct places in which each compound sub-expression is used
+
+    The children of a repeated sub-expression are only counted the first time it is seen, since it will
+    be computed only once.
+
+    :param roots: expressions to count over
+    :return: counter of sub-expressions
+    """
+    counts = Counter()
+
+    def visit(expression: Expression):
+        if isinstance(expression, (Number, Symbol)):
+            return
+        if isinstance(expression, Negation):  # negations are never named, so count their operand instead
+            visit(expression.operand)
+            return
+        counts[expression] += 1
+        if counts[expression] == 1:
+            for c in children(expression):
+                visit(c)
+    for root in roots:
+        visit(root)
+    return counts
+
+
+class Eliminator:
+    """Replaces common and parameter-only subexpressions with named temporaries"""
+
+    def __init__(self, is_invariant: Callable[[Expression], bool], taken: Set[str]):
+        """
+        :param is_invariant: function telling if an expression depends only on parameters
+        :param taken: names already in use in the model, which must not be used for temporaries
+        """
+        self.is_invariant = is_invariant
+        self.taken = set(taken)
+        self.invariants = {}  # dictionary of canonical original expression: (name, definition), shared by all groups
+
+    def name(self, prefix: str) -> str:
+        """Make a new temporary name with the given prefix"""
+        k = 1
+        while f'{prefix}{k}' in self.taken:
+            k += 1
+        self.taken.add(f'{prefix}{k}')
+        return f'{prefix}{k}'
+
+    def eliminate(self, roots: List[Expression]) -> Tuple[List[Tuple[str, Expression]], List[Expression]]:
+        """Rewrite a group of expressions that are computed together
+
+        Parameter-only subexpressions are hoisted into the invariants, which are shared between groups,
+        and subexpressions used in more than one place are computed once into temporaries.
+
+        :param roots: expressions to rewrite
+        :return: temporaries of the group in dependency order, rewritten expressions
+        """
+        counts = count_subexpressions(roots)
+        temporaries = []
+        rewritten = {}
+
+        def rewrite(expression: Expression, inside_invariant: bool) -> Expression:
+            if isinstance(expression, (Number, Symbol)):
+                return expression
+            # Negations are cheap enough to leave in place, so their operand is named instead
+            if isinstance(expression, Negation):
+                return Negation(rewrite(expression.operand, inside_invariant))
+            if expression in rewritten:
+                return rewritten[expression]
+            invariant = self.is_invariant(expression)
+            result = with_children(expression, [rewrite(c, invariant) for c in children(expression)])
+            if invariant and (counts[expression] > 1 or not inside_invariant):
+                # Invariants are looked up by the expression before its children were rewritten, since another
+                # group may have named different parts of the same expression
+                key = canonical(expression)
+                if key not in self.invariants:
+                    self.invariants[key] = (self.name(INVARIANT_PREFIX), result)
+                result = Symbol(self.invariants[key][0])
+            elif not invariant and counts[expression] > 1:
+                name = self.name(TEMPORARY_PREFIX)
+                temporaries.append((name, result))
+                result = Symbol(name)
+            rewritten[expression] = result
+            return result
+        return temporaries, [rewrite(r, False) for r in roots]
+
+
+def optimize_equations(derivatives: Dict[str, Expression],
+                       jacobian: List[Tuple[int, int, Expression]],
+                       variables: List[str]) -> OptimizedEquations:
+    """Rewrite the derivatives and Jacobian of a model so that their common subexpressions are computed
+    only once, and parameter-only subexpressions are computed once per solve rather than on each call
+
+    The rewritten equations are mathematically identical to the originals. For the Jacobian to benefit
+    from folded powers, it should be computed from derivatives that have already been through fold_powers.
+
+    :param derivatives: dictionary of variable name to the expression for its derivative
+    :param jacobian: list of (row, column, expression) for the non-zero Jacobian entries
+    :param variables: variable names; all other symbols are taken to be parameters
+    :return: optimized equations
+    """
+    species = set(variables)
+    taken = set(variables).union(*(symbols(e) for e in derivatives.values()))
+
+    invariance = {}  # cache of expression: whether it is parameter-only
+
+    def is_invariant(expression: Expression) -> bool:
+        if expression not in invariance:
+            used = symbols(expression)
+            invariance[expression] = bool(used) and not (used & species)
+        return invariance[expression]
+
+    eliminator = Eliminator(is_invariant, taken)
+    names = list(derivatives)
+    temporaries, rewritten = eliminator.eliminate([group_invariants(fold_powers(derivatives[v]), is_invariant)
+                                                   for v in names])
+    jacobian_temporaries, entries = eliminator.eliminate([group_invariants(fold_powers(e), is_invariant)
+                                                          for _, _, e in jacobian])
+    return OptimizedEquations(
+        invariants=list(eliminator.invariants.values()),
+        temporaries=temporaries,
+        derivatives=list(zip(names, rewritten)),
+        jacobian_temporaries=jacobian_temporaries,
+        jacobian=[(row, column, e) for (row, column, _), e in zip(jacobian, entries)])
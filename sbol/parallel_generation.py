@@ -0,0 +1,58 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, List, NamedTuple, Optional, Tuple
+
+import sbol3
+
+import profiling
+from document_cache import load_document
+
+_document: Optional[sbol3.Document] = None
+"""Document loaded by each worker process when the pool starts"""
+
+
+class ModelMaker(NamedTuple):
+    """Picklable call of a make_*_model function, returning only the text of the model"""
+    function: Callable
+    """Module-level function taking a system and then args, returning the model text or a tuple starting with it"""
+    args: tuple = ()
+    """Further arguments for the function, e.g., the ODE solver"""
+
+    def __call__(self, system: sbol3.Component) -> str:
+        result = self.function(system, *self.args)
+        return result[0] if isinstance(result, tuple) else result
+
+
+def _load_worker_document(document_path: str):
+    """Pool initializer: load the document once in each worker, from its snapshot if possible"""
+    global _document
+    profiling.collect()  # forked workers start with a copy of the parent's profile, which must not be counted twice
+    _document = load_document(document_path).document
+
+
+def _make_model(maker: ModelMaker, identity: str) -> Tuple[str, Optional[dict]]:
+    """Pool task: generate the model of one system of the worker's document, with the worker's profile of it"""
+    return maker(_document.find(identity)), profiling.collect()
+
+
+def generate_models(document_path: str, systems: List[sbol3.Component], maker: ModelMaker,
+                    jobs: Optional[int] = 1) -> List[str]:
+    """Generate the models of a list of systems, optionally across a process pool
+
+    Each worker loads the document itself, so only the identities of the systems and the text of the models
+    are passed between processes. The models are returned in the order of the systems regardless of which
+    worker finishes first, so the output is the same for any number of jobs.
+
+    :param document_path: SBOL file that the systems were read from
+    :param systems: systems to generate models for
+    :param maker: function generating the text of a model
+    :param jobs: number of worker processes; 1 generates in this process, and None uses one per CPU
+    :return: text of the model of each system, in the same order as the systems
+    """
+    if jobs == 1 or len(systems) < 2:
+        return [maker(s) for s in systems]
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_load_worker_document,
+                             initargs=(document_path,)) as pool:
+        results = list(pool.map(_make_model, [maker] * len(systems), [s.identity for s in systems]))
+    for _, profile in results:
+        profiling.merge(profile)
+    return [model for model, _ in results]
@@ -0,0 +1,233 @@
+"""Build the SBOL circuit models and export them to MATLAB, Python, and LaTeX
+
+Each stage is a subcommand with explicit input and output paths, so the pipeline can be run from any
+working directory, e.g.:
+
+    python sbol/pipeline.py build --output sbol/gRNA_models.nt
+    python sbol/pipeline.py export-matlab --input sbol/gRNA_models.nt --output models --jobs 4 --timings
+"""
+import argparse
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import List, NamedTuple, Optional
+
+import sbol3
+
+import architectures
+import expressions
+import latex_generation
+import matlab_generation
+import ontology
+import optimization
+import profiling
+import python_generation
+import reaction_network
+import shared_global_names
+from document_cache import load_document
+from parallel_generation import ModelMaker, generate_models
+from regeneration import RegenerationReport, generator_version, regenerate_models
+from shared_global_names import PROJECT_NAMESPACE
+
+
+class StageTiming(NamedTuple):
+    """Resources used by one stage of the pipeline"""
+    stage: str
+    """Name of the stage"""
+    seconds: float
+    """Wall-clock time taken by the stage"""
+    peak_memory_mb: Optional[float]
+    """Peak memory allocated by Python in this process during the stage (not counting worker processes),
+    or None if memory was not measured"""
+
+
+timings: List[StageTiming] = []
+"""Timings of the stages run so far in this process"""
+measure_memory = False
+"""If true, stages also measure their peak memory, which slows them down"""
+
+
+@contextmanager
+def stage(name: str):
+    """Record the wall-clock time and peak memory of a stage of the pipeline in timings, and in any profile"""
+    # Each stage is traced on its own, so its peak does not include the memory of the stages before it
+    tracing = measure_memory and not tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        with profiling.timer(f'pipeline.{name}'):
+            yield
+        seconds = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] / (1 << 20) if tracing else None
+    finally:
+        if tracing:
+            tracemalloc.stop()
+    timings.append(StageTiming(name, seconds, peak))
+
+
+def read_systems(input_path: str) -> List[sbol3.Component]:
+    """Load an SBOL file, from its snapshot if unchanged, and get its systems in document order"""
+    with stage('load'):
+        doc, from_snapshot, seconds = load_document(input_path)
+    print(f'Read {input_path} from {"snapshot" if from_snapshot else "file"} in {seconds:.2f} s')
+    return [o for o in doc.objects if isinstance(o, sbol3.Component)]
+
+
+def build(output_path: str, max_sites: int = 6):
+    """Build the standard circuit architectures and write them to an SBOL file
+
+    :param output_path: SBOL file to write, in sorted N-Triples
+    :param max_sites: largest number of target sites of the multiplexed and multisite designs
+    """
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    sbol3.set_namespace(PROJECT_NAMESPACE)
+    doc = sbol3.Document()
+    with stage('build'):
+        architectures.make_systems(doc, architectures.standard_architectures(max_sites))
+    with stage('write'):
+        doc.write(output_path, sbol3.SORTED_NTRIPLES)
+    print(f'Wrote {len(doc.objects)} systems to {output_path}')
+
+
+def export_matlab(input_path: str, output_dir: str, jobs: Optional[int] = 1, optimize: bool = True,
+                  ode: str = 'ode15s', sensitivities: bool = False) -> RegenerationReport:
+    """Generate a MATLAB model for each system of an SBOL file, skipping those that are unchanged since the last run
+
+    :param input_path: SBOL file to read
+    :param output_dir: directory for the models and their manifest
+    :param jobs: number of worker processes; None for one per CPU
+    :param optimize: if true, pass the equations through the optimizer
+    :param ode: MATLAB ODE solver for the models to use
+    :param sensitivities: if true, also generate the forward sensitivity equations of each model
+    :return: report of the models written, skipped, and deleted
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    systems = read_systems(input_path)
+    generator = generator_version([matlab_generation, reaction_network, ontology, expressions, optimization,
+                                   shared_global_names], ode, optimize, sensitivities)
+    maker = ModelMaker(matlab_generation.make_matlab_model, (ode, optimize, sensitivities))
+    with stage('generate'):
+        report = regenerate_models(systems, output_dir, '.m', os.path.join(output_dir, 'matlab_manifest.json'),
+                                   generator, lambda stale: generate_models(input_path, stale, maker, jobs))
+    print(f'Wrote {len(report.written)} models, {len(report.unchanged)} unchanged, deleted {len(report.deleted)}')
+    return report
+
+
+def export_python(input_path: str, output_dir: str, jobs: Optional[int] = 1,
+                  method: str = 'BDF', sensitivities: bool = False) -> RegenerationReport:
+    """Generate a Python model for each system of an SBOL file, skipping those that are unchanged since the last run
+
+    :param input_path: SBOL file to read
+    :param output_dir: directory for the models and their manifest
+    :param jobs: number of worker processes; None for one per CPU
+    :param method: scipy.integrate.solve_ivp method for the models to use by default
+    :param sensitivities: if true, also generate the forward sensitivity system of each model
+    :return: report of the models written, skipped, and deleted
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    systems = read_systems(input_path)
+    generator = generator_version([python_generation, matlab_generation, reaction_network, ontology, expressions,
+                                   shared_global_names], method, sensitivities)
+    maker = ModelMaker(python_generation.make_python_model, (method, sensitivities))
+    with stage('generate'):
+        report = regenerate_models(systems, output_dir, '.py', os.path.join(output_dir, 'python_manifest.json'),
+                                   generator, lambda stale: generate_models(input_path, stale, maker, jobs))
+    print(f'Wrote {len(report.written)} models, {len(report.unchanged)} unchanged, deleted {len(report.deleted)}')
+    return report
+
+
+def export_latex(input_path: str, output_dir: str, jobs: Optional[int] = 1):
+    """Write the table of symbols and the equations of every system of an SBOL file as LaTeX
+
+    :param input_path: SBOL file to read
+    :param output_dir: directory for generated_table.tex and generated_equations.tex
+    :param jobs: number of worker processes; None for one per CPU
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    systems = read_systems(input_path)
+    # Sort by the display name (so that 0 and 1 target sites come first and so that the heterogeneous and
+    # identical models are interleaved)
+    systems.sort(key=lambda x: x.display_name)
+    with stage('generate'):
+        table = latex_generation.make_symbol_table()
+        models = generate_models(input_path, systems, ModelMaker(latex_generation.make_latex_model), jobs)
+    with stage('write'):
+        with open(os.path.join(output_dir, 'generated_table.tex'), 'w') as out:
+            print('Writing table of symbols')
+            out.write(table)
+        with open(os.path.join(output_dir, 'generated_equations.tex'), 'w') as out:
+            for c, model in zip(systems, models):
+                print(f'Writing model for {c.identity}')
+                out.write(model)
+
+
+def print_timings():
+    """Print the wall-clock time and peak memory of each stage run so far"""
+    print(f'{"stage":<12}{"time (s)":>10}{"peak memory (MB)":>18}')
+    for t in timings:
+        memory = 'n/a' if t.peak_memory_mb is None else f'{t.peak_memory_mb:.1f}'
+        print(f'{t.stage:<12}{t.seconds:>10.3f}{memory:>18}')
+    print(f'{"total":<12}{sum(t.seconds for t in timings):>10.3f}')
+
+
+def job_count(value: str) -> int:
+    """Parse the --jobs argument: a number of worker processes, or 0 for one per CPU
+
+    :param value: text of the argument
+    :return: number of processes
+    """
+    jobs = int(value)
+    if jobs < 0:
+        raise argparse.ArgumentTypeError(f'must be 0 (one per CPU) or more, not {jobs}')
+    return jobs
+
+
+def main(argv: Optional[List[str]] = None):
+    global measure_memory
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--timings', action='store_true', help='Print the wall time and peak memory of each stage')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help='Build the circuit architectures into an SBOL file')
+    build_parser.add_argument('--output', required=True, help='SBOL file to write')
+    build_parser.add_argument('--max-sites', type=int, default=6, help='Largest number of target sites')
+
+    exporters = {}
+    for command, description, default_output in [('export-matlab', 'MATLAB models', 'models'),
+                                                   ('export-python', 'Python models', 'models'),
+                                                   ('export-latex', 'LaTeX equations', 'equations')]:
+        exporters[command] = subparsers.add_parser(command, help=f'Generate {description} from an SBOL file')
+        exporters[command].add_argument('--input', required=True, help='SBOL file to read')
+        exporters[command].add_argument('--output', required=True,
+                                        help=f'Directory to write to, e.g., {default_output}')
+        exporters[command].add_argument('--jobs', type=job_count, default=1,
+                                        help='Number of processes to generate with (0 for one per CPU)')
+    exporters['export-matlab'].add_argument('--ode', default='ode15s', help='MATLAB ODE solver for the models')
+    exporters['export-matlab'].add_argument('--readable', action='store_true',
+                                            help='Write the equations without optimizing them')
+    exporters['export-python'].add_argument('--method', default='BDF', help='solve_ivp method for the models')
+    for command in ['export-matlab', 'export-python']:
+        exporters[command].add_argument('--sensitivities', action='store_true',
+                                        help='Also generate the forward sensitivity equations of the models')
+    # Also accept --timings after the subcommand
+    for subparser in [build_parser, *exporters.values()]:
+        subparser.add_argument('--timings', action='store_true', default=argparse.SUPPRESS, help=argparse.SUPPRESS)
+
+    args = parser.parse_args(argv)
+    measure_memory = args.timings
+    if args.command == 'build':
+        build(args.output, args.max_sites)
+    elif args.command == 'export-matlab':
+        export_matlab(args.input, args.output, args.jobs or None, not args.readable, args.ode, args.sensitivities)
+    elif args.command == 'export-python':
+        export_python(args.input, args.output, args.jobs or None, args.method, args.sensitivities)
+    elif args.command == 'export-latex':
+        export_latex(args.input, args.output, args.jobs or None)
+    if args.timings:
+        print_timings()
+
+
+if __name__ == '__main__':
+    main()
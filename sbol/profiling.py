@@ -0,0 +1,122 @@
+import atexit
+import functools
+import json
+import os
+import sys
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timezone
+from typing import Callable, Dict, Optional
+
+REPORT_PATH = os.environ.get('SBOL_PROFILE')
+"""JSON file to write the profile of the run to; profiling is enabled only if the environment variable
+SBOL_PROFILE is set to such a path"""
+ENABLED = bool(REPORT_PATH)
+
+_timers: Dict[str, list] = {}  # name: [calls, total seconds, max seconds]
+_counters: Counter = Counter()
+_started = time.perf_counter()
+_started_at = datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+
+def _record(name: str, seconds: float, calls: int = 1, max_seconds: Optional[float] = None):
+    """Add timings to the named timer"""
+    entry = _timers.setdefault(name, [0, 0.0, 0.0])
+    entry[0] += calls
+    entry[1] += seconds
+    entry[2] = max(entry[2], seconds if max_seconds is None else max_seconds)
+
+
+@contextmanager
+def _timer(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record(name, time.perf_counter() - start)
+
+
+def timer(name: str):
+    """Context manager timing a stage, e.g., `with profiling.timer('matlab.format'):`; does nothing if disabled
+
+    Timers may be nested, and the time of an inner timer is included in the time of the outer ones.
+
+    :param name: name of the stage, prefixed with the module, e.g., 'matlab.format'
+    :return: context manager
+    """
+    return _timer(name) if ENABLED else nullcontext()
+
+
+def timed(name: str) -> Callable:
+    """Decorator timing every call of a function as a stage; if disabled, the function is returned unchanged
+
+    :param name: name of the stage
+    :return: decorator
+    """
+    def decorate(function: Callable) -> Callable:
+        if not ENABLED:
+            return function
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with _timer(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def count(name: str, n: int = 1):
+    """Add to a named counter, e.g., of ontology queries; does nothing if disabled"""
+    if ENABLED:
+        _counters[name] += n
+
+
+def collect() -> Optional[dict]:
+    """Take the timers and counters recorded so far and reset them, e.g., to pass them back from a worker process
+
+    :return: recorded profile, or None if disabled
+    """
+    if not ENABLED:
+        return None
+    profile = {'timers': {k: list(v) for k, v in _timers.items()}, 'counters': dict(_counters)}
+    _timers.clear()
+    _counters.clear()
+    return profile
+
+
+def merge(profile: Optional[dict]):
+    """Add a profile from collect, e.g., from a worker process, to the timers and counters of this process"""
+    if not profile:
+        return
+    for name, (calls, seconds, max_seconds) in profile['timers'].items():
+        _record(name, seconds, calls, max_seconds)
+    _counters.update(profile['counters'])
+
+
+def report() -> dict:
+    """Make the machine-readable profile of this run, with the stages sorted by their total time
+
+    :return: dictionary of the run, the calls and time of each stage, and the counters
+    """
+    stages = sorted(_timers.items(), key=lambda item: -item[1][1])
+    return {
+        'run': {'argv': sys.argv, 'pid': os.getpid(), 'started': _started_at,
+                'seconds': round(time.perf_counter() - _started, 6)},
+        'timers': {name: {'calls': calls, 'seconds': round(seconds, 6), 'max_seconds': round(max_seconds, 6)}
+                   for name, (calls, seconds, max_seconds) in stages},
+        'counters': dict(sorted(_counters.items())),
+    }
+
+
+def write_report(path: str):
+    """Write the profile of this run as JSON"""
+    with open(path, 'w') as f:
+        json.dump(report(), f, indent=2)
+        f.write('\n')
+
+
+if ENABLED:
+    _main_pid = os.getpid()
+    # Only the process that started the run writes the report; pool workers pass theirs back with collect
+    atexit.register(lambda: os.getpid() == _main_pid and write_report(REPORT_PATH))
@@ -0,0 +1,415 @@
+import keyword
+import re
+from typing import List, Optional, Tuple
+
+import sbol3
+
+import expressions
+from matlab_generation import SPECIES_PREFIX, differential, make_jacobian, make_model_equations, \
+    make_parameter_jacobian, parameter_vector_names
+from reaction_network import ReactionNetwork
+
+SYMBOL_PATTERN = re.compile(r'(?<![\w.])(sp\.)?([A-Za-z_]\w*)')
+"""Pattern matching a parameter, species, or derivative symbol in a Matlab expression"""
+
+
+def python_name(name: str) -> str:
+    """Get a Python-compatible variable name for a Matlab variable name
+
+    :param name: Matlab variable name
+    :return: Python variable name, with a trailing underscore if the name is a keyword
+    """
+    return f'{name}_' if keyword.iskeyword(name) else name
+
+
+def species_variable(name: str) -> str:
+    """Return the Python local variable holding the value of a species
+
+    :param name: species name, with or without the species prefix
+    :return: Python variable name
+    """
+    return f'sp_{name.removeprefix(SPECIES_PREFIX)}'
+
+
+def quoted_names(names: List[str]) -> str:
+    """Serialize a list of variable names as the contents of a Python list of strings
+
+    :param names: names to serialize, with or without the species prefix
+    :return: Python string
+    """
+    return ", ".join(f"'{v.removeprefix(SPECIES_PREFIX)}'" for v in names)
+
+
+def python_expression(expression: str) -> str:
+    """Translate a Matlab expression generated by matlab_generation.interaction_to_term into Python
+
+    Species references (sp.X) become local variables (sp_X), parameters are renamed if they clash
+    with Python keywords, and Matlab exponentiation becomes Python exponentiation.
+
+    :param expression: Matlab expression
+    :return: equivalent Python expression
+    """
+    def translate(match: re.Match) -> str:
+        if match.group(1):
+            return species_variable(match.group(2))
+        return python_name(match.group(2))
+    return SYMBOL_PATTERN.sub(translate, expression).replace('^', '**').strip()
+
+
+def python_symbol(name: str) -> str:
+    """Get the Python variable name for a symbol in a parsed Matlab expression
+
+    :param name: Matlab symbol name, which is a species if it has the species prefix
+    :return: Python variable name
+    """
+    return species_variable(name) if name.startswith(SPECIES_PREFIX) else python_name(name)
+
+
+python_template = '''"""{0}: ODE simulation model generated from {1}
+
+Do not edit by hand: regenerate with sbol/sbol_to_python.py
+"""
+import numpy as np
+from scipy.integrate import solve_ivp
+from scipy.sparse import csc_matrix
+
+SPECIES = [{2}]
+"""Species names, in the order of the state vector"""
+PARAMETERS = [{3}]
+"""Parameter names, in the order of the parameter vector"""
+INPUTS = [{4}]
+"""Species whose initial values are set from the initial map"""
+OUTPUTS = [{5}]
+"""Species returned as the output of a simulation"""
+OUTPUT_INDICES = [SPECIES.index(v) for v in OUTPUTS]
+JACOBIAN_ROWS = np.array([{11}], dtype=int)
+JACOBIAN_COLUMNS = np.array([{12}], dtype=int)
+"""Row and column of each non-zero entry of the Jacobian"""
+
+
+def pack_parameters(parameters):
+    """Convert a dictionary of parameter names to values into a parameter vector"""
+    return np.array([parameters[p] for p in PARAMETERS], dtype=float)
+
+
+def pack_initial(initial):
+    """Convert a dictionary of input names to initial values into a state vector"""
+    y0 = np.zeros(len(SPECIES))
+    for v in INPUTS:
+        y0[SPECIES.index(v)] = initial[v]
+    return y0
+
+
+def rhs(t, x, p):
+    """ODE differential function: x is indexed by SPECIES, p by PARAMETERS
+
+    Either a single state (x is a vector) or a batch of states (x is len(SPECIES) x n_sets, with p
+    len(PARAMETERS) x n_sets) can be evaluated in one call.
+    """
+    # Unpack parameters from the parameter vector
+    {6}
+
+    # Unpack individual species from x
+    x = np.maximum(1e-12, x)  # Truncate values just above zero
+    {7}
+
+    # Compute derivative for each species
+    {8}
+
+    # Pack derivatives for return, ensuring none go below zero
+    dx = np.empty_like(x)
+    {9}
+    return np.maximum(-x, dx)
+
+
+def jacobian_values(x, p):
+    """Compute the non-zero entries of the Jacobian, in the order of JACOBIAN_ROWS and JACOBIAN_COLUMNS
+
+    Like rhs, either a single state or a batch of states can be evaluated in one call.
+    """
+    # Unpack parameters from the parameter vector
+    {6}
+
+    # Unpack individual species from x
+    x = np.maximum(1e-12, x)  # Truncate values just above zero
+    {7}
+
+    # Compute each non-zero entry of the Jacobian
+    values = np.empty((len(JACOBIAN_ROWS),) + np.shape(x)[1:])
+    {13}
+    return values
+
+
+def jacobian(t, x, p):
+    """Jacobian of the ODE differential function (not including the truncation at zero), as a sparse matrix"""
+    return csc_matrix((jacobian_values(x, p), (JACOBIAN_ROWS, JACOBIAN_COLUMNS)), shape=(len(SPECIES), len(SPECIES)))
+
+
+def jacobian_options(method, jac):
+    """Get the solve_ivp options for passing a sparse Jacobian function to the given method"""
+    if method in ('BDF', 'Radau'):
+        return {{'jac': jac}}
+    if method == 'LSODA':
+        return {{'jac': lambda *args: jac(*args).toarray()}}
+    return {{}}  # explicit methods do not use a Jacobian
+
+
+def simulate(time_span, parameters, initial, step=1, method='{10}'):
+    """Simulate the model
+
+    :param time_span: hours values [start, stop]
+    :param parameters: dictionary of names to numbers (e.g., rate constants, decay rates, Hill coefficients)
+    :param initial: dictionary of input variable names to initial values
+    :param step: number of hours between samples in output; defaults to 1
+    :param method: scipy.integrate.solve_ivp method to use
+    :return: vector of time, species names, matrix of output levels at those time points, matrix of all species
+    """
+    solution = solve_ivp(rhs, (time_span[0], time_span[-1]), pack_initial(initial), method=method,
+                         args=(pack_parameters(parameters),), dense_output=True, **jacobian_options(method, jacobian))
+    if not solution.success:
+        raise RuntimeError(f'Simulation failed: {{solution.message}}')
+
+    # Evaluate species levels at given times
+    time_interval = np.arange(time_span[0], time_span[-1] + step / 2, step)
+    y = solution.sol(time_interval)
+    y_out = y[OUTPUT_INDICES, :]
+    return time_interval, SPECIES, y_out, y
+
+
+def simulate_group(time_span, parameter_sets, initial_states, time_interval, method, rtol, atol):
+    """Integrate a group of parameter sets as one batched system, returning n_sets x species x times levels"""
+    n_sets, n_species = initial_states.shape
+    p = parameter_sets.T
+
+    def batched_rhs(t, y):
+        return rhs(t, y.reshape(n_sets, n_species).T, p).T.ravel()
+
+    # The batched Jacobian is block diagonal, with one block per member
+    offsets = np.repeat(np.arange(n_sets) * n_species, len(JACOBIAN_ROWS))
+    rows = offsets + np.tile(JACOBIAN_ROWS, n_sets)
+    columns = offsets + np.tile(JACOBIAN_COLUMNS, n_sets)
+
+    def batched_jacobian(t, y):
+        values = jacobian_values(y.reshape(n_sets, n_species).T, p)
+        return csc_matrix((values.T.ravel(), (rows, columns)), shape=(y.size, y.size))
+
+    # The solver controls the RMS error over the whole group, so tighten the tolerances enough that
+    # every member meets them on its own
+    scale = np.sqrt(n_sets)
+    solution = solve_ivp(batched_rhs, (time_span[0], time_span[-1]), initial_states.ravel(), method=method,
+                         dense_output=True, rtol=rtol / scale, atol=atol / scale,
+                         **jacobian_options(method, batched_jacobian))
+    if not solution.success:
+        raise RuntimeError(f'Simulation failed: {{solution.message}}')
+    return solution.sol(time_interval).reshape(n_sets, n_species, len(time_interval))
+
+
+def simulate_ensemble(time_span, parameter_sets, initial_states, step=1, method='{10}', group_size=64,
+                      rtol=1e-3, atol=1e-6):
+    """Simulate many parameter sets, evaluating the model for a whole group of sets in each call
+
+    :param time_span: hours values [start, stop]
+    :param parameter_sets: matrix of parameter values, n_sets x len(PARAMETERS) (see pack_parameters)
+    :param initial_states: matrix of initial states, n_sets x len(SPECIES), or one state for all sets
+    :param step: number of hours between samples in output; defaults to 1
+    :param method: scipy.integrate.solve_ivp method to use
+    :param group_size: number of parameter sets to integrate together as one batched system
+    :param rtol: relative tolerance that each member must meet
+    :param atol: absolute tolerance that each member must meet
+    :return: vector of time, species names, n_sets x outputs x times array of output levels,
+        n_sets x species x times array of all species
+    """
+    parameter_sets = np.atleast_2d(np.asarray(parameter_sets, dtype=float))
+    n_sets = parameter_sets.shape[0]
+    initial_states = np.broadcast_to(np.asarray(initial_states, dtype=float), (n_sets, len(SPECIES)))
+
+    # Integrate each group of parameter sets as one system
+    time_interval = np.arange(time_span[0], time_span[-1] + step / 2, step)
+    y = np.empty((n_sets, len(SPECIES), len(time_interval)))
+    for start in range(0, n_sets, group_size):
+        group = slice(start, min(start + group_size, n_sets))
+        y[group] = simulate_group(time_span, parameter_sets[group], initial_states[group], time_interval,
+                                  method, rtol, atol)
+    y_out = y[:, OUTPUT_INDICES, :]
+    return time_interval, SPECIES, y_out, y
+'''
+"""Template for the Python simulation module, including the runner, the step function, and its Jacobian.
+Format parameters are:
+
+ 0 protocol name
+ 1 identity of the system the model was generated from
+ 2 Species names: 'VARIABLE', 'VARIABLE', ...
+ 3 Parameter names: 'PARAMETER', 'PARAMETER', ...
+ 4 Input names: 'VARIABLE', 'VARIABLE', ...
+ 5 Output names: 'VARIABLE', 'VARIABLE', ...
+ 6 Parameter unpacking: PARAMETER = p[i]
+ 7 Species unpacking: sp_VARIABLE = x[i]
+ 8 Derivative equations for each species: d_VARIABLE = EXPRESSION
+ 9 Packing of derivatives for return value: dx[i] = d_VARIABLE
+ 10 solve_ivp method (e.g., BDF or LSODA)
+ 11 Jacobian row of each non-zero entry: i, i, ...
+ 12 Jacobian column of each non-zero entry: j, j, ...
+ 13 Jacobian entry equations: values[k] = EXPRESSION
+"""
+
+
+python_sensitivity_template = '''
+
+PARAMETER_JACOBIAN_ROWS = np.array([{0}], dtype=int)
+PARAMETER_JACOBIAN_COLUMNS = np.array([{1}], dtype=int)
+"""Species row and parameter column of each non-zero entry of the derivative of rhs with respect to the parameters"""
+
+
+def parameter_jacobian_values(x, p):
+    """Compute the non-zero entries of the derivative of rhs with respect to the parameters, in the order of
+    PARAMETER_JACOBIAN_ROWS and PARAMETER_JACOBIAN_COLUMNS
+
+    Like rhs, either a single state or a batch of states can be evaluated in one call.
+    """
+    # Unpack parameters from the parameter vector
+    {2}
+
+    # Unpack individual species from x
+    x = np.maximum(1e-12, x)  # Truncate values just above zero
+    {3}
+
+    # Compute each non-zero entry of the derivative with respect to the parameters
+    values = np.empty((len(PARAMETER_JACOBIAN_ROWS),) + np.shape(x)[1:])
+    {4}
+    return values
+
+
+def parameter_jacobian(t, x, p):
+    """Derivative of the ODE differential function with respect to the parameters (not including the truncation
+    at zero), as a sparse species x parameters matrix"""
+    return csc_matrix((parameter_jacobian_values(x, p), (PARAMETER_JACOBIAN_ROWS, PARAMETER_JACOBIAN_COLUMNS)),
+                      shape=(len(SPECIES), len(PARAMETERS)))
+
+
+def sensitivity_rhs(t, z, p):
+    """Forward sensitivity system: z holds the state, then the sensitivity of each species to each parameter
+    in turn, which evolves as d(dx/dp)/dt = J dx/dp + df/dp (not including the truncation at zero)"""
+    n_species = len(SPECIES)
+    x = z[:n_species]
+    s = z[n_species:].reshape(len(PARAMETERS), n_species).T
+    ds = jacobian(t, x, p) @ s + parameter_jacobian(t, x, p).toarray()
+    return np.concatenate([rhs(t, x, p), ds.T.ravel()])
+
+
+def sensitivity_jacobian(t, z, p):
+    """Jacobian of the sensitivity system, leaving out the dependence of the sensitivity equations on x (which
+    only slows the solver's Newton iterations, without changing the solution)
+
+    This is block diagonal, with the Jacobian of the model in each of the len(PARAMETERS) + 1 blocks.
+    """
+    n_species = len(SPECIES)
+    n_blocks = len(PARAMETERS) + 1
+    offsets = np.repeat(np.arange(n_blocks) * n_species, len(JACOBIAN_ROWS))
+    return csc_matrix((np.tile(jacobian_values(z[:n_species], p), n_blocks),
+                       (offsets + np.tile(JACOBIAN_ROWS, n_blocks), offsets + np.tile(JACOBIAN_COLUMNS, n_blocks))),
+                      shape=(z.size, z.size))
+
+
+def simulate_sensitivities(time_span, parameters, initial, step=1, method='{5}'):
+    """Simulate the model together with the sensitivity of every species to every parameter, in one solve
+
+    :param time_span: hours values [start, stop]
+    :param parameters: dictionary of names to numbers (e.g., rate constants, decay rates, Hill coefficients)
+    :param initial: dictionary of input variable names to initial values
+    :param step: number of hours between samples in output; defaults to 1
+    :param method: scipy.integrate.solve_ivp method to use
+    :return: vector of time, species names, matrix of output levels at those time points, matrix of all species,
+        species x parameters x times array of the sensitivities d(level)/d(parameter), in the order of PARAMETERS
+    """
+    z0 = np.concatenate([pack_initial(initial), np.zeros(len(SPECIES) * len(PARAMETERS))])
+    solution = solve_ivp(sensitivity_rhs, (time_span[0], time_span[-1]), z0, method=method,
+                         args=(pack_parameters(parameters),), dense_output=True,
+                         **jacobian_options(method, sensitivity_jacobian))
+    if not solution.success:
+        raise RuntimeError(f'Simulation failed: {{solution.message}}')
+
+    # Evaluate species levels and sensitivities at given times
+    time_interval = np.arange(time_span[0], time_span[-1] + step / 2, step)
+    z = solution.sol(time_interval)
+    y = z[:len(SPECIES)]
+    sensitivities = z[len(SPECIES):].reshape(len(PARAMETERS), len(SPECIES), len(time_interval)).transpose(1, 0, 2)
+    y_out = y[OUTPUT_INDICES, :]
+    return time_interval, SPECIES, y_out, y, sensitivities
+'''
+"""Template for the forward sensitivity system, appended to a Python simulation module. Format parameters are:
+
+ 0 Parameter Jacobian row (species) of each non-zero entry: i, i, ...
+ 1 Parameter Jacobian column (parameter) of each non-zero entry: j, j, ...
+ 2 Parameter unpacking: PARAMETER = p[i]
+ 3 Species unpacking: sp_VARIABLE = x[i]
+ 4 Parameter Jacobian entry equations: values[k] = EXPRESSION
+ 5 solve_ivp method (e.g., BDF or LSODA)
+"""
+
+
+def format_python_model(name: str, identity: str, parameters: List[str], variables: List[str],
+                        inputs: List[str], outputs: List[str],
+                        derivatives: List[Tuple[str, str]],
+                        jacobian: List[Tuple[int, int, expressions.Expression]], method: str = 'BDF',
+                        parameter_jacobian: Optional[List[Tuple[int, int, expressions.Expression]]] = None) -> str:
+    """Generate a Python ODE simulation module from the provided inputs
+
+    :param name: protocol name
+    :param identity: identity of the system the model was generated from
+    :param parameters: list of parameter names
+    :param variables: list of variable names
+    :param inputs: list of names of input variables
+    :param outputs: list of names of output variables
+    :param derivatives: list of pairs of species name and Matlab expression for its derivative
+    :param jacobian: list of (row, column, expression) for the non-zero Jacobian entries, 0-indexed
+    :param method: scipy.integrate.solve_ivp method to use, defaults to BDF
+    :param parameter_jacobian: list of (row, column, expression) for the non-zero entries of the derivatives
+        with respect to the parameters, 0-indexed; if given, the module also gets its forward sensitivity system
+    :return: string containing contents for Python simulation module
+    """
+    variable_names = [v.removeprefix(SPECIES_PREFIX) for v in variables]
+    parameter_unpacking = "\n    ".join(f'{python_name(p)} = p[{i}]' for i, p in enumerate(parameters))
+    species_unpacking = "\n    ".join(f'{species_variable(v)} = x[{i}]' for i, v in enumerate(variable_names))
+    equations = "\n    ".join(f'{differential(v)} = {python_expression(e)}' for v, e in derivatives)
+    pack_derivatives = "\n    ".join(f'dx[{i}] = {differential(v)}' for i, v in enumerate(variable_names))
+    jacobian_rows = ", ".join(str(row) for row, _, _ in jacobian)
+    jacobian_columns = ", ".join(str(column) for _, column, _ in jacobian)
+    jacobian_values = "\n    ".join(f'values[{k}] = {expressions.to_python(e, python_symbol)}'
+                                   f'  # d({differential(variable_names[row])})/d({variable_names[column]})'
+                                   for k, (row, column, e) in enumerate(jacobian))
+    model = python_template.format(name, identity, quoted_names(variables), quoted_names(parameters),
+                                   quoted_names(inputs), quoted_names(outputs), parameter_unpacking, species_unpacking,
+                                   equations, pack_derivatives, method, jacobian_rows, jacobian_columns,
+                                   jacobian_values)
+    if parameter_jacobian is None:
+        return model
+    parameter_jacobian_values = "\n    ".join(f'values[{k}] = {expressions.to_python(e, python_symbol)}'
+                                             f'  # d({differential(variable_names[row])})/d({parameters[column]})'
+                                             for k, (row, column, e) in enumerate(parameter_jacobian))
+    return model + python_sensitivity_template.format(", ".join(str(row) for row, _, _ in parameter_jacobian),
+                                                      ", ".join(str(column) for _, column, _ in parameter_jacobian),
+                                                      parameter_unpacking, species_unpacking,
+                                                      parameter_jacobian_values, method)
+
+
+def make_python_model(system: sbol3.Component, method: str = 'BDF', sensitivities: bool = False,
+                      network: Optional[ReactionNetwork] = None) -> Tuple[str, List[str]]:
+    """Generate an importable Python simulation module for the identified system
+
+    The equations are the same ones written into the Matlab models by matlab_generation, so the two
+    can be cross-checked against one another.
+
+    :param system: system for which a model is to be generated
+    :param method: scipy.integrate.solve_ivp method to use, defaults to BDF
+    :param sensitivities: if true, also generate the forward sensitivity system and simulate_sensitivities
+    :param network: reaction network of the system, if already built
+    :return: string serialization of Python module, list of parameter names
+    """
+    equations = make_model_equations(system, network)
+    # Interference matrix entries are read from the parameter vector like any other parameter
+    parameters = parameter_vector_names(equations)
+    model = format_python_model(system.display_id, system.identity, parameters, equations.variables,
+                                equations.inputs, equations.outputs, equations.derivatives,
+                                make_jacobian(equations), method,
+                                make_parameter_jacobian(equations) if sensitivities else None)
+    return model, parameters
@@ -0,0 +1,337 @@
+import itertools
+import logging
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import sbol3
+from sbol_utilities.helper_functions import id_sort
+
+import ontology
+import profiling
+from shared_global_names import RECOMBINATION
+
+
+class SystemIndex(NamedTuple):
+    """Lookup tables for a system, each built in one pass over its features, interactions, or constraints"""
+    features: Dict[str, sbol3.Feature]
+    """Feature with each identity"""
+    interactions: Dict[str, List[sbol3.Interaction]]
+    """Interactions that the feature with each identity participates in, in system order"""
+    constraints: Dict[Tuple[str, str], List[sbol3.Constraint]]
+    """Constraints with each (restriction, object identity), in system order"""
+
+    def feature(self, reference) -> sbol3.Feature:
+        """Get the feature that a participant or constraint refers to"""
+        return self.features.get(str(reference)) or reference.lookup()
+
+    def in_role(self, interaction: sbol3.Interaction, role: str) -> sbol3.Feature:
+        """Find the (precisely one) feature with a given role in the interaction
+
+        :param interaction: interaction to search
+        :param role: role to search for
+        :return: Feature playing that role
+        """
+        feature_participation = [p for p in interaction.participations if role in p.roles]
+        if len(feature_participation) != 1:
+            raise ValueError(f'Role can be in 1 participant: found {len(feature_participation)} in {interaction.identity}')
+        return self.feature(feature_participation[0].participant)
+
+    def all_in_role(self, interaction: sbol3.Interaction, role: str) -> List[sbol3.Feature]:
+        """Find the features with a given role in the interaction
+
+        :param interaction: interaction to search
+        :param role: role to search for
+        :return: sorted list of Features playing that role
+        """
+        return id_sort([self.feature(p.participant) for p in interaction.participations if role in p.roles])
+
+    def subjects(self, restriction: str, feature: sbol3.Feature) -> List[sbol3.Feature]:
+        """Find the subjects of all constraints with a given restriction on a feature, e.g. its containers
+
+        :param restriction: restriction of the constraints
+        :param feature: object of the constraints
+        :return: Features that are the subjects of the constraints
+        """
+        return [self.feature(c.subject) for c in self.constraints.get((restriction, feature.identity), [])]
+
+
+@profiling.timed('network.index')
+def index_system(system: sbol3.Component) -> SystemIndex:
+    """Build the lookup tables for a system
+
+    :param system: system to index
+    :return: index of the system
+    """
+    interactions = {}
+    for i in system.interactions:
+        for p in i.participations:
+            participating = interactions.setdefault(str(p.participant), [])
+            # A feature in several roles of an interaction only lists that interaction once
+            if not participating or participating[-1] is not i:
+                participating.append(i)
+    constraints = {}
+    for c in system.constraints:
+        constraints.setdefault((c.restriction, str(c.object)), []).append(c)
+    return SystemIndex({f.identity: f for f in system.features}, interactions, constraints)
+
+
+class Modulation(NamedTuple):
+    """Regulation of the production of a species by a transcription factor or recombinase"""
+    interaction: sbol3.Interaction
+    """Regulation interaction"""
+    kind: str
+    """Type of the regulation: sbol3.SBO_INHIBITION, sbol3.SBO_STIMULATION, or RECOMBINATION"""
+    regulator: Optional[sbol3.Feature]
+    """Species whose level sets the regulation: the inhibitor or stimulator, or for recombination the
+    original (Cre-off) or recombined (Cre-on) element; None if the regulation cannot be modeled"""
+
+
+class Term(NamedTuple):
+    """One term of the derivative of a species, contributed by one interaction"""
+    interaction: sbol3.Interaction
+    """Interaction contributing the term"""
+    kind: str
+    """Type of the interaction, e.g. sbol3.SBO_GENETIC_PRODUCTION"""
+    species: sbol3.Feature
+    """Species whose derivative the term is part of"""
+    sign: str
+    """Stoichiometry of the species in the interaction: '+' if produced, '-' if consumed"""
+    reactants: List[sbol3.Feature]
+    """Species whose levels multiply the rate (mass action), or the template of a production"""
+    products: List[sbol3.Feature]
+    """Species produced by the interaction"""
+    modulators: List[Modulation]
+    """Regulation of a production"""
+    context: List[sbol3.Feature]
+    """Direct containers of the template of a production, or the single context of a recombination"""
+    modifier: Optional[sbol3.Feature] = None
+    """Recombinase of a recombination"""
+
+
+class ReactionNetwork(NamedTuple):
+    """Intermediate representation of a system, built with one traversal of its SBOL and shared by the exporters"""
+    system: sbol3.Component
+    """System that the network was built from"""
+    species: List[sbol3.Feature]
+    """All features of the system, sorted by identity"""
+    interactions: Dict[sbol3.Feature, List[sbol3.Interaction]]
+    """Interactions that each feature participates in"""
+    terms: Dict[sbol3.Feature, List[Term]]
+    """Derivative terms of each species, in order of the identity of their interactions"""
+    containers: Dict[sbol3.Feature, List[sbol3.Feature]]
+    """Features that directly contain each feature, which are the contexts of its terms"""
+    container_closure: Dict[sbol3.Feature, List[sbol3.Feature]]
+    """Transitive closure of the containers of each feature"""
+    index: SystemIndex
+    """Lookup tables for the system"""
+    inputs: List[sbol3.Feature]
+    """Features in the input interface of the system"""
+    outputs: List[sbol3.Feature]
+    """Features in the output interface of the system"""
+
+
+@profiling.timed('network.closure')
+def transitive_closure(d: dict) -> dict:
+    """Interpreting a dictionary as an acyclic directed graph, create a transitive closure of all k->v edges
+    For example {1:[2,5], 2:[3,5], 3:[], 4:[5], 5:[6], 6:[]}
+    returns {1:[2,3,5,6], 2:[3,5,6], 3:[], 4:[5,6], 5:[6], 6:[]}
+
+    Each node is closed once, after all of its targets, by a depth-first search that keeps its own stack so
+    that deep hierarchies do not hit the recursion limit. Targets that are not keys are taken to be leaves.
+
+    :param d: dictionary to close
+    :return: closure dictionary, with the targets of each key in id_sort order
+    """
+    closure = {}
+    on_path = set()  # nodes whose closure is still being computed, for detecting cycles
+    for root in d:
+        if root in closure:
+            continue
+        on_path.add(root)
+        stack = [(root, iter(d[root]))]
+        while stack:
+            node, targets = stack[-1]
+            for t in targets:
+                if t in on_path:
+                    raise ValueError(f'Cannot compute closure on cycle graph {d}')
+                if t not in closure:
+                    on_path.add(t)
+                    stack.append((t, iter(d.get(t, []))))
+                    break
+            else:
+                # All targets are closed, so this node can be closed too
+                stack.pop()
+                on_path.remove(node)
+                reachable = set(d.get(node, []))
+                reachable.update(*(closure[t] for t in d.get(node, [])))
+                closure[node] = id_sort(reachable)
+    return {k: closure[k] for k in d}
+
+
+def make_modulation(interaction: sbol3.Interaction, index: SystemIndex) -> Modulation:
+    """Identify the regulator of a regulation interaction
+
+    :param interaction: Regulation interaction
+    :param index: Lookup tables for the system
+    :return: modulation for the interaction
+    """
+    i_type = interaction.types[0]
+    if i_type == sbol3.SBO_INHIBITION:
+        return Modulation(interaction, i_type, index.in_role(interaction, sbol3.SBO_INHIBITOR))
+    elif i_type == sbol3.SBO_STIMULATION:
+        return Modulation(interaction, i_type, index.in_role(interaction, sbol3.SBO_STIMULATOR))
+    elif i_type == RECOMBINATION:
+        target = index.in_role(interaction, sbol3.SBO_MODIFIED)
+        if any(ontology.is_ancestor_of(sbol3.SO_PROMOTER, r) for r in target.roles):  # Cre-off
+            return Modulation(interaction, i_type, index.in_role(interaction, sbol3.SBO_REACTANT))
+        elif any(ontology.is_ancestor_of(sbol3.SO_TERMINATOR, r) for r in target.roles):  # Cre-on
+            return Modulation(interaction, i_type, index.in_role(interaction, sbol3.SBO_PRODUCT))
+        else:
+            raise ValueError(f'Cannot give term for recombination on roles {target.roles} in {interaction.identity}')
+    else:
+        logging.warning(f'Cannot serialize regulation {interaction.identity}, type {ontology.label(i_type)}')
+        return Modulation(interaction, i_type, None)
+
+
+@profiling.timed('network.interaction_to_term')
+def interaction_to_term(feature: sbol3.Feature, interaction: sbol3.Interaction,
+                        regulation: Dict[sbol3.Feature, List[sbol3.Interaction]],
+                        containers: Dict[sbol3.Feature, List[sbol3.Feature]],
+                        index: SystemIndex) -> Optional[Term]:
+    """Identify the term that an interaction contributes to the derivative of a feature
+
+    :param feature: Target of the term
+    :param interaction: Interaction to get a term for
+    :param regulation: Dictionary of regulation interactions in the system
+    :param containers: Dictionary of container relationships in system
+    :param index: Lookup tables for the system
+    :return: term, or None if the interaction does not change the level of the feature
+    """
+    if len(interaction.types) != 1:
+        raise ValueError(f'Expected 1 interaction type but found {len(interaction.types)} in {interaction.identity}')
+    if len(feature.types) != 1:
+        raise ValueError(f'Expected 1 feature type but found {len(feature.types)} in {feature.identity}')
+    # find the participation for this feature and its role therein
+    feature_participation = [p for p in interaction.participations if p.participant == feature.identity]
+    if len(feature_participation) != 1:
+        raise ValueError(f'Expected feature in 1 participant, but found {len(feature_participation)} in {interaction.identity}')
+    if len(feature_participation[0].roles) != 1:
+        raise ValueError(f'Do not know how to serialize multi-role participation {feature_participation[0]}')
+    i_type = interaction.types[0]
+    f_type = feature.types[0]
+    role = feature_participation[0].roles[0]
+
+    # identify the term based on interaction type and role
+    if i_type == sbol3.SBO_GENETIC_PRODUCTION:
+        if role == sbol3.SBO_TEMPLATE:
+            return None  # templates don't get equations - they are taken as regulator for products
+        elif role == sbol3.SBO_PRODUCT:
+            if f_type not in (sbol3.SBO_RNA, sbol3.SBO_PROTEIN):
+                raise ValueError(f'Cannot handle type {ontology.label(f_type)} in {feature_participation[0]}')
+            template = index.in_role(interaction, sbol3.SBO_TEMPLATE)
+            # modulation is the regulation of either the template or the product
+            modulators = [make_modulation(r, index) for r in id_sort(regulation[feature] + regulation[template])]
+            # context is the constraints of the template
+            return Term(interaction, i_type, feature, '+', [template], [feature], modulators, containers[template])
+        else:
+            logging.warning(f'Cannot serialize role in {interaction.identity} of type {ontology.label(i_type)}')
+    elif i_type == ontology.SBO_CLEAVAGE:
+        if interaction.name == 'Cas cleavage':
+            if role == sbol3.SBO_REACTANT:
+                sign = '-'
+            elif role == sbol3.SBO_PRODUCT:
+                sign = '+'
+            else:
+                raise ValueError(f'Unexpected role in {interaction.identity}: {ontology.label(role)}')
+            return Term(interaction, i_type, feature, sign, index.all_in_role(interaction, sbol3.SBO_REACTANT),
+                        index.all_in_role(interaction, sbol3.SBO_PRODUCT), [], [])
+        else:
+            raise ValueError(f'No model for cleavage {interaction.name} in {interaction.identity}')
+    elif i_type == sbol3.SBO_DEGRADATION:
+        if len(interaction.participations) != 1:
+            raise ValueError(f'Degradation assumed to have 1 participant, '
+                             f'found {len(interaction.participations)} in '
+                             f'{interaction.identity}')
+        return Term(interaction, i_type, feature, '-', [feature], [], [], [])
+    elif i_type == sbol3.SBO_NON_COVALENT_BINDING:
+        if role == sbol3.SBO_REACTANT:
+            sign = '-'
+        elif role == sbol3.SBO_PRODUCT:
+            sign = '+'
+        else:
+            raise ValueError(f'Cannot handle type {ontology.label(f_type)} in {interaction.identity}')
+        return Term(interaction, i_type, feature, sign, index.all_in_role(interaction, sbol3.SBO_REACTANT),
+                    index.all_in_role(interaction, sbol3.SBO_PRODUCT), [], [])
+    elif i_type == sbol3.SBO_INHIBITION or i_type == sbol3.SBO_STIMULATION:
+        # Pass for the regulation interactions that are taken care of as modulators, so you don't get a warning
+        pass
+    elif i_type == RECOMBINATION:
+        if role == sbol3.SBO_MODIFIER or role == sbol3.SBO_MODIFIED:
+            return None  # no effect on Cre concentration, not modeling excised element
+        reactant = index.in_role(interaction, sbol3.SBO_REACTANT)
+        ct = containers[reactant]
+        if len(ct) != 1:
+            raise ValueError(f'Recombination expected 1 context, got {len(ct)} in {interaction.identity}')
+        if role == sbol3.SBO_REACTANT:
+            sign = '-'
+        elif role == sbol3.SBO_PRODUCT:
+            sign = '+'
+        else:
+            raise ValueError(f'Cannot handle type {ontology.label(f_type)} in {interaction.identity}')
+        return Term(interaction, i_type, feature, sign, [reactant], [], [], ct,
+                    index.in_role(interaction, sbol3.SBO_MODIFIER))
+    else:
+        logging.warning(f'Cannot serialize interaction {interaction.identity} of type {ontology.label(i_type)}')
+    return None
+
+
+@profiling.timed('network.build')
+def make_reaction_network(system: sbol3.Component) -> ReactionNetwork:
+    """Build the reaction network of a system, to be serialized by any of the exporters
+
+    :param system: system for which a network is to be built
+    :return: reaction network
+    """
+    index = index_system(system)
+    # for each feature, collect all of the interactions and constraints that it participates in
+    interactions = {f: index.interactions.get(f.identity, []) for f in system.features}
+    containers = {f: index.subjects(sbol3.SBOL_CONTAINS, f) for f in system.features}
+    regulators = {f: index.subjects(sbol3.SBOL_MEETS, f) for f in system.features}
+    regulation = {f: list(itertools.chain(*(interactions[r] for r in regulators[f]))) for f in regulators}
+
+    # collect the terms of the derivative of each feature, based on the roles in the interactions
+    species = id_sort(system.features)
+    terms = {f: [t for t in (interaction_to_term(f, i, regulation, containers, index) for i in id_sort(interactions[f])) if t]
+             for f in species}
+
+    # TODO: interfaces will change to interface after resolution of https://github.com/SynBioDex/pySBOL3/issues/316
+    # TODO: input/ouput will change to plural after resolution of https://github.com/SynBioDex/pySBOL3/issues/315
+    interface = system.interface
+    return ReactionNetwork(
+        system=system,
+        species=species,
+        interactions=interactions,
+        terms=terms,
+        containers=containers,
+        container_closure=transitive_closure(containers),
+        index=index,
+        inputs=[f for f in species if interface and f.identity in (str(x) for x in interface.inputs)],
+        outputs=[f for f in species if interface and f.identity in (str(x) for x in interface.outputs)])
+
+
+def interfering_regulators(network: ReactionNetwork, feature: sbol3.Feature) -> List[sbol3.Feature]:
+    """Find all other regulators that interfere with a given regulator
+
+    :param network: reaction network of the system
+    :param feature: Feature for the regulator of interest
+    :return: a list of sbol features that interfere with the given regulator
+    """
+    # Search the "Control" interactions of this feature for the ones where it is the thing being
+    # controlled (modified), and then save the modifier to a list
+    interferers = []
+    for interaction in network.interactions[feature]:
+        if sbol3.SBO_CONTROL in interaction.types:
+            for participant in interaction.participations:
+                # The participant that is not our main feature and does the modifying is our interferer
+                if (participant.participant != feature.identity) and (sbol3.SBO_MODIFIER in participant.roles):
+                    interferers.append(network.index.feature(participant.participant))
+    return id_sort(interferers)
@@ -0,0 +1,121 @@
+import hashlib
+import json
+import os
+from types import ModuleType
+from typing import Callable, Dict, Iterable, List, NamedTuple
+
+import rdflib
+import sbol3
+
+import profiling
+
+MANIFEST_VERSION = 1
+"""Version of the manifest file format; manifests of any other version are ignored"""
+
+
+class RegenerationReport(NamedTuple):
+    """Outcome of regenerate_models"""
+    written: List[str]
+    """Display IDs of the systems whose models were (re)written"""
+    unchanged: List[str]
+    """Display IDs of the systems whose models were already up to date"""
+    deleted: List[str]
+    """Files of models whose systems are no longer in the document, which have been removed"""
+
+
+@profiling.timed('regeneration.hash')
+def component_hash(component: sbol3.Component) -> str:
+    """Compute a canonical hash of a component and everything it owns: its features, interactions, constraints,
+    and interface. The hash depends only on the content, not on the order in which the triples are stored.
+
+    :param component: component to hash
+    :return: hexadecimal SHA-256 digest
+    """
+    graph = rdflib.Graph()
+    component.serialize(graph)
+    lines = sorted(f'{s.n3()} {p.n3()} {o.n3()} .' for s, p, o in graph)
+    return hashlib.sha256('\n'.join(lines).encode('utf-8')).hexdigest()
+
+
+def generator_version(modules: Iterable[ModuleType], *settings) -> str:
+    """Compute a version for a model generator from the source of the modules it uses and its settings,
+    so that any change to the generator invalidates all of the models that it wrote
+
+    :param modules: modules whose source determines the generated code
+    :param settings: any other arguments that change the generated code, e.g., the ODE solver
+    :return: hexadecimal SHA-256 digest
+    """
+    digest = hashlib.sha256(repr(settings).encode('utf-8'))
+    for module in sorted(modules, key=lambda m: m.__name__):
+        with open(module.__file__, 'rb') as f:
+            digest.update(module.__name__.encode('utf-8'))
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def load_manifest(path: str) -> Dict:
+    """Read a manifest of generated models, or return an empty one if there is none
+
+    :param path: manifest file
+    :return: dictionary with the generator version and the file and hash of each model
+    """
+    empty = {'version': MANIFEST_VERSION, 'generator': None, 'models': {}}
+    if not os.path.exists(path):
+        return empty
+    with open(path) as f:
+        manifest = json.load(f)
+    return manifest if manifest.get('version') == MANIFEST_VERSION else empty
+
+
+def save_manifest(path: str, manifest: Dict):
+    """Write a manifest of generated models, with its keys sorted so that the file is stable under version control
+
+    :param path: manifest file
+    :param manifest: dictionary with the generator version and the file and hash of each model
+    """
+    with open(path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def regenerate_models(components: List[sbol3.Component], out_dir: str, extension: str, manifest_path: str,
+                      generator: str, generate: Callable[[List[sbol3.Component]], List[str]]) -> RegenerationReport:
+    """Write a model file for each component, skipping those that are already up to date
+
+    A model is up to date if its file exists and the manifest records the same component hash and generator
+    version as now. Models listed in the manifest whose components are no longer present are deleted.
+
+    :param components: systems to generate models for
+    :param out_dir: directory for the model files, named by the display ID of each system
+    :param extension: file extension of the model files, e.g., '.m'
+    :param manifest_path: manifest file recording what was last generated
+    :param generator: version of the generator, e.g., from generator_version
+    :param generate: function making the contents of the model files for a list of systems, in the same order,
+        e.g., generating them across a process pool
+    :return: report of the models written, skipped, and deleted
+    """
+    manifest = load_manifest(manifest_path)
+    previous = manifest['models'] if manifest['generator'] == generator else {}
+    models = {c.display_id: {'file': f'{c.display_id}{extension}', 'hash': component_hash(c)} for c in components}
+    stale = [c for c in components if previous.get(c.display_id) != models[c.display_id]
+             or not os.path.exists(os.path.join(out_dir, models[c.display_id]['file']))]
+    # Generate all of the stale models together, then write them in document order
+    for c, text in zip(stale, generate(stale)):
+        print(f'Writing model for {c.identity}')
+        path = os.path.join(out_dir, models[c.display_id]['file'])
+        with profiling.timer('regeneration.write'), open(path, 'w') as out:
+            out.write(text)
+    written = [c.display_id for c in stale]
+    unchanged = [display_id for display_id in models if display_id not in written]
+
+    # Remove the models of systems that are no longer in the document
+    deleted = []
+    for display_id, entry in manifest['models'].items():
+        orphan = os.path.join(out_dir, entry['file'])
+        if display_id not in models and os.path.exists(orphan):
+            print(f'Deleting model for removed system {display_id}')
+            os.remove(orphan)
+            deleted.append(entry['file'])
+
+    save_manifest(manifest_path, {'version': MANIFEST_VERSION, 'generator': generator, 'models': models})
+    return RegenerationReport(written, unchanged, deleted)
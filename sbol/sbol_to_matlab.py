@@ -1,24 +1,23 @@
+import argparse
 import os
 
-import sbol3
-
-import matlab_generation
+import pipeline
 from shared_global_names import MODEL_FILE
 
+# Set to False to write the equations in their readable form, without common subexpression elimination,
+# folding of repeated factors, or hoisting of parameter-only subexpressions
+OPTIMIZE = True
+
 # Set the working directory to be the SBOL sub-folder
 # Needed when starting from the run.debug button in the IDE
 os.chdir('sbol')
 
+parser = argparse.ArgumentParser()
+parser.add_argument('--jobs', type=pipeline.job_count, default=1,
+                    help='Number of processes to generate models with (0 for one per CPU)')
+parser.add_argument('--sensitivities', action='store_true',
+                    help='Also generate the forward sensitivity equations of the models')
+args = parser.parse_args()
 
-doc = sbol3.Document()
-print(f'Reading {MODEL_FILE}')
-doc.read(MODEL_FILE)
-
-# For each system in the document, generate a matlab model
-# Model has three parts:
-for c in (o for o in doc.objects if isinstance(o, sbol3.Component)):
-    with open(os.path.join('../models', f'{c.display_id}.m'),
-              'w') as out:
-        print(f'Writing model for {c.identity}')
-        model, parameters = matlab_generation.make_matlab_model(c, 'ode15s')
-        out.write(model)
+# For each system in the document, generate a matlab model, skipping those that are unchanged since the last run
+pipeline.export_matlab(MODEL_FILE, '../models', args.jobs or None, OPTIMIZE, 'ode15s', args.sensitivities)
@@ -0,0 +1,20 @@
+import argparse
+import os
+
+import pipeline
+from shared_global_names import MODEL_FILE
+
+# Set the working directory to be the SBOL sub-folder
+# Needed when starting from the run.debug button in the IDE
+os.chdir('sbol')
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--jobs', type=pipeline.job_count, default=1,
+                    help='Number of processes to generate models with (0 for one per CPU)')
+parser.add_argument('--sensitivities', action='store_true',
+                    help='Also generate the forward sensitivity equations of the models')
+args = parser.parse_args()
+
+# For each system in the document, generate a Python model alongside the Matlab one,
+# skipping those that are unchanged since the last run
+pipeline.export_python(MODEL_FILE, '../models', args.jobs or None, 'BDF', args.sensitivities)
@@ -0,0 +1,163 @@
+function [time_interval, species_names, y_out, y] = cachedSimulation(modelFun, time_span, parameters, initial, step, parameter_index)
+    % FUNCTION NAME:
+    %   cachedSimulation
+    %
+    % DESCRIPTION:
+    %   Run a generated model, reusing the result of an identical earlier
+    %   run from a persistent on-disk cache. Results are keyed by the
+    %   SHA-256 hash of the model file (which fixes its equations and ODE
+    %   solver settings), the names and values of the parameters and
+    %   initial values, the time span, and the step, so any driver asking
+    %   for an already-computed trajectory gets it without solving. The
+    %   parameters may be given either as a Map or as a vector with its
+    %   index Map; both give the same key for the same values. When the
+    %   cache grows past its size limit, the least recently used results
+    %   are deleted.
+    %
+    % INPUT:
+    %   modelFun - (function handle) Generated model function
+    %   time_span, parameters, initial, step, parameter_index - The
+    %       arguments of the model (step and parameter_index are optional)
+    %
+    % OUTPUT:
+    %   The outputs of the model: time_interval, species_names, y_out, y
+    %
+    % ASSUMPTIONS AND LIMITATIONS:
+    %   The cache is in simulations/.simulation-cache unless the
+    %       environment variable SIMULATION_CACHE_DIR names another folder
+    %   The size limit is 2048 MB unless SIMULATION_CACHE_LIMIT_MB is set
+    %   Setting SIMULATION_CACHE to 0 turns the cache off
+    %   Results are written to a temporary file and then renamed, so
+    %       parallel workers can share a cache
+    %
+    % REVISION HISTORY:
+    %   2026-10-18
+    %       * Initial implementation
+
+    if nargin < 5 || isempty(step), step = 1; end
+    if nargin < 6
+        modelArgs = {time_span, parameters, initial, step};
+    else
+        modelArgs = {time_span, parameters, initial, step, parameter_index};
+    end
+    if strcmp(getenv('SIMULATION_CACHE'), '0')
+        [time_interval, species_names, y_out, y] = modelFun(modelArgs{:});
+        return
+    end
+
+    % Resolve the parameters to sorted names and values, so that a Map and
+    % a vector with its index Map give the same key
+    if isa(parameters, 'containers.Map')
+        parameterNames = keys(parameters);
+        parameterValues = cell2mat(values(parameters, parameterNames));
+    else
+        parameterNames = keys(parameter_index);
+        parameterValues = parameters(cell2mat(values(parameter_index, parameterNames)));
+    end
+    key = sha256Hex([modelHash(modelFun), keyBytes(time_span), ...
+        keyBytes(parameterNames), keyBytes(parameterValues), ...
+        keyBytes(keys(initial)), keyBytes(values(initial)), keyBytes(step)]);
+
+    cacheDir = getenv('SIMULATION_CACHE_DIR');
+    if isempty(cacheDir)
+        cacheDir = fullfile(fileparts(mfilename('fullpath')), '.simulation-cache');
+    end
+    entry = fullfile(cacheDir, [key, '.mat']);
+
+    % Use the cached result if there is one, marking it as recently used
+    if isfile(entry)
+        try
+            cached = load(entry, 'time_interval', 'species_names', 'y_out', 'y');
+            time_interval = cached.time_interval;
+            species_names = cached.species_names;
+            y_out = cached.y_out;
+            y = cached.y;
+            java.io.File(entry).setLastModified(java.lang.System.currentTimeMillis());
+            return
+        catch
+            % An unreadable entry is solved again and overwritten
+        end
+    end
+
+    [time_interval, species_names, y_out, y] = modelFun(modelArgs{:});
+
+    % Write to a temporary file first, so that readers never see a partial
+    % result
+    if ~isfolder(cacheDir)
+        mkdir(cacheDir);
+    end
+    temporary = [tempname(cacheDir), '.tmp'];
+    save(temporary, 'time_interval', 'species_names', 'y_out', 'y', '-mat');
+    movefile(temporary, entry, 'f');
+    evictLeastRecentlyUsed(cacheDir, entry);
+end
+
+function evictLeastRecentlyUsed(cacheDir, entry)
+    % Delete the least recently used results once the cache is over its
+    % size limit, down to 90% of the limit. The size is counted once per
+    % session and then kept up to date with each write.
+    persistent cacheBytes countedDir
+    limitMb = str2double(getenv('SIMULATION_CACHE_LIMIT_MB'));
+    if isnan(limitMb)
+        limitMb = 2048;
+    end
+    limit = limitMb * 2^20;
+    written = dir(entry);
+    if isempty(cacheBytes) || ~strcmp(countedDir, cacheDir)
+        entries = dir(fullfile(cacheDir, '*.mat'));
+        cacheBytes = sum([entries.bytes]);
+        countedDir = cacheDir;
+    else
+        cacheBytes = cacheBytes + written.bytes;
+    end
+    if cacheBytes <= limit
+        return
+    end
+    entries = dir(fullfile(cacheDir, '*.mat'));
+    [~, order] = sort([entries.datenum]);
+    cacheBytes = sum([entries.bytes]);
+    for k = order
+        if cacheBytes <= 0.9 * limit
+            break
+        end
+        delete(fullfile(cacheDir, entries(k).name));
+        cacheBytes = cacheBytes - entries(k).bytes;
+    end
+end
+
+function hash = modelHash(modelFun)
+    % Hash the file of a model, once per session unless the file changes
+    persistent hashes
+    if isempty(hashes)
+        hashes = containers.Map();
+    end
+    file = which(func2str(modelFun));
+    info = dir(file);
+    id = sprintf('%s|%.10f|%d', file, info.datenum, info.bytes);
+    if ~isKey(hashes, id)
+        hashes(id) = sha256Hex(unicode2native(fileread(file), 'UTF-8'));
+    end
+    hash = uint8(hashes(id));
+end
+
+function bytes = keyBytes(value)
+    % Serialize a value for the cache key, with the type and size of each
+    % part so that different values never give the same bytes
+    if iscell(value)
+        parts = cellfun(@keyBytes, value, 'UniformOutput', false);
+        body = [parts{:}];
+    elseif ischar(value) || isstring(value)
+        body = unicode2native(char(value), 'UTF-8');
+    else
+        body = typecast(double(value(:))', 'uint8');
+    end
+    header = [uint8(class(value)), typecast(uint64([size(value), numel(body)]), 'uint8')];
+    bytes = [header, uint8(body)];
+end
+
+function hex = sha256Hex(bytes)
+    % Get the SHA-256 hash of a byte vector as hexadecimal text
+    digest = java.security.MessageDigest.getInstance('SHA-256');
+    digest.update(typecast(uint8(bytes), 'int8')); % Java bytes are signed
+    hex = sprintf('%02x', typecast(digest.digest(), 'uint8'));
+end
@@ -0,0 +1,32 @@
+function [parameterVector, parameterIndex] = packParameterVector(parameters)
+    % FUNCTION NAME:
+    %   packParameterVector
+    %
+    % DESCRIPTION:
+    %   Convert a parameters container map into a numeric vector and a
+    %   table of the index of each parameter name in that vector, for the
+    %   positional calling convention of the generated models
+    %
+    % INPUT:
+    %   parameters - (map) Map object listing the parameter names and
+    %       values as determined from parameter fitting and literature
+    %
+    % OUTPUT:
+    %   parameterVector - (double) Parameter values, in the order of
+    %       keys(parameters)
+    %   parameterIndex - (map) Map object from each parameter name to its
+    %       index in parameterVector
+    %
+    % ASSUMPTIONS AND LIMITATIONS:
+    %   The index table only needs to be built once; scans can then change
+    %   entries of parameterVector directly and pass both to a model as
+    %   modelFun(tspan, parameterVector, initial, step, parameterIndex)
+    %
+    % REVISION HISTORY:
+    %   2026-10-18
+    %       * Initial implementation
+
+    names = keys(parameters);
+    parameterVector = cell2mat(values(parameters, names));
+    parameterIndex = containers.Map(names, num2cell(1:length(names)));
+end
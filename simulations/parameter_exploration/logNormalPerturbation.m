@@ -1,6 +1,6 @@
 function results = logNormalPerturbation(...
         fcnHandle, vars, perturbedVars, nRuns, tspan, initial, random, ...
-        setSeed)
+        setSeed, normalDraws)
     % FUNCTION NAME:
     %   logNormalPerturbation
     %
@@ -22,6 +22,10 @@ function results = logNormalPerturbation(...
     %       normal scale?
     %   setSeed - (logical) Do you want to set the random number generator
     %       to the default seed (0)? True for yes
+    %   normalDraws - (double) Optional nRuns x length(perturbedVars)
+    %       standard normal values to perturb with when random is true,
+    %       drawn up front by sampleNormalDraws; if not given, the values
+    %       are drawn with randn as each run is set up
     %
     % OUTPUT:
     %   results - (cell) Column 1 = percentile of the perturbed value in
@@ -33,6 +37,9 @@ function results = logNormalPerturbation(...
     %   Currently asusming std devs for all parameters are 2
     %
     % REVISION HISTORY:
+    %   2026-10-18
+    %       * Reuse simulations from the result cache (cachedSimulation)
+    %       * Take the normal draws from an optional matrix drawn up front
     %   11/14/2021 - Helen Scott
     %       * Change to use with new models
     %           * Got rid of boolean vector (whichVars) because it won't 
@@ -46,6 +53,11 @@ function results = logNormalPerturbation(...
         rng('default')
     end
 
+    % Draw the random values as the runs are set up unless given
+    if nargin < 9
+        normalDraws = [];
+    end
+
     %% Set-up
     % Header for ticker
     tic
@@ -88,7 +100,10 @@ function results = logNormalPerturbation(...
         % For each perturbed var
         for k = 1:length(perturbedVars)
             % Generate value to use
-            if random
+            if random && ~isempty(normalDraws)
+                perturbedValue = 10^(normalDraws(l, k) * log10(stddev) + ...
+                    log10(vars(perturbedVars{k})));
+            elseif random
                 perturbedValue = 10^(randn() * log10(stddev) + ... % CHECK: randn gives number from a normal distribution whereas rand gives a number from a uniform distribution
                     log10(vars(perturbedVars{k})));
             else
@@ -118,7 +133,7 @@ function results = logNormalPerturbation(...
         end
         
         % Run the model, save to results array
-        [x, y_out, y] = fcnHandle(tspan, results{i, 3}, initial);
+        [x, y_out, y] = cachedSimulation(fcnHandle, tspan, results{i, 3}, initial);
         results{i, 4} = {x, y_out, y};
 
         % Carriage return at the end
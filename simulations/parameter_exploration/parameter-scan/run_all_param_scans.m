@@ -36,6 +36,11 @@ v1Values = [0, 10];
 v1names = ["Off", "On"];
 v1Levels = containers.Map(v1names, v1Values);
 
+% Set to [] to scan a fixed grid of 10 values per decade, or to a struct of
+% options (see scanParameters) to refine the scan only where the final GFP
+% or fold repression changes quickly
+adaptiveOptions = struct('tolerance', 0.05);
+
 % For each model
 for i = 1:n_models
     % Print the model name to keep track of progress
@@ -47,7 +52,7 @@ for i = 1:n_models
 %     end
 % 
 %     % Call function to preform scan
-%     scanParameters(models(i, :), v1Levels, tspan, parameters, parametersToScan, outpath)
+%     scanParameters(models(i, :), v1Levels, tspan, parameters, parametersToScan, outpath, adaptiveOptions)
 %     
 %     % Call function to calcuate fold repression
 %     calculateFoldRepression(models(i, :), parametersToScan, outpath)
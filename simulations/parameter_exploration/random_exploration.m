@@ -2,6 +2,10 @@
 % Last updated: 2023-08-21, by Helen Scott
 %
 % REVISION HISTORY:
+%   2026-10-18
+%       * Draw the perturbations of each model up front with
+%           sampleNormalDraws, seeded by the model, and save them with the
+%           results so that every run can be reproduced
 %   2023-09-17 - Helen Scott
 %       * Change code to run all models together
 %   2023-08-21 - Helen Scott
@@ -63,9 +67,14 @@ for i=1:n_models
         mkdir(outpath);
     end
 
+    % Draw the perturbations of every run up front
+    samplingMethod = 'random';
+    normalDraws = sampleNormalDraws(nRuns, length(parameterNames), ...
+        samplingMethod, i);
+
     % Do the perturbation
     results = logNormalPerturbation(modelFun, parameters, ...
-        parameterNames, nRuns, tspan, initial, true, false);
+        parameterNames, nRuns, tspan, initial, true, false, normalDraws);
 
     % Extract just what is needed for plotting
     percentiles = results{:, 1};
@@ -77,6 +86,7 @@ for i=1:n_models
     end
 
     % Save results as a .mat file
-    save([outpath, 'random-perturb-all.mat'], 'x', 'ys')
+    save([outpath, 'random-perturb-all.mat'], 'x', 'ys', 'normalDraws', ...
+        'samplingMethod')
     
 end
@@ -2,6 +2,10 @@
 % Last updated: 2023-08-21, by Helen Scott
 %
 % REVISION HISTORY:
+%   2026-10-18
+%       * Plot from the ensemble summary written by the Python
+%           random_exploration.py when there is one, without loading
+%           the trajectories
 %   2023-09-17 - Helen Scott
 %       * Revert to run all models
 %   2023-08-21 - Helen Scott
@@ -63,9 +67,13 @@ for i=1:n_models
         mkdir(outpath);
     end
     
-    % Load the perturbation results
-    load([resultsPath, 'random-perturb-all.mat'])
-        
-    % Plot
-    densityheatmap(x, ys, nBins, cLimits, modelName, outpath);
+    % Plot from the summary if there is one, otherwise load all of the
+    % perturbation results
+    summaryFile = [resultsPath, 'random-perturb-summary.mat'];
+    if isfile(summaryFile)
+        summaryheatmap(summaryFile, cLimits, modelName, outpath);
+    else
+        load([resultsPath, 'random-perturb-all.mat'])
+        densityheatmap(x, ys, nBins, cLimits, modelName, outpath);
+    end
 end
\ No newline at end of file
@@ -0,0 +1,62 @@
+function normalDraws = sampleNormalDraws(nRuns, nVars, method, seed)
+    % FUNCTION NAME:
+    %   sampleNormalDraws
+    %
+    % DESCRIPTION:
+    %   Draw the standard normal values of all runs of a log normal
+    %   perturbation up front, to pass to logNormalPerturbation. Random
+    %   draws give each run its own substream of a Philox generator, so
+    %   that any run can be reproduced from its index alone (e.g., on a
+    %   parallel worker). Sobol and Latin hypercube draws spread the runs
+    %   more evenly, so that percentile bands need fewer runs.
+    %
+    % INPUT:
+    %   nRuns - (double) Number of perturbations to run
+    %   nVars - (double) Number of variables to be perturbed
+    %   method - (char) 'random', 'sobol', or 'latin-hypercube'
+    %   seed - (double) Seed of the draws
+    %
+    % OUTPUT:
+    %   normalDraws - (double) nRuns x nVars standard normal values
+    %
+    % ASSUMPTIONS AND LIMITATIONS:
+    %   Sobol draws are best balanced when nRuns is a power of 2
+    %   The draws do not match those of the Python parameter_sampler.py,
+    %   which uses NumPy's generators
+    %
+    % REVISION HISTORY:
+    %   2026-10-18
+    %       * Initial implementation
+    %
+
+    stream = RandStream('philox4x32_10', 'Seed', seed);
+    switch method
+        case 'random'
+            % One substream per run, so that run i does not depend on the
+            % runs before it
+            normalDraws = zeros(nRuns, nVars);
+            for i = 1:nRuns
+                stream.Substream = i;
+                normalDraws(i, :) = randn(stream, 1, nVars);
+            end
+        case 'sobol'
+            % Scramble with the seeded stream, leaving the global stream as
+            % it was
+            previous = RandStream.setGlobalStream(stream);
+            points = scramble(sobolset(nVars), 'MatousekAffineOwen');
+            RandStream.setGlobalStream(previous);
+            normalDraws = norminv(clampUnit(net(points, nRuns)));
+        case 'latin-hypercube'
+            previous = RandStream.setGlobalStream(stream);
+            points = lhsdesign(nRuns, nVars);
+            RandStream.setGlobalStream(previous);
+            normalDraws = norminv(clampUnit(points));
+        otherwise
+            error('Unknown sampling method %s', method);
+    end
+end
+
+% Keep points strictly inside the unit interval, where norminv is finite
+function points = clampUnit(points)
+    points = min(max(points, eps), 1 - eps);
+end
@@ -1,36 +1,52 @@
-function scanParameters(modelInfo, v1Levels, tspan, parameters, parametersToScan, outputFolder)
+function scanParameters(modelInfo, v1Levels, tspan, parameters, parametersToScan, outputFolder, adaptiveOptions)
     % FUNCTION NAME:
     %   scanParameters
     %
     % DESCRIPTION:
-    %   Generate a series of values for one or more variables perturbed on
-    %   a log normal scale. The variables are then passes to a specified
-    %   model differential equation.
+    %   Scan each parameter one at a time over a range of decades around
+    %   its base value, simulating the model at every value with each gRNA
+    %   state. By default the values are a fixed grid of 10 per decade. In
+    %   the adaptive mode, the scan starts from a coarse grid and bisects
+    %   (in log space) only the intervals where the final fold repression
+    %   (or the final GFP, without both an 'Off' and an 'On' gRNA state)
+    %   changes by more than a tolerance, so that solves go to the steep
+    %   transitions rather than the flat stretches.
     %
     % INPUT:
-    %   fcnHandle - (function handle) Function handle for differential 
-    %       equation function to be used
-    %   vars - (map) Map object listing the parameter names and values as 
-    %       determined from parameter fitting and literature
-    %   perturbedVars - (cell array) Name(s) of variables to be perturbed
-    %   nRuns - (double) Number of perturbations to run
+    %   modelInfo - (cell) Row of the model catalog (name, function handle)
+    %   v1Levels - (map) Map of gRNA state names (e.g., 'Off', 'On') to V1
+    %       initial values
     %   tspan - (double) Time span to model ([start, end])
-    %   initial - (map) Map object listing initial value names and values
-    %   random - (logical) Is the perturbation to be random on the log 
-    %       normal scale?
-    %   setSeed - (logical) Do you want to set the random number generator
-    %       to the default seed (0)? True for yes
+    %   parameters - (map) Map object listing the parameter names and
+    %       values
+    %   parametersToScan - (map) Map of parameter names to the number of
+    %       decades to scan [below, above] the base value
+    %   outputFolder - (char) Folder to save the results in
+    %   adaptiveOptions - (struct) Optional; if given, scan adaptively with
+    %       these fields (any left out take their defaults):
+    %       coarsePointsPerDecade - values per decade to start with
+    %           (default 2)
+    %       tolerance - largest change in log10 of the final fold
+    %           repression (or GFP) allowed between neighboring values
+    %           (default 0.05)
+    %       minSpacing - smallest spacing of values, in decades (default
+    %           0.0125)
+    %       maxPoints - largest number of values per parameter (default
+    %           201)
     %
     % OUTPUT:
-    %   results - (cell) Column 1 = percentile of the perturbed value in
-    %       the log normal distribution (NaN for random distributions), 
-    %       column 2 = variables used for the differential equation, column
-    %       3 = results from the model function
+    %   .mat file of the results of each parameter and gRNA state in
+    %   outputFolder/<model name>/scan-<parameter>-gRNA-<state>.mat, with
+    %   one row per value in increasing order (column 1 = parameter value,
+    %   column 2 = all parameter values, column 3 = model outputs)
     %
     % ASSUMPTIONS AND LIMITATIONS:
-    %   Currently asusming std devs for all parameters are 2
+    %   The model has GFP as its only output
     %
     % REVISION HISTORY:
+    %   2026-10-18
+    %       * Reuse simulations from the result cache (cachedSimulation)
+    %       * Add an adaptive scan mode
     %   11/14/2021 - Helen Scott
     %       * Change to use with new models
     %           * Got rid of boolean vector (whichVars) because it won't 
@@ -53,6 +69,14 @@ function scanParameters(modelInfo, v1Levels, tspan, parameters, parametersToScan
         mkdir(outpath);
     end
 
+    % Resolve the parameter names to vector indices once for the whole scan
+    [baseParameterVector, parameterIndex] = packParameterVector(parameters);
+
+    % Scan the fixed grid unless adaptive options are given
+    if nargin < 7
+        adaptiveOptions = [];
+    end
+
     %% Scan through each parameter
     % For each parameter that I want to scan
     for parameterNameCell = keys(parametersToScan)
@@ -65,6 +89,16 @@ function scanParameters(modelInfo, v1Levels, tspan, parameters, parametersToScan
         logLow = log10(baseParameterValue * 10^(-1 * scanDecades(1)));
         % Log10 value for the high end of the parameter scan
         logHigh = log10(baseParameterValue * 10^scanDecades(2));
+
+        if ~isempty(adaptiveOptions)
+            % Choose the values as the scan goes, and save the results of
+            % each gRNA state in the same files as the fixed grid
+            adaptiveScan(modelFun, v1Levels, tspan, parameters, ...
+                baseParameterVector, parameterIndex, parameterName, ...
+                logLow, logHigh, sum(scanDecades), adaptiveOptions, outpath);
+            continue
+        end
+
         % Set the number of values I want (10 per decade plus 1)
         nScans = 10 * sum(scanDecades) + 1;
         scanParameterValues = logspace(logLow, logHigh, nScans);
@@ -89,19 +123,17 @@ function scanParameters(modelInfo, v1Levels, tspan, parameters, parametersToScan
             % For every value of that parameter
             for scanIdx = 1:nScans
                 % Modulate the parameters
-                parametersToUse = containers.Map(parameters.keys, parameters.values);
-                parametersToUse(parameterName) = scanParameterValues(scanIdx);
+                parametersToUse = baseParameterVector;
+                parametersToUse(parameterIndex(parameterName)) = scanParameterValues(scanIdx);
         
                 % Run the simulation
-                [x, sp, y_out, y] = modelFun(tspan, parametersToUse, initial);
+                [x, sp, y_out, y] = cachedSimulation(modelFun, tspan, parametersToUse, initial, 1, parameterIndex);
                 
                 % Add the results to the results variable
                 results{scanIdx, 1} = scanParameterValues(scanIdx);
-                % Cannot add the parametersToUse as a map, because it was
-                % updating to old values to the newest with every loop (i.e. it
-                % was not actually saving the correct values for each row, only
-                % the last one)
-                results{scanIdx, 2} = values(parametersToUse);
+                % Save the parameter values as a cell array, in the same
+                % (sorted) order as values(parameters)
+                results{scanIdx, 2} = num2cell(parametersToUse);
                 results{scanIdx, 3} = {x + parameters('initial_delay'), sp, y_out, y}; % Shift the x value by the initial lag
     
                 % Clear parameters to use?
@@ -115,4 +147,88 @@ function scanParameters(modelInfo, v1Levels, tspan, parameters, parametersToScan
         end
     
     end
-end
\ No newline at end of file
+end
+
+function adaptiveScan(modelFun, v1Levels, tspan, parameters, ...
+        baseParameterVector, parameterIndex, parameterName, logLow, ...
+        logHigh, nDecades, options, outpath)
+    % Scan one parameter, bisecting the intervals where the output changes
+    % by more than the tolerance, and save the results of each gRNA state
+
+    % Fill in the options that were left out
+    defaults = struct('coarsePointsPerDecade', 2, 'tolerance', 0.05, ...
+        'minSpacing', 0.0125, 'maxPoints', 201);
+    for field = fieldnames(defaults)'
+        if ~isfield(options, field{1})
+            options.(field{1}) = defaults.(field{1});
+        end
+    end
+
+    % Every value is run with every gRNA state, so that the rows of the
+    % results of the states match (as calculateFoldRepression expects)
+    stateKeys = keys(v1Levels);
+    stateResults = cell(1, length(stateKeys));
+    logValues = [];
+    metrics = [];
+
+    % Start from a coarse grid
+    newLogValues = linspace(logLow, logHigh, ...
+        options.coarsePointsPerDecade * nDecades + 1)';
+    while ~isempty(newLogValues)
+        disp(['Currently on: ', parameterName, '; ', ...
+            num2str(length(newLogValues)), ' new values'])
+        for logValue = newLogValues'
+            row = length(logValues) + 1;
+            logValues(row, 1) = logValue;
+            parametersToUse = baseParameterVector;
+            parametersToUse(parameterIndex(parameterName)) = 10^logValue;
+            finalGfp = zeros(1, length(stateKeys));
+            for stateIdx = 1:length(stateKeys)
+                % Set the initial
+                initial = containers.Map();
+                initial('V1') = v1Levels(stateKeys{stateIdx});
+                initial('V2') = 3;
+
+                % Run the simulation and add it to the results of the state
+                [x, sp, y_out, y] = cachedSimulation(modelFun, tspan, parametersToUse, initial, 1, parameterIndex);
+                stateResults{stateIdx}{row, 1} = 10^logValue;
+                stateResults{stateIdx}{row, 2} = num2cell(parametersToUse);
+                stateResults{stateIdx}{row, 3} = {x + parameters('initial_delay'), sp, y_out, y}; % Shift the x value by the initial lag
+                finalGfp(stateIdx) = y_out(end);
+            end
+            metrics(row, :) = scanMetrics(finalGfp, stateKeys);
+        end
+
+        % Bisect the intervals where the output changes by more than the
+        % tolerance, largest changes first, down to the minimum spacing and
+        % up to the maximum number of values
+        [sortedLogValues, order] = sort(logValues);
+        changes = max(abs(diff(metrics(order, :), 1, 1)), [], 2);
+        widths = diff(sortedLogValues);
+        refine = find(changes > options.tolerance & widths / 2 >= options.minSpacing);
+        [~, largestFirst] = sort(changes(refine), 'descend');
+        refine = refine(largestFirst(1:min(end, options.maxPoints - length(logValues))));
+        newLogValues = (sortedLogValues(refine) + sortedLogValues(refine + 1)) / 2;
+    end
+
+    % Save the results for each gRNA state, in increasing parameter value
+    [~, order] = sort(logValues);
+    for stateIdx = 1:length(stateKeys)
+        results = stateResults{stateIdx}(order, :);
+        save([outpath, 'scan-', parameterName, '-gRNA-', stateKeys{stateIdx}, '.mat'], 'results')
+    end
+end
+
+function metrics = scanMetrics(finalGfp, stateKeys)
+    % Get the outputs that the adaptive scan refines on: log10 of the final
+    % fold repression if there are both an 'Off' and an 'On' gRNA state,
+    % otherwise log10 of the final GFP of each state
+    logGfp = log10(max(finalGfp, realmin));
+    off = strcmp(stateKeys, 'Off');
+    on = strcmp(stateKeys, 'On');
+    if any(off) && any(on)
+        metrics = logGfp(off) - logGfp(on);
+    else
+        metrics = logGfp;
+    end
+end
@@ -0,0 +1,63 @@
+function summaryheatmap(summaryFile, cLimits, name, path)
+    % FUNCTION NAME:
+    %   summaryheatmap
+    %
+    % DESCRIPTION:
+    %   Create and save the density heatmap of densityheatmap from an
+    %   ensemble summary, without loading any trajectories. The summary
+    %   holds the number of runs in each log10 level bin at each sample
+    %   time, as written by EnsembleSummary.save in
+    %   simulations/python/ensemble_summary.py.
+    %
+    % INPUT:
+    %   summaryFile - (char) .mat file of the ensemble summary, with x
+    %       (sample times in hours), logLevelEdges (edges of the log10
+    %       level bins), and histogram (times x level bins counts)
+    %   cLimits - (double) The colormap limits: a two-element vector of the
+    %       form [cmin cmax]
+    %   name - (char) Name of the model to be used in plot title
+    %   path - (char) output path
+    %
+    % OUTPUT:
+    %   .png figure saved in path
+    %
+    % ASSUMPTIONS AND LIMITATIONS:
+    %   Path is assumed to end in '/'
+    %   Each sample time gets its own time bin, rather than the 200 bins
+    %   of densityheatmap
+    %
+    % REVISION HISTORY:
+    %   2026-10-18
+    %       * Initial implementation
+    %
+
+    %% Load the summary
+    summary = load(summaryFile, 'x', 'logLevelEdges', 'histogram');
+    x = summary.x(:)';
+
+    % Put the edges of the time bins halfway between the sample times
+    midpoints = (x(1:end-1) + x(2:end)) / 2;
+    timeEdges = [2*x(1) - midpoints(1), midpoints, 2*x(end) - midpoints(end)];
+
+    %% Plot
+    figure('visible', 'off', 'PaperUnits','inches', 'PaperPosition', [0 0 3 1.5]); % Make but don't show the figure
+    histogram2('XBinEdges', timeEdges/24, 'YBinEdges', summary.logLevelEdges, ...
+        'BinCounts', double(summary.histogram), 'DisplayStyle', 'tile', ...
+        'EdgeColor', 'none');
+    xlabel('Time (Days)');
+    ylim([4.6 7.5])
+    ylabel('Log10 [GFP]');
+    colorbar('off');
+    caxis(cLimits);
+    view(2);
+    title(name);
+
+    % Set the background color to the lowest color in the colormap (to get
+    % rid of all the extra white space from setting the ylims)
+    colormapCopy = colormap;
+    set(gca, 'Color', colormapCopy(1, :))
+
+    %%  Save figure
+    set(gcf, 'InvertHardcopy', 'off')
+    saveas(gcf, [path, 'random-perturb-', name, '.png'], 'png');
+end
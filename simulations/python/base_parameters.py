@@ -0,0 +1,49 @@
+# This file contains all of the base parameter values (the Python counterpart of base_parameters.m
+# and base_interference_matrix.m)
+# This should be the starting point for any simulation run
+from typing import Dict
+
+import numpy as np
+
+
+def base_parameters() -> Dict[str, float]:
+    """Get a fresh dictionary of the base parameter values
+
+    :return: dictionary of parameter name to value
+    """
+    parameters = {}
+
+    # Transcription/translation parameters
+    parameters['alpha_r_gRNA2'] = 10**3.3090  # Molecules/hour; Taken from NIH-CRISPR
+    for i in (1, 3, 4, 5, 6):
+        parameters[f'alpha_r_gRNA{i}'] = parameters['alpha_r_gRNA2']
+    parameters['alpha_p_GFP'] = 10**5.5793  # Molecules/hour; Fit to the 2023-03-14 timecourse
+    parameters['alpha_p_dCas9'] = 10**2.0415  # Molecules/hour; Taken from NIH-CRISPR
+
+    # Degradation/dilution parameters
+    parameters['delta_g'] = 10**0.0003  # Fraction/hour; Taken from NIH-CRISPR; assuming identical for all gRNAs
+    parameters['lambda'] = 10**-1.6225  # Fraction/hour; Fit to the 2023-03-14 timecourse
+
+    # dCas9 activation/repression mechanism parameters
+    parameters['Cas_gRNA_binding'] = 10**-4.2577  # Taken from NIH-CRISPR
+    parameters['K_A'] = 2.34 * 10**6  # Used in NIH-CRISPR, from Calin Belta paper; Cannot be readily modulated
+    parameters['K_R'] = 10**2.9  # Hypothesized; Adjusted to give expected fold repression value
+    parameters['n'] = 0.92  # Used in NIH-CRISPR, from Calin Belta paper; Cannot be readily modulated
+
+    # Initial delay
+    parameters['initial_delay'] = 18.0149  # Hours; Fit to the 2023-03-14 timecourse
+
+    return unpack_int_matrix(parameters, np.eye(6))
+
+
+def unpack_int_matrix(parameters: Dict[str, float], i_matrix: np.ndarray) -> Dict[str, float]:
+    """Add the entries of an interference matrix to a parameter dictionary
+
+    :param parameters: dictionary of parameter name to value, updated in place
+    :param i_matrix: interference matrix
+    :return: the updated dictionary
+    """
+    for row in range(i_matrix.shape[0]):
+        for col in range(i_matrix.shape[1]):
+            parameters[f'int_matrix_{row + 1}_{col + 1}'] = float(i_matrix[row, col])
+    return parameters
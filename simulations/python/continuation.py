@@ -0,0 +1,298 @@
+# continuation
+# Follow the steady state of a model along a parameter or input axis (the steady-state counterpart of the
+# one-at-a-time scans of scanParameters.m and check_vector_concentrations.m), e.g.:
+#
+#     python continuation.py Multisite_4_gRNA_Repression K_R --decades 2 2 --output scan-K_R.mat
+#     python continuation.py Multisite_4_gRNA_Repression V1 V2 --values 1 10 100 --output scan-vectors.mat
+#
+# Only the first value is solved from scratch. Every later value starts from the solution at the value before it,
+# moved along the tangent of the branch, and is polished by Newton on the generated RHS and Jacobian, so a sweep
+# costs a few Newton iterations per value instead of a stiff integration. Where the branch folds back on itself,
+# the sweep switches to pseudo-arclength steps until it has gone around the fold.
+import argparse
+from types import ModuleType
+from typing import Dict, List, NamedTuple, Sequence, Tuple, Union
+
+import numpy as np
+from scipy.io import savemat
+
+from steady_state import find_steady_state, held_system, newton
+
+
+class Branch(NamedTuple):
+    """Steady states of a model along an axis, as followed by continue_steady_state"""
+    values: np.ndarray
+    """Values of the axis, in the order they were followed"""
+    x: np.ndarray
+    """Levels of all species at each value, values x species (in the order of model.SPECIES)"""
+    converged: np.ndarray
+    """True at each value where the steady state was found to within tolerance"""
+    iterations: np.ndarray
+    """Number of Newton iterations taken for each value, including those of any arclength steps"""
+    folds: np.ndarray
+    """Approximate values of the axis at which the branch turned back on itself (saddle-node folds)"""
+
+
+class _Axis(NamedTuple):
+    """Indices of the parameters and held inputs that are all set to the value of an axis"""
+    parameters: List[int]
+    inputs: List[int]
+
+
+def _axis(model: ModuleType, names: Sequence[str]) -> _Axis:
+    """Resolve the names of an axis to parameter and species indices"""
+    unknown = [name for name in names if name not in model.PARAMETERS and name not in model.INPUTS]
+    if unknown:
+        raise ValueError(f'{model.__name__} has no parameter or input named {", ".join(unknown)}')
+    return _Axis([model.PARAMETERS.index(name) for name in names if name in model.PARAMETERS],
+                 [model.SPECIES.index(name) for name in names if name in model.INPUTS])
+
+
+def _at(axis: _Axis, p: np.ndarray, x: np.ndarray, value: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Get copies of a parameter vector and state with the axis set to a value"""
+    p = p.copy()
+    x = x.copy()
+    p[axis.parameters] = value
+    x[axis.inputs] = value
+    return p, x
+
+
+def _linearize(model: ModuleType, axis: _Axis, p: np.ndarray, x: np.ndarray, free: np.ndarray,
+               value: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Get the derivatives of the free species' RHS with respect to the free species and to the axis
+
+    Inputs on the axis are differentiated exactly with the Jacobian; parameters by central differences.
+
+    :return: free x free Jacobian, derivative with respect to the axis
+    """
+    p, x = _at(axis, p, x, value)
+    jacobian = model.jacobian(0, x, p).toarray()
+    d_value = jacobian[np.ix_(free, axis.inputs)].sum(axis=1)
+    if axis.parameters:
+        h = 1e-6 * abs(value) if value else 1e-6
+        p_high, _ = _at(axis, p, x, value + h)
+        p_low, _ = _at(axis, p, x, value - h)
+        d_value = d_value + (model.rhs(0, x, p_high)[free] - model.rhs(0, x, p_low)[free]) / (2 * h)
+    return jacobian[np.ix_(free, free)], d_value
+
+
+def _arclength(model: ModuleType, axis: _Axis, p: np.ndarray, x: np.ndarray, free: np.ndarray, value: float,
+               target: float, max_steps: int, max_iterations: int, rtol: float,
+               atol: float) -> Tuple[np.ndarray, bool, int, List[float]]:
+    """Follow the branch from a solution at one value to the solution at a target value by pseudo-arclength steps
+
+    The free species and the axis are scaled by their levels at the start, and each step solves the steady state
+    together with the condition that it lies on the plane normal to the tangent at the predicted point, so the
+    steps go around folds where the steady state is not a function of the axis.
+
+    :return: state at the target value, whether it converged, number of Newton iterations, values of any folds
+    """
+    scale = np.append(np.maximum(np.abs(x[free]), atol), abs(target - value))
+    n = len(free)
+
+    def residual(y):
+        p_y, x_y = _at(axis, p, state(y), y[n] * scale[n])
+        return model.rhs(0, x_y, p_y)[free]
+
+    def state(y):
+        x_y = x.copy()
+        x_y[free] = y[:n] * scale[:n]
+        return x_y
+
+    def bordered(y, tangent):
+        jacobian, d_value = _linearize(model, axis, p, state(y), free, y[n] * scale[n])
+        return np.vstack([np.column_stack([jacobian * scale[:n], d_value * scale[n]]), tangent])
+
+    # Start along the tangent of the natural parameterization, toward the target
+    y = np.append(x[free], value) / scale
+    jacobian, d_value = _linearize(model, axis, p, x, free, value)
+    try:
+        tangent = np.append(np.linalg.solve(jacobian, -d_value) * scale[n] / scale[:n], 1)
+    except np.linalg.LinAlgError:
+        tangent = np.append(np.zeros(n), 1)
+    tangent *= np.sign(target - value) / np.linalg.norm(tangent)
+
+    iterations = 0
+    folds = []
+    ds = 0.25
+    for _ in range(max_steps):
+        # Predict along the tangent, then correct on the plane normal to it
+        predicted = y + ds * tangent
+        candidate = predicted.copy()
+        converged = False
+        for step_iterations in range(1, max_iterations + 1):
+            iterations += 1
+            rhs = np.append(residual(candidate), tangent @ (candidate - predicted))
+            try:
+                step = np.linalg.solve(bordered(candidate, tangent), -rhs)
+            except np.linalg.LinAlgError:
+                break
+            candidate = candidate + step
+            if np.all(np.abs(step) <= rtol * np.abs(candidate) + atol / scale):
+                converged = True
+                break
+        if not converged:
+            ds /= 2
+            if ds < 1e-8:
+                break
+            continue
+
+        # The new tangent continues in the direction of the old one; a sign change of its axis component is a fold
+        try:
+            new_tangent = np.linalg.solve(bordered(candidate, tangent), np.append(np.zeros(n), 1))
+        except np.linalg.LinAlgError:
+            break
+        new_tangent /= np.linalg.norm(new_tangent)
+        if new_tangent[n] * tangent[n] < 0:
+            fraction = tangent[n] / (tangent[n] - new_tangent[n])
+            folds.append(float((y[n] + fraction * (candidate[n] - y[n])) * scale[n]))
+
+        # Once the target is passed, interpolate to it and polish with Newton at the target value
+        if (candidate[n] * scale[n] - target) * (y[n] * scale[n] - target) <= 0:
+            fraction = (target - y[n] * scale[n]) / ((candidate[n] - y[n]) * scale[n])
+            guess = state(y + fraction * (candidate - y))
+            p_target, guess = _at(axis, p, guess, target)
+            x_target, converged, more_iterations = newton(model, p_target, np.maximum(0, guess), free,
+                                                          max_iterations, rtol, atol)
+            return x_target, converged, iterations + more_iterations, folds
+        y, tangent = candidate, new_tangent
+        # Lengthen the steps while the corrector converges quickly
+        ds = min(2 * ds, 1) if step_iterations <= 3 else ds
+    return x, False, iterations, folds
+
+
+def continue_steady_state(model: ModuleType, parameters: Dict[str, float], initial: Dict[str, float],
+                          axis: Union[str, Sequence[str]], values: Sequence[float], max_iterations: int = 50,
+                          rtol: float = 1e-8, atol: float = 1e-6, max_arclength_steps: int = 200) -> Branch:
+    """Follow the steady state of a model along an axis, with the inputs held (see find_steady_state)
+
+    The first value is solved by find_steady_state. Each later value is predicted from the solution at the value
+    before it, moved along the tangent of the branch, and corrected by Newton. If Newton fails, or the sign of
+    the determinant of the Jacobian changes (so a fold was crossed), the step is taken again by pseudo-arclength
+    continuation, which follows the branch around any folds to the value. Only if that fails too is the value
+    solved from scratch, with time integration.
+
+    :param model: model module
+    :param parameters: dictionary of parameter names and values
+    :param initial: initial values of the model inputs, which are held fixed
+    :param axis: name of a parameter or input to vary, or several names that are all set to the same value
+        (e.g., ['V1', 'V2'])
+    :param values: values of the axis, in the order to follow them (e.g., increasing)
+    :param max_iterations: maximum number of Newton iterations per value
+    :param rtol: relative tolerance on the Newton step
+    :param atol: absolute tolerance on the Newton step
+    :param max_arclength_steps: maximum number of pseudo-arclength steps between two values
+    :return: branch of steady states
+    """
+    names = [axis] if isinstance(axis, str) else list(axis)
+    resolved = _axis(model, names)
+    values = np.asarray(values, dtype=float)
+    base_parameters = {**parameters, **{name: values[0] for name in names if name in model.PARAMETERS}}
+    base_initial = {**initial, **{name: values[0] for name in names if name in model.INPUTS}}
+    p = model.pack_parameters(base_parameters)
+    free, _ = held_system(model, p, True)
+
+    first = find_steady_state(model, base_parameters, base_initial, max_iterations=max_iterations, rtol=rtol,
+                              atol=atol)
+    states = [first.x]
+    converged = [first.converged]
+    iterations = [first.iterations]
+    folds = []
+    for value, next_value in zip(values[:-1], values[1:]):
+        x = states[-1]
+        jacobian, d_value = _linearize(model, resolved, p, x, free, value)
+        sign = np.linalg.slogdet(jacobian)[0]
+        try:
+            slope = np.linalg.solve(jacobian, -d_value)
+        except np.linalg.LinAlgError:
+            slope = np.zeros(len(free))
+
+        # Natural step: tangent predictor, Newton corrector
+        p_next, guess = _at(resolved, p, x, next_value)
+        guess[free] = np.maximum(0, x[free] + (next_value - value) * slope)
+        x_next, ok, count = newton(model, p_next, guess, free, max_iterations, rtol, atol)
+        if ok and np.linalg.slogdet(_linearize(model, resolved, p, x_next, free, next_value)[0])[0] == sign:
+            states.append(x_next)
+            converged.append(True)
+            iterations.append(count)
+            continue
+
+        x_next, ok, more, new_folds = _arclength(model, resolved, p, x, free, value, next_value,
+                                                 max_arclength_steps, max_iterations, rtol, atol)
+        count += more
+        folds.extend(new_folds)
+        if not ok:
+            state = find_steady_state(
+                model, {**base_parameters, **{name: next_value for name in names if name in model.PARAMETERS}},
+                {**base_initial, **{name: next_value for name in names if name in model.INPUTS}},
+                initial_guess=x, max_iterations=max_iterations, rtol=rtol, atol=atol)
+            x_next, ok, count = state.x, state.converged, count + state.iterations
+        states.append(x_next)
+        converged.append(ok)
+        iterations.append(count)
+    return Branch(values, np.array(states), np.array(converged), np.array(iterations), np.array(folds))
+
+
+def scan_fold_repression(model: ModuleType, parameters: Dict[str, float], initial_off: Dict[str, float],
+                         initial_on: Dict[str, float], axis: Union[str, Sequence[str]], values: Sequence[float],
+                         **kwargs) -> Tuple[np.ndarray, Branch, Branch]:
+    """Follow the steady-state fold repression of the outputs along an axis, i.e. the ratio of gRNA off to gRNA on
+
+    :param model: model module
+    :param parameters: dictionary of parameter names and values
+    :param initial_off: initial values of the model inputs with the gRNA off (e.g., V1 = 0)
+    :param initial_on: initial values of the model inputs with the gRNA on
+    :param axis: name of a parameter (or names of parameters) to vary
+    :param values: values of the axis
+    :param kwargs: additional arguments for continue_steady_state
+    :return: values x outputs fold repression, branch with the gRNA off, branch with the gRNA on
+    """
+    off = continue_steady_state(model, parameters, initial_off, axis, values, **kwargs)
+    on = continue_steady_state(model, parameters, initial_on, axis, values, **kwargs)
+    return off.x[:, model.OUTPUT_INDICES] / on.x[:, model.OUTPUT_INDICES], off, on
+
+
+def scan_values(base_value: float, decades: Sequence[float], points_per_decade: int = 10) -> np.ndarray:
+    """Get evenly spaced values in log space over a range of decades around a base value, as in scanParameters.m
+
+    :param base_value: value at the middle of the scan
+    :param decades: number of decades to scan [below, above] the base value
+    :param points_per_decade: number of values per decade
+    :return: increasing values
+    """
+    return np.logspace(np.log10(base_value) - decades[0], np.log10(base_value) + decades[1],
+                       int(round(points_per_decade * sum(decades))) + 1)
+
+
+if __name__ == '__main__':
+    from base_parameters import base_parameters
+    from model_catalog import load_model
+
+    parser = argparse.ArgumentParser(description='Follow the steady state of a model along a parameter or input')
+    parser.add_argument('model', help='Name of the model module')
+    parser.add_argument('axis', nargs='+', help='Names of the parameters or inputs set to each value')
+    values_group = parser.add_mutually_exclusive_group(required=True)
+    values_group.add_argument('--decades', type=float, nargs=2, metavar=('BELOW', 'ABOVE'),
+                              help='Decades to scan around the base value of the first name, 10 values per decade')
+    values_group.add_argument('--values', type=float, nargs='+', help='Values to scan')
+    parser.add_argument('--v1', type=float, nargs='+', default=[0, 10], help='V1 levels of the gRNA states')
+    parser.add_argument('--v2', type=float, default=3, help='V2 level')
+    parser.add_argument('--output', help='.mat file to write the branches to')
+    args = parser.parse_args()
+
+    model = load_model(args.model)
+    parameters = base_parameters()
+    scan = args.values if args.values else scan_values(parameters[args.axis[0]], args.decades)
+    results = {'values': np.asarray(scan, dtype=float), 'species': np.array(model.SPECIES, dtype=object),
+               'v1Levels': np.asarray(args.v1, dtype=float)}
+    branches = [continue_steady_state(model, parameters, {'V1': v1, 'V2': args.v2}, args.axis, scan)
+                for v1 in args.v1]
+    results['x'] = np.stack([branch.x for branch in branches])
+    results['converged'] = np.stack([branch.converged for branch in branches])
+    results['iterations'] = np.stack([branch.iterations for branch in branches])
+    for v1, branch in zip(args.v1, branches):
+        print(f'V1 = {v1:g}: {len(scan)} values, {branch.iterations.sum()} Newton iterations, '
+              f'{(~branch.converged).sum()} not converged, folds at {branch.folds.tolist()}')
+    if args.output:
+        savemat(args.output, results)
+        print(f'Wrote the branches of {args.model} to {args.output}')
@@ -0,0 +1,219 @@
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from types import ModuleType
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from scipy.stats import norm
+
+from model_catalog import load_model
+from parameter_sampler import log_normal_values
+from result_store import ResultStore, create_store, open_store
+
+
+class EnsembleResults(NamedTuple):
+    """Results of simulating one model over a set of parameter sets"""
+    time: np.ndarray
+    """Sample times (hours)"""
+    species: List[str]
+    """Species names, in the order of the second axis of y"""
+    percentiles: np.ndarray
+    """Percentile of each run in the log normal distribution (NaN for random perturbations)"""
+    parameter_sets: np.ndarray
+    """Parameter vector used for each run, n_runs x len(model.PARAMETERS)"""
+    y: np.ndarray
+    """Levels of all species, n_runs x species x times (memory-mapped if written to an output file)"""
+
+
+class EnsembleRequest(NamedTuple):
+    """One model and the parameter sets to simulate it with"""
+    model: str
+    """Name of the model module"""
+    parameter_sets: np.ndarray
+    """Parameter vectors, n_runs x len(model.PARAMETERS)"""
+    initial: Dict[str, float]
+    """Initial values of the model inputs"""
+    time_span: Sequence[float]
+    """Hours values [start, stop]"""
+    output_path: Optional[str] = None
+    """.npy file to hold the trajectories, or None to return them in memory"""
+    store_path: Optional[str] = None
+    """Result store directory to stream the runs into as they finish, instead of an output array
+    (see result_store.py)"""
+
+
+def simulate_runs(model_name: str, parameter_sets: np.ndarray, initial: Dict[str, float],
+                  time_span: Sequence[float], step: float, method: str) -> np.ndarray:
+    """Simulate a chunk of parameter sets as one batched system
+
+    :param model_name: name of the model module
+    :param parameter_sets: parameter vectors for the chunk
+    :param initial: initial values of the model inputs
+    :param time_span: hours values [start, stop]
+    :param step: number of hours between samples in output
+    :param method: scipy.integrate.solve_ivp method to use
+    :return: levels of all species, runs x species x times
+    """
+    model = load_model(model_name)
+    _, _, _, y = model.simulate_ensemble(time_span, parameter_sets, model.pack_initial(initial), step, method,
+                                         group_size=len(parameter_sets))
+    return y
+
+
+def simulate_chunk(model_name: str, output_path: str, start: int, parameter_sets: np.ndarray,
+                   initial: Dict[str, float], time_span: Sequence[float], step: float, method: str):
+    """Pool worker: simulate a chunk of parameter sets and write them straight into the shared output file
+
+    :param model_name: name of the model module
+    :param output_path: .npy file holding the n_runs x species x times output array
+    :param start: index of the first run in the chunk
+    :param parameter_sets: parameter vectors for the chunk
+    :param initial: initial values of the model inputs
+    :param time_span: hours values [start, stop]
+    :param step: number of hours between samples in output
+    :param method: scipy.integrate.solve_ivp method to use
+    """
+    y = simulate_runs(model_name, parameter_sets, initial, time_span, step, method)
+    output = np.load(output_path, mmap_mode='r+')
+    output[start:start + len(parameter_sets)] = y
+    output.flush()
+    del output
+
+
+def stream_chunk(model_name: str, store_path: str, start: int, parameter_sets: np.ndarray,
+                 initial: Dict[str, float], time_span: Sequence[float], step: float, method: str):
+    """Pool worker: simulate a chunk of parameter sets and append them to a result store as a new chunk
+
+    :param model_name: name of the model module
+    :param store_path: directory of the result store
+    :param start: index of the first run in the chunk
+    :param parameter_sets: parameter vectors for the chunk
+    :param initial: initial values of the model inputs
+    :param time_span: hours values [start, stop]
+    :param step: number of hours between samples in output
+    :param method: scipy.integrate.solve_ivp method to use
+    """
+    y = simulate_runs(model_name, parameter_sets, initial, time_span, step, method)
+    open_store(store_path).append(start, parameter_sets, y)
+
+
+def run_ensembles(requests: List[EnsembleRequest], step: float = 1, method: str = 'BDF',
+                  chunk_size: int = 64, jobs: Optional[int] = None) -> List[Union[np.ndarray, ResultStore]]:
+    """Simulate a set of (model x parameter sets) requests across a process pool
+
+    Each request is split into chunks of chunk_size runs, and the chunks of all requests are handed out
+    to the pool together so that no core sits idle between models. Workers write their trajectories into
+    a memory-mapped output array for each request, or append them to its result store as each chunk
+    finishes, so results are never pickled back to the parent. Chunks already in a result store from an
+    earlier run with the same parameter table and chunk size are not simulated again; a store holding runs
+    of any other table or chunk size is rejected with a ValueError.
+
+    :param requests: models and parameter sets to simulate
+    :param step: number of hours between samples in output
+    :param method: scipy.integrate.solve_ivp method to use
+    :param chunk_size: number of runs per worker task, each integrated as one batched system
+    :param jobs: number of worker processes; defaults to the number of CPUs
+    :return: n_runs x species x times array of trajectories, or the result store, for each request
+    """
+    # Outputs without an explicit file go to a scratch directory, in RAM where available
+    scratch = tempfile.mkdtemp(dir='/dev/shm' if os.path.isdir('/dev/shm') else None)
+    try:
+        # Create the output array of each request before starting any of the workers
+        paths = []
+        written = []
+        for k, request in enumerate(requests):
+            model = load_model(request.model)
+            time = np.arange(request.time_span[0], request.time_span[-1] + step / 2, step)
+            if request.store_path:
+                store = create_store(request.store_path, request.model, model.SPECIES, time, model.PARAMETERS)
+                # Only resume a store of the same parameter table and chunks, so that runs are never mixed
+                store.check_parameters(request.parameter_sets)
+                done = {(c.start, c.stop) for c in store.chunks()}
+                n_runs = len(request.parameter_sets)
+                if done - {(start, min(start + chunk_size, n_runs)) for start in range(0, n_runs, chunk_size)}:
+                    raise ValueError(f'Result store {store.path} was written with a chunk size other than {chunk_size}')
+                paths.append(store.path)
+                written.append(done)
+                continue
+            path = request.output_path or os.path.join(scratch, f'{k}-{request.model}.npy')
+            np.lib.format.open_memmap(path, mode='w+', dtype=float,
+                                      shape=(len(request.parameter_sets), len(model.SPECIES), len(time))).flush()
+            paths.append(path)
+            written.append(set())
+
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = [pool.submit(stream_chunk if request.store_path else simulate_chunk, request.model, path,
+                                   start, request.parameter_sets[start:start + chunk_size], request.initial,
+                                   request.time_span, step, method)
+                       for request, path, done in zip(requests, paths, written)
+                       for start in range(0, len(request.parameter_sets), chunk_size)
+                       if (start, min(start + chunk_size, len(request.parameter_sets))) not in done]
+            for future in futures:
+                future.result()  # re-raise any failure from the workers
+
+        # Outputs with explicit files stay on disk; scratch outputs are loaded into memory
+        return [open_store(path) if request.store_path
+                else np.load(path, mmap_mode='r') if request.output_path else np.load(path)
+                for request, path in zip(requests, paths)]
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+def log_normal_parameter_sets(model: ModuleType, parameters: Dict[str, float], perturbed_names: List[str],
+                              n_runs: int, random: bool, set_seed: bool) -> Tuple[np.ndarray, np.ndarray]:
+    """Generate parameter sets with one or more parameters perturbed on a log normal scale,
+    following logNormalPerturbation.m
+
+    :param model: model module whose parameter vectors are to be generated
+    :param parameters: dictionary of base parameter names and values
+    :param perturbed_names: names of the parameters to be perturbed
+    :param n_runs: number of perturbations to run
+    :param random: if true, perturb randomly on the log normal scale; otherwise use evenly spaced percentiles
+    :param set_seed: if true, use a fixed seed for the random number generator
+    :return: percentile of each run (NaN for random perturbations), n_runs x len(model.PARAMETERS) parameter sets
+    """
+    if random:
+        # One standard normal draw per run and perturbed parameter
+        normal = np.random.default_rng(0 if set_seed else None).standard_normal((n_runs, len(perturbed_names)))
+        percentiles = np.full(n_runs, np.nan)
+        stddev = 1.1
+    else:
+        # Lower and upper limit set to capture center 95%
+        percentiles = np.linspace(0.023, 0.977, n_runs)
+        normal = np.repeat(norm.ppf(percentiles)[:, np.newaxis], len(perturbed_names), axis=1)
+        stddev = 1.5
+
+    return percentiles, log_normal_values(model, parameters, perturbed_names, normal, stddev)
+
+
+def log_normal_perturbation(model: ModuleType, parameters: Dict[str, float], perturbed_names: List[str],
+                            n_runs: int, time_span: Sequence[float], initial: Dict[str, float],
+                            random: bool = True, set_seed: bool = False, output_path: Optional[str] = None,
+                            step: float = 1, method: str = 'BDF', chunk_size: int = 64,
+                            jobs: Optional[int] = None) -> EnsembleResults:
+    """Run a model over parameter sets perturbed on a log normal scale, spread across a process pool.
+    This takes the same inputs as logNormalPerturbation.m.
+
+    :param model: model module to be simulated
+    :param parameters: dictionary of base parameter names and values
+    :param perturbed_names: names of the parameters to be perturbed
+    :param n_runs: number of perturbations to run
+    :param time_span: hours values [start, stop]
+    :param initial: initial values of the model inputs
+    :param random: if true, perturb randomly on the log normal scale; otherwise use evenly spaced percentiles
+    :param set_seed: if true, use a fixed seed for the random number generator
+    :param output_path: .npy file to hold the trajectories, or None to return them in memory
+    :param step: number of hours between samples in output
+    :param method: scipy.integrate.solve_ivp method to use
+    :param chunk_size: number of runs per worker task
+    :param jobs: number of worker processes; defaults to the number of CPUs
+    :return: results of the runs
+    """
+    percentiles, parameter_sets = log_normal_parameter_sets(model, parameters, perturbed_names, n_runs,
+                                                            random, set_seed)
+    request = EnsembleRequest(model.__name__, parameter_sets, initial, time_span, output_path)
+    y, = run_ensembles([request], step, method, chunk_size, jobs)
+    time = np.arange(time_span[0], time_span[-1] + step / 2, step)
+    return EnsembleResults(time, model.SPECIES, percentiles, parameter_sets, y)
@@ -0,0 +1,237 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Iterable, Optional, Sequence
+
+import numpy as np
+from scipy.io import savemat
+
+from ensemble_runner import EnsembleRequest, simulate_runs
+from model_catalog import load_model
+from result_store import ResultStore
+
+DEFAULT_QUANTILES = (0.025, 0.25, 0.5, 0.75, 0.975)
+"""Quantiles giving the median and the 50% and 95% percentile bands"""
+DEFAULT_LOG_LEVEL_EDGES = np.linspace(4.6, 7.5, 51)
+"""Edges of the log10 level bins of the density histogram, matching the axis and 50 level bins of densityheatmap.m"""
+
+
+class EnsembleSummary:
+    """Summary of the trajectories of one species across an ensemble, updated as runs complete
+
+    Per sample time, this keeps the count, mean, variance, minimum, and maximum of the levels, a quantile sketch,
+    and a histogram over fixed log10 level bins, so that its size does not depend on the number of runs.
+    The quantile sketch counts the positive levels in logarithmic buckets (as in DDSketch), so that every
+    quantile it reports is within relative_accuracy of a level of the ensemble at that rank; levels that are
+    zero or negative (solver noise) count as zero. Summaries with the same settings can be merged, e.g., from
+    pool workers. Levels that are NaN are ignored.
+    """
+
+    def __init__(self, time: np.ndarray, relative_accuracy: float = 0.01,
+                 log_level_edges: np.ndarray = DEFAULT_LOG_LEVEL_EDGES):
+        """Create an empty summary
+
+        :param time: sample times (hours)
+        :param relative_accuracy: relative error bound of the quantiles
+        :param log_level_edges: edges of the log10 level bins of the histogram
+        """
+        self.time = np.asarray(time, dtype=float)
+        self.relative_accuracy = relative_accuracy
+        self.log_level_edges = np.asarray(log_level_edges, dtype=float)
+        n_times = len(self.time)
+        self.count = np.zeros(n_times, dtype=np.int64)
+        self.mean = np.zeros(n_times)
+        self._m2 = np.zeros(n_times)  # sum of squared deviations from the mean
+        self.minimum = np.full(n_times, np.inf)
+        self.maximum = np.full(n_times, -np.inf)
+        self.histogram = np.zeros((n_times, len(self.log_level_edges) - 1), dtype=np.int64)
+        """Number of runs in each log10 level bin at each sample time, times x bins"""
+        self.below = np.zeros(n_times, dtype=np.int64)
+        """Number of runs below the first level bin (including zero levels) at each sample time"""
+        self.above = np.zeros(n_times, dtype=np.int64)
+        """Number of runs above the last level bin at each sample time"""
+        self._log_gamma = np.log((1 + relative_accuracy) / (1 - relative_accuracy))
+        self._zeros = np.zeros(n_times, dtype=np.int64)  # levels at or below zero
+        self._offset = 0  # bucket index of the first column of _buckets
+        self._buckets = np.zeros((n_times, 0), dtype=np.int64)
+
+    def update(self, y: np.ndarray):
+        """Add the trajectories of a block of runs
+
+        :param y: levels of the species, runs x times
+        """
+        y = np.atleast_2d(np.asarray(y, dtype=float))
+        valid = ~np.isnan(y)
+        count = valid.sum(axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(count > 0, np.nansum(y, axis=0) / count, 0)
+            m2 = np.nansum((y - mean) ** 2, axis=0)
+        self._merge_moments(count, mean, m2)
+        if valid.any():
+            self.minimum = np.fmin(self.minimum, np.nanmin(np.where(valid, y, np.inf), axis=0))
+            self.maximum = np.fmax(self.maximum, np.nanmax(np.where(valid, y, -np.inf), axis=0))
+
+        positive = valid & (y > 0)
+        self._zeros += (valid & ~positive).sum(axis=0)
+        times = np.broadcast_to(np.arange(len(self.time)), y.shape)[positive]
+        log_levels = np.log(y[positive])
+        if len(log_levels):
+            self._add_buckets(times, np.ceil(log_levels / self._log_gamma).astype(np.int64))
+
+        # Histogram of log10 levels, with zero levels below every bin as in densityheatmap.m
+        log10_levels = log_levels / np.log(10)
+        bins = np.searchsorted(self.log_level_edges, log10_levels, side='right') - 1
+        n_bins = self.histogram.shape[1]
+        below = bins < 0
+        above = (bins >= n_bins) & (log10_levels > self.log_level_edges[-1])
+        bins[(bins == n_bins) & ~above] = n_bins - 1  # the last bin includes its upper edge
+        inside = ~below & ~above
+        self.histogram += np.bincount(times[inside] * n_bins + bins[inside],
+                                      minlength=self.histogram.size).reshape(self.histogram.shape)
+        self.below += np.bincount(times[below], minlength=len(self.time)) + (valid & ~positive).sum(axis=0)
+        self.above += np.bincount(times[above], minlength=len(self.time))
+
+    def merge(self, other: 'EnsembleSummary'):
+        """Add the runs of another summary with the same times and settings, e.g., from a pool worker"""
+        if (not np.array_equal(self.time, other.time) or self.relative_accuracy != other.relative_accuracy
+                or not np.array_equal(self.log_level_edges, other.log_level_edges)):
+            raise ValueError('Cannot merge summaries with different times, accuracy, or level bins')
+        self._merge_moments(other.count, other.mean, other._m2)
+        self.minimum = np.fmin(self.minimum, other.minimum)
+        self.maximum = np.fmax(self.maximum, other.maximum)
+        self.histogram += other.histogram
+        self.below += other.below
+        self.above += other.above
+        self._zeros += other._zeros
+        if other._buckets.shape[1]:
+            self._grow(other._offset, other._offset + other._buckets.shape[1] - 1)
+            start = other._offset - self._offset
+            self._buckets[:, start:start + other._buckets.shape[1]] += other._buckets
+
+    def _merge_moments(self, count: np.ndarray, mean: np.ndarray, m2: np.ndarray):
+        """Combine the moments of another set of runs into these (Chan et al.'s parallel algorithm)"""
+        total = self.count + count
+        with np.errstate(invalid='ignore', divide='ignore'):
+            delta = mean - self.mean
+            self.mean = np.where(total > 0, self.mean + delta * count / total, 0)
+            self._m2 = np.where(total > 0, self._m2 + m2 + delta ** 2 * self.count * count / total, 0)
+        self.count = total
+
+    def _grow(self, low: int, high: int):
+        """Extend the quantile buckets to cover the bucket indices from low to high"""
+        if not self._buckets.shape[1]:
+            self._offset = low
+            self._buckets = np.zeros((len(self.time), high - low + 1), dtype=np.int64)
+            return
+        before = max(0, self._offset - low)
+        after = max(0, high - (self._offset + self._buckets.shape[1] - 1))
+        if before or after:
+            self._buckets = np.pad(self._buckets, ((0, 0), (before, after)))
+            self._offset -= before
+
+    def _add_buckets(self, times: np.ndarray, indices: np.ndarray):
+        """Count levels into the quantile buckets of their sample times"""
+        self._grow(int(indices.min()), int(indices.max()))
+        width = self._buckets.shape[1]
+        self._buckets += np.bincount(times * width + (indices - self._offset),
+                                     minlength=self._buckets.size).reshape(self._buckets.shape)
+
+    def variance(self) -> np.ndarray:
+        """Get the sample variance of the levels at each sample time (NaN with fewer than 2 runs)"""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(self.count > 1, self._m2 / (self.count - 1), np.nan)
+
+    def quantiles(self, q: Sequence[float] = DEFAULT_QUANTILES) -> np.ndarray:
+        """Estimate quantiles of the levels at each sample time
+
+        :param q: quantiles to estimate, between 0 and 1
+        :return: len(q) x times levels, NaN at sample times without runs
+        """
+        cumulative = np.cumsum(self._buckets, axis=1)
+        gamma = np.exp(self._log_gamma)
+        result = np.full((len(q), len(self.time)), np.nan)
+        for k, quantile in enumerate(q):
+            rank = quantile * (self.count - 1)
+            positive_rank = rank - self._zeros
+            # First bucket holding more positive levels than the rank, for each sample time
+            bucket = (cumulative <= positive_rank[:, np.newaxis]).sum(axis=1)
+            estimate = 2 * gamma ** (self._offset + np.minimum(bucket, cumulative.shape[1] - 1)) / (gamma + 1)
+            result[k] = np.where(positive_rank < 0, 0, estimate)
+            result[k, self.count == 0] = np.nan
+        return result
+
+    def save(self, path: str, q: Sequence[float] = DEFAULT_QUANTILES):
+        """Save the summary as a .mat file for plotting in MATLAB (see summaryheatmap.m)
+
+        :param path: .mat file to write
+        :param q: quantiles to save
+        """
+        savemat(path, {'x': self.time, 'counts': self.count, 'means': self.mean, 'variances': self.variance(),
+                       'minimums': self.minimum, 'maximums': self.maximum, 'quantileLevels': np.asarray(q),
+                       'quantiles': self.quantiles(q), 'logLevelEdges': self.log_level_edges,
+                       'histogram': self.histogram, 'below': self.below, 'above': self.above})
+
+
+def summarize_store(store: ResultStore, species: str, **options) -> EnsembleSummary:
+    """Summarize one species of a result store, reading one chunk at a time
+
+    :param store: result store to summarize
+    :param species: name of the species
+    :param options: settings of the summary (see EnsembleSummary)
+    :return: summary of all runs in the store
+    """
+    summary = EnsembleSummary(store.time, **options)
+    for _, levels in store.iter_chunks(species):
+        summary.update(levels)
+    return summary
+
+
+def summarize_chunk(model_name: str, parameter_sets: np.ndarray, initial: Dict[str, float],
+                    time_span: Sequence[float], species: Iterable[str], step: float, method: str,
+                    options: Dict) -> Dict[str, EnsembleSummary]:
+    """Pool worker: simulate a chunk of parameter sets and return only the summaries of the species
+
+    :param model_name: name of the model module
+    :param parameter_sets: parameter vectors for the chunk
+    :param initial: initial values of the model inputs
+    :param time_span: hours values [start, stop]
+    :param species: names of the species to summarize
+    :param step: number of hours between samples in output
+    :param method: scipy.integrate.solve_ivp method to use
+    :param options: settings of the summaries
+    :return: summary of each species over the chunk
+    """
+    model = load_model(model_name)
+    y = simulate_runs(model_name, parameter_sets, initial, time_span, step, method)
+    time = np.arange(time_span[0], time_span[-1] + step / 2, step)
+    summaries = {}
+    for name in species:
+        summaries[name] = EnsembleSummary(time, **options)
+        summaries[name].update(y[:, model.SPECIES.index(name), :])
+    return summaries
+
+
+def summarize_ensemble(request: EnsembleRequest, species: Sequence[str], step: float = 1, method: str = 'BDF',
+                       chunk_size: int = 64, jobs: Optional[int] = None, **options) -> Dict[str, EnsembleSummary]:
+    """Simulate an ensemble across a process pool, keeping only summaries of its trajectories
+
+    Each worker returns the summaries of its chunk, which are merged as they complete, so memory does not
+    grow with the number of runs and no trajectories are written.
+
+    :param request: model and parameter sets to simulate; its output and store paths are not used
+    :param species: names of the species to summarize
+    :param step: number of hours between samples in output
+    :param method: scipy.integrate.solve_ivp method to use
+    :param chunk_size: number of runs per worker task
+    :param jobs: number of worker processes; defaults to the number of CPUs
+    :param options: settings of the summaries (see EnsembleSummary)
+    :return: summary of each species over all runs
+    """
+    time = np.arange(request.time_span[0], request.time_span[-1] + step / 2, step)
+    summaries = {name: EnsembleSummary(time, **options) for name in species}
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(summarize_chunk, request.model, request.parameter_sets[start:start + chunk_size],
+                               request.initial, request.time_span, species, step, method, options)
+                   for start in range(0, len(request.parameter_sets), chunk_size)]
+        for future in as_completed(futures):
+            for name, summary in future.result().items():
+                summaries[name].merge(summary)
+    return summaries
@@ -0,0 +1,58 @@
+# local_sensitivity
+# Compute the local sensitivity of GFP to every parameter for all of the models, each from one solve of the model
+# together with its forward sensitivity equations, in place of one-at-a-time parameter scans. The models must be
+# generated with their sensitivity equations:
+#
+#     python sbol/sbol_to_python.py --sensitivities
+import csv
+import os
+from types import ModuleType
+from typing import Dict, Sequence
+
+import numpy as np
+
+from base_parameters import base_parameters
+from model_catalog import MODEL_MODULE, MODEL_NAME, load_model, models
+
+
+def log_sensitivities(model: ModuleType, parameters: Dict[str, float], initial: Dict[str, float],
+                      time_span: Sequence[float], step: float = 1) -> np.ndarray:
+    """Compute the sensitivity of the log level of each output to the log of each parameter, over time
+
+    :param model: model module generated with its sensitivity equations
+    :param parameters: dictionary of parameter names and values
+    :param initial: initial values of the model inputs
+    :param time_span: hours values [start, stop]
+    :param step: number of hours between samples in output
+    :return: outputs x parameters x times sensitivities d(log level)/d(log parameter), in the order of
+        model.OUTPUTS and model.PARAMETERS (NaN or infinite where a level is zero, e.g., at the start)
+    """
+    if not hasattr(model, 'simulate_sensitivities'):
+        raise RuntimeError(f'{model.__name__} has no sensitivity equations: regenerate it with '
+                           f'sbol/sbol_to_python.py --sensitivities')
+    _, _, y_out, _, sensitivities = model.simulate_sensitivities(time_span, parameters, initial, step)
+    p = model.pack_parameters(parameters)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return sensitivities[model.OUTPUT_INDICES] * p[np.newaxis, :, np.newaxis] / y_out[:, np.newaxis, :]
+
+
+if __name__ == '__main__':
+    # Load the parameters, and set the initial values and timespan to match random_exploration.py
+    parameters = base_parameters()
+    initial = {'V1': 10, 'V2': 3}
+    time_span = [0, 100]
+
+    # Write one row per model, with the sensitivity of the final GFP level to each parameter (blank where a
+    # model does not use the parameter)
+    results_path = './local-sensitivity-results/'
+    os.makedirs(results_path, exist_ok=True)
+    parameter_names = sorted(parameters)
+    with open(os.path.join(results_path, 'local-sensitivity-GFP.csv'), 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['model'] + parameter_names)
+        for model_info in models:
+            model = load_model(model_info[MODEL_MODULE])
+            final = log_sensitivities(model, parameters, initial, time_span)[model.OUTPUTS.index('GFP'), :, -1]
+            by_name = dict(zip(model.PARAMETERS, final))
+            writer.writerow([model_info[MODEL_NAME]] + [by_name.get(name, '') for name in parameter_names])
+            print(f'Computed the sensitivities of {model_info[MODEL_NAME]}')
@@ -0,0 +1,49 @@
+# This file is a list of all models in the order that we'd like to explore and plot them
+# (the Python counterpart of model_catalog.m)
+import importlib
+import os
+import sys
+from types import ModuleType
+
+MODELS_DIRECTORY = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'models'))
+"""Directory holding the generated Python models"""
+
+# Each row is: (name, module, perturbed parameters)
+models = [
+    ('Base Expression (No Regulation)', 'No_gRNA_control', []),
+    ('Single gRNA Repressor', 'Single_gRNA_repression', ['alpha_r_gRNA1']),
+    ('2 Heterogeneous Target Sites', 'Multiplexed_2_gRNA_Repression', ['alpha_r_gRNA1', 'alpha_r_gRNA2']),
+    ('3 Heterogeneous Target Sites', 'Multiplexed_3_gRNA_Repression', ['alpha_r_gRNA1', 'alpha_r_gRNA2', 'alpha_r_gRNA3']),
+    ('4 Heterogeneous Target Sites', 'Multiplexed_4_gRNA_Repression',
+     ['alpha_r_gRNA1', 'alpha_r_gRNA2', 'alpha_r_gRNA3', 'alpha_r_gRNA4']),
+    ('5 Heterogeneous Target Sites', 'Multiplexed_5_gRNA_Repression',
+     ['alpha_r_gRNA1', 'alpha_r_gRNA2', 'alpha_r_gRNA3', 'alpha_r_gRNA4', 'alpha_r_gRNA5']),
+    ('6 Heterogeneous Target Sites', 'Multiplexed_6_gRNA_Repression',
+     ['alpha_r_gRNA1', 'alpha_r_gRNA2', 'alpha_r_gRNA3', 'alpha_r_gRNA4', 'alpha_r_gRNA5', 'alpha_r_gRNA6']),
+    ('2 Identical Target Sites', 'Multisite_2_gRNA_Repression', ['alpha_r_gRNA1']),
+    ('3 Identical Target Sites', 'Multisite_3_gRNA_Repression', ['alpha_r_gRNA1']),
+    ('4 Identical Target Sites', 'Multisite_4_gRNA_Repression', ['alpha_r_gRNA1']),
+    ('5 Identical Target Sites', 'Multisite_5_gRNA_Repression', ['alpha_r_gRNA1']),
+    ('6 Identical Target Sites', 'Multisite_6_gRNA_Repression', ['alpha_r_gRNA1']),
+]
+n_models = len(models)
+
+MODEL_NAME = 0
+MODEL_MODULE = 1
+MODEL_PARAMS = 2
+
+
+def load_model(module_name: str) -> ModuleType:
+    """Import a generated Python model by name
+
+    :param module_name: name of the model module (i.e., the display_id of its SBOL component)
+    :return: model module
+    """
+    if MODELS_DIRECTORY not in sys.path:
+        sys.path.append(MODELS_DIRECTORY)
+    return importlib.import_module(module_name)
+
+
+def clean_model_name(model_name: str) -> str:
+    """Clean up a model name for use in directory and file names"""
+    return model_name.replace('\\rightarrow ', '').replace(' ', '_').replace('/', '-')
@@ -0,0 +1,167 @@
+# parameter_sampler
+# Draw the log normal perturbations of an ensemble up front as a table of parameter sets, e.g.:
+#
+#     python parameter_sampler.py Multisite_4_gRNA_Repression 1024 --method sobol --seed 7 --output sobol.npy
+#
+# Every run is a function of the sampling method, the seed, the number of runs, and its index alone, so a
+# block of runs can be drawn by any worker, and any single run can be reproduced without drawing the others.
+import argparse
+import json
+import os
+import warnings
+from types import ModuleType
+from typing import Dict, List, Optional
+
+import numpy as np
+from scipy.stats import norm, qmc
+
+SAMPLING_METHODS = ['random', 'sobol', 'latin-hypercube']
+"""Ways of drawing the points of the unit hypercube that are mapped to log normal perturbations"""
+_STREAMS = {'random': 0, 'sobol': 1, 'latin-hypercube': 2, 'latin-hypercube-jitter': 3}
+"""Second word of the key (or seed) for each use of random numbers, so that their streams never overlap"""
+
+
+def _counter_uniforms(seed: int, stream: int, n_dims: int, start: int, stop: int) -> np.ndarray:
+    """Draw uniforms from a counter-based stream, with the counter of each row set by its run index
+
+    :return: (stop - start) x n_dims uniforms, strictly between 0 and 1
+    """
+    words = -(-n_dims // 4) * 4  # Philox makes blocks of 4 words, so each run starts on a block of its own
+    generator = np.random.Philox(key=[seed, stream])
+    generator.advance(start * words // 4)
+    raw = generator.random_raw((stop - start) * words).reshape(stop - start, words)[:, :n_dims]
+    return ((raw >> np.uint64(11)) + 0.5) / 2.0 ** 53
+
+
+def uniform_samples(method: str, n_runs: int, n_dims: int, seed: int, start: int = 0,
+                    stop: Optional[int] = None) -> np.ndarray:
+    """Draw a block of the points of a sample of the unit hypercube
+
+    Random points come from a Philox stream keyed by the seed, with each run at its own counter. Sobol points
+    are scrambled by the seed and skipped ahead to the start of the block; they are best balanced when n_runs
+    is a power of 2. Latin hypercube points put each run in its own stratum of every dimension, with the strata
+    permuted by the seed; each block regenerates the permutations, which takes time linear in n_runs.
+
+    :param method: one of SAMPLING_METHODS
+    :param n_runs: number of runs in the whole sample
+    :param n_dims: number of dimensions
+    :param seed: seed of the sample
+    :param start: index of the first run of the block
+    :param stop: index after the last run of the block; defaults to n_runs
+    :return: (stop - start) x n_dims points, strictly between 0 and 1
+    """
+    stop = n_runs if stop is None else stop
+    if not 0 <= start <= stop <= n_runs:
+        raise ValueError(f'Cannot draw runs {start} to {stop} of a sample of {n_runs}')
+    if method == 'random':
+        return _counter_uniforms(seed, _STREAMS['random'], n_dims, start, stop)
+    elif method == 'sobol':
+        sampler = qmc.Sobol(n_dims, scramble=True, seed=np.random.default_rng([seed, _STREAMS['sobol']]))
+        if start:
+            sampler.fast_forward(start)
+        with warnings.catch_warnings():
+            warnings.filterwarnings('ignore', message='The balance properties of Sobol')
+            points = sampler.random(stop - start)
+        return np.clip(points, 2.0 ** -54, 1 - 2.0 ** -54)
+    elif method == 'latin-hypercube':
+        generator = np.random.default_rng([seed, _STREAMS['latin-hypercube']])
+        strata = np.stack([generator.permutation(n_runs)[start:stop] for _ in range(n_dims)], axis=1)
+        jitter = _counter_uniforms(seed, _STREAMS['latin-hypercube-jitter'], n_dims, start, stop)
+        return (strata + jitter) / n_runs
+    raise ValueError(f'Unknown sampling method {method}, expected one of {SAMPLING_METHODS}')
+
+
+def log_normal_values(model: ModuleType, parameters: Dict[str, float], perturbed_names: List[str],
+                      normal: np.ndarray, stddev: float) -> np.ndarray:
+    """Make parameter sets with parameters perturbed on a log normal scale by standard normal draws
+
+    :param model: model module whose parameter vectors are to be made
+    :param parameters: dictionary of base parameter names and values
+    :param perturbed_names: names of the parameters to be perturbed
+    :param normal: standard normal draws, runs x len(perturbed_names)
+    :param stddev: standard deviation of the perturbations, as a factor of the base value
+    :return: runs x len(model.PARAMETERS) parameter sets
+    """
+    parameter_sets = np.tile(model.pack_parameters(parameters), (len(normal), 1))
+    for k, name in enumerate(perturbed_names):
+        # Parameters that the model does not use are not perturbed
+        if name in model.PARAMETERS:
+            column = model.PARAMETERS.index(name)
+            parameter_sets[:, column] = 10 ** (normal[:, k] * np.log10(stddev) + np.log10(parameters[name]))
+    return parameter_sets
+
+
+def parameter_set(model: ModuleType, parameters: Dict[str, float], perturbed_names: List[str], n_runs: int,
+                  index: int, method: str = 'sobol', seed: int = 0, stddev: float = 1.1) -> np.ndarray:
+    """Reproduce the parameter set of one run of a sample without drawing the others
+
+    :param model: model module whose parameter vector is to be made
+    :param parameters: dictionary of base parameter names and values
+    :param perturbed_names: names of the parameters to be perturbed
+    :param n_runs: number of runs in the whole sample
+    :param index: index of the run
+    :param method: one of SAMPLING_METHODS
+    :param seed: seed of the sample
+    :param stddev: standard deviation of the perturbations, as a factor of the base value
+    :return: parameter vector of the run
+    """
+    normal = norm.ppf(uniform_samples(method, n_runs, len(perturbed_names), seed, index, index + 1))
+    return log_normal_values(model, parameters, perturbed_names, normal, stddev)[0]
+
+
+def sample_parameter_sets(model: ModuleType, parameters: Dict[str, float], perturbed_names: List[str],
+                          n_runs: int, method: str = 'sobol', seed: int = 0, stddev: float = 1.1,
+                          output_path: Optional[str] = None, block_size: int = 65536) -> np.ndarray:
+    """Draw the parameter sets of all runs of an ensemble, perturbed on a log normal scale
+
+    The sample is drawn in blocks of runs, so that a table written to output_path never has to fit in memory.
+    The settings of the sample are written beside the table as JSON, so that any run can be reproduced with
+    parameter_set.
+
+    :param model: model module whose parameter vectors are to be made
+    :param parameters: dictionary of base parameter names and values
+    :param perturbed_names: names of the parameters to be perturbed
+    :param n_runs: number of runs
+    :param method: one of SAMPLING_METHODS
+    :param seed: seed of the sample
+    :param stddev: standard deviation of the perturbations, as a factor of the base value
+    :param output_path: .npy file to hold the table, or None to return it in memory
+    :param block_size: number of runs drawn at a time
+    :return: n_runs x len(model.PARAMETERS) parameter sets (memory-mapped if written to an output file)
+    """
+    shape = (n_runs, len(model.PARAMETERS))
+    if output_path:
+        table = np.lib.format.open_memmap(output_path, mode='w+', dtype=float, shape=shape)
+        with open(os.path.splitext(output_path)[0] + '.json', 'w') as f:
+            json.dump({'model': model.__name__, 'parameter_names': model.PARAMETERS,
+                       'perturbed_names': list(perturbed_names), 'n_runs': n_runs, 'method': method, 'seed': seed,
+                       'stddev': stddev}, f, indent=2)
+            f.write('\n')
+    else:
+        table = np.empty(shape)
+    for start in range(0, n_runs, block_size):
+        stop = min(start + block_size, n_runs)
+        normal = norm.ppf(uniform_samples(method, n_runs, len(perturbed_names), seed, start, stop))
+        table[start:stop] = log_normal_values(model, parameters, perturbed_names, normal, stddev)
+    if output_path:
+        table.flush()
+        return np.load(output_path, mmap_mode='r')
+    return table
+
+
+if __name__ == '__main__':
+    from base_parameters import base_parameters
+    from model_catalog import load_model
+
+    parser = argparse.ArgumentParser(description='Draw log normal perturbations of every parameter of a model')
+    parser.add_argument('model', help='Name of the model module')
+    parser.add_argument('runs', type=int, help='Number of runs')
+    parser.add_argument('--method', choices=SAMPLING_METHODS, default='sobol', help='Sampling method')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the sample')
+    parser.add_argument('--stddev', type=float, default=1.1, help='Standard deviation, as a factor of the base value')
+    parser.add_argument('--output', required=True, help='.npy file to write the table to')
+    args = parser.parse_args()
+    base = base_parameters()
+    sample_parameter_sets(load_model(args.model), base, sorted(base), args.runs, args.method, args.seed, args.stddev,
+                          args.output)
+    print(f'Wrote {args.runs} {args.method} parameter sets of {args.model} to {args.output}')
@@ -0,0 +1,48 @@
+# random_exploration
+# Generate results of 10000 random perturbations of every parameter for all of the models (the Python
+# counterpart of random_exploration.m), with the runs of all models spread across every core and streamed into
+# a result store per model as they finish (see result_store.py)
+import os
+
+from base_parameters import base_parameters
+from ensemble_runner import EnsembleRequest, run_ensembles
+from ensemble_summary import summarize_store
+from model_catalog import MODEL_MODULE, MODEL_NAME, clean_model_name, load_model, models
+from parameter_sampler import sample_parameter_sets
+
+if __name__ == '__main__':
+    # Load the parameters, and get all of their names because we want to perturb every parameter
+    parameters = base_parameters()
+    parameter_names = sorted(parameters)
+
+    # Set the initial values, timespan, and number of runs
+    initial = {'V1': 10, 'V2': 3}
+    time_span = [0, 100]
+    n_runs = 10000
+
+    # Set how the perturbations are drawn; each model gets its own seed, so that every run can be reproduced
+    # from the model and its index (see parameter_sampler.py)
+    sampling_method = 'random'
+
+    # Set the output path
+    results_path = './random-perturbation-results/'
+
+    # Generate the perturbed parameters for every model
+    requests = []
+    for seed, model_info in enumerate(models):
+        model = load_model(model_info[MODEL_MODULE])
+        outpath = os.path.join(results_path, clean_model_name(model_info[MODEL_NAME]))
+        os.makedirs(outpath, exist_ok=True)
+        parameter_sets = sample_parameter_sets(model, parameters, parameter_names, n_runs, sampling_method, seed,
+                                               output_path=os.path.join(outpath, 'random-perturb-parameters.npy'))
+        requests.append(EnsembleRequest(model_info[MODEL_MODULE], parameter_sets, initial, time_span,
+                                        store_path=os.path.join(outpath, 'random-perturb-all')))
+
+    # Do the perturbations, writing the trajectories and parameters of each model into its own store
+    print(f'Running {n_runs} perturbations for {len(requests)} models')
+    stores = run_ensembles(requests)
+
+    # Summarize the GFP trajectories of each model for plotting (see summaryheatmap.m), one chunk at a time
+    for request, store in zip(requests, stores):
+        summarize_store(store, 'GFP').save(os.path.join(os.path.dirname(request.store_path),
+                                                        'random-perturb-summary.mat'))
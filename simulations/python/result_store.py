@@ -0,0 +1,183 @@
+import glob
+import json
+import os
+import tempfile
+from typing import Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+STORE_VERSION = 1
+"""Version of the layout of result stores, recorded in their metadata"""
+METADATA_FILE = 'metadata.json'
+CHUNK_DIRECTORY = 'chunks'
+
+
+class Chunk(NamedTuple):
+    """Block of consecutive runs in a result store, written together by one worker"""
+    start: int
+    """Index of the first run"""
+    stop: int
+    """Index after the last run"""
+    path: str
+    """Compressed .npz file holding the runs"""
+
+
+class ResultStore(NamedTuple):
+    """Append-only directory of ensemble trajectories, written in compressed chunks of runs as they finish
+
+    The directory holds metadata.json, with the model, species, sample times, and parameter names, and a
+    chunks/ directory with one .npz file per block of runs. Each chunk holds the run indices, the parameter
+    table of its runs (runs x parameters), and one runs x times dataset per species, so that a reader can
+    load one species of a range of runs without decompressing the rest.
+    """
+    path: str
+    """Directory of the store"""
+    model: str
+    """Name of the model module that was simulated"""
+    species: List[str]
+    """Names of the species, each stored as its own dataset"""
+    time: np.ndarray
+    """Sample times (hours)"""
+    parameter_names: List[str]
+    """Names of the columns of the parameter table"""
+
+    def chunks(self) -> List[Chunk]:
+        """Get the chunks written so far, ordered by their first run"""
+        chunks = []
+        for path in glob.glob(os.path.join(self.path, CHUNK_DIRECTORY, 'runs-*.npz')):
+            start, stop = os.path.basename(path)[len('runs-'):-len('.npz')].split('-')
+            chunks.append(Chunk(int(start), int(stop), path))
+        return sorted(chunks)
+
+    def n_runs(self) -> int:
+        """Count the runs written so far"""
+        return sum(c.stop - c.start for c in self.chunks())
+
+    def append(self, start: int, parameter_sets: np.ndarray, y: np.ndarray):
+        """Write a block of finished runs as a new chunk; safe to call from several processes at once
+
+        :param start: index of the first run of the block
+        :param parameter_sets: parameter vectors of the runs, runs x len(parameter_names)
+        :param y: levels of all species, runs x species x times
+        """
+        if y.shape[1:] != (len(self.species), len(self.time)) or len(parameter_sets) != len(y):
+            raise ValueError(f'Expected runs x {len(self.species)} species x {len(self.time)} times with a '
+                             f'parameter set per run, but got {y.shape} and {np.shape(parameter_sets)}')
+        stop = start + len(y)
+        datasets = {_dataset(k): y[:, k, :] for k in range(len(self.species))}
+        directory = os.path.join(self.path, CHUNK_DIRECTORY)
+        # Write to a temporary file first, so that readers never see a partial chunk
+        handle, temporary = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(handle, 'wb') as f:
+            np.savez_compressed(f, runs=np.arange(start, stop), parameters=parameter_sets, **datasets)
+        os.replace(temporary, os.path.join(directory, f'runs-{start:09d}-{stop:09d}.npz'))
+
+    def check_parameters(self, parameter_sets: np.ndarray):
+        """Check that the runs written so far are runs of a parameter table, so that the rest of it can be appended
+
+        :param parameter_sets: parameter table of all runs, runs x len(parameter_names)
+        :raises ValueError: if a chunk holds runs beyond the end of the table or with other parameter values
+        """
+        for chunk in self.chunks():
+            with np.load(chunk.path) as data:
+                stored = data['parameters']
+            if chunk.stop > len(parameter_sets) or not np.array_equal(stored, parameter_sets[chunk.start:chunk.stop]):
+                raise ValueError(f'Result store {self.path} already holds runs {chunk.start} to {chunk.stop} '
+                                 f'of a different parameter table')
+
+    def iter_chunks(self, species: str, start: int = 0,
+                    stop: Optional[int] = None) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """Read one species chunk by chunk, holding only one chunk in memory at a time
+
+        :param species: name of the species
+        :param start: index of the first run to read
+        :param stop: index after the last run to read; defaults to all runs
+        :return: iterator of the run indices and the runs x times levels of each chunk
+        """
+        dataset = _dataset(self.species.index(species))
+        for chunk in self.chunks():
+            if chunk.stop <= start or (stop is not None and chunk.start >= stop):
+                continue
+            with np.load(chunk.path) as data:
+                runs = data['runs']
+                keep = (runs >= start) & (runs < (chunk.stop if stop is None else stop))
+                yield runs[keep], data[dataset][keep]
+
+    def read(self, species: str, start: int = 0, stop: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Read the levels of one species over a range of runs, loading only the chunks in the range
+
+        :param species: name of the species
+        :param start: index of the first run to read
+        :param stop: index after the last run to read; defaults to all runs
+        :return: indices of the runs written in the range, and their runs x times levels
+        """
+        return _concatenate(list(self.iter_chunks(species, start, stop)), len(self.time))
+
+    def parameters(self, start: int = 0, stop: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Read the parameter table over a range of runs
+
+        :param start: index of the first run to read
+        :param stop: index after the last run to read; defaults to all runs
+        :return: indices of the runs written in the range, and their runs x parameters values
+        """
+        blocks = []
+        for chunk in self.chunks():
+            if chunk.stop <= start or (stop is not None and chunk.start >= stop):
+                continue
+            with np.load(chunk.path) as data:
+                runs = data['runs']
+                keep = (runs >= start) & (runs < (chunk.stop if stop is None else stop))
+                blocks.append((runs[keep], data['parameters'][keep]))
+        return _concatenate(blocks, len(self.parameter_names))
+
+
+def _dataset(index: int) -> str:
+    """Name of the dataset of a species within a chunk, by its index in the species list"""
+    return f'species_{index}'
+
+
+def _concatenate(blocks: List[Tuple[np.ndarray, np.ndarray]], width: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Join the (runs, values) blocks of several chunks"""
+    if not blocks:
+        return np.empty(0, dtype=int), np.empty((0, width))
+    return np.concatenate([runs for runs, _ in blocks]), np.concatenate([values for _, values in blocks])
+
+
+def create_store(path: str, model: str, species: Sequence[str], time: np.ndarray,
+                 parameter_names: Sequence[str]) -> ResultStore:
+    """Create a result store, or open an existing one with the same layout so that more runs can be appended
+
+    :param path: directory of the store
+    :param model: name of the model module
+    :param species: names of the species
+    :param time: sample times (hours)
+    :param parameter_names: names of the columns of the parameter table
+    :return: store
+    """
+    metadata = {'version': STORE_VERSION, 'model': model, 'species': list(species),
+                'time': [float(t) for t in time], 'parameter_names': list(parameter_names)}
+    metadata_path = os.path.join(path, METADATA_FILE)
+    if os.path.exists(metadata_path):
+        with open(metadata_path) as f:
+            if json.load(f) != metadata:
+                raise ValueError(f'Result store {path} already holds runs of a different model, species, or times')
+    else:
+        os.makedirs(os.path.join(path, CHUNK_DIRECTORY), exist_ok=True)
+        with open(metadata_path, 'w') as f:
+            json.dump(metadata, f, indent=2)
+            f.write('\n')
+    return open_store(path)
+
+
+def open_store(path: str) -> ResultStore:
+    """Open an existing result store for reading or appending
+
+    :param path: directory of the store
+    :return: store
+    """
+    with open(os.path.join(path, METADATA_FILE)) as f:
+        metadata = json.load(f)
+    if metadata.get('version') != STORE_VERSION:
+        raise ValueError(f'Result store {path} has version {metadata.get("version")}, expected {STORE_VERSION}')
+    return ResultStore(path, metadata['model'], metadata['species'], np.array(metadata['time']),
+                       metadata['parameter_names'])
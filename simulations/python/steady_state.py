@@ -0,0 +1,164 @@
+from types import ModuleType
+from typing import Dict, NamedTuple, Optional, Tuple
+
+import numpy as np
+from scipy.integrate import solve_ivp
+
+
+class SteadyState(NamedTuple):
+    """Fixed point of a model, as found by find_steady_state"""
+    x: np.ndarray
+    """Levels of all species, in the order of model.SPECIES"""
+    converged: bool
+    """True if the fixed point was found to within tolerance"""
+    iterations: int
+    """Number of Newton iterations taken, including those after any fallback integration"""
+    integrated: bool
+    """True if Newton failed from the initial guess and time integration was needed"""
+
+
+def held_system(model: ModuleType, p: np.ndarray, hold_inputs: bool):
+    """Get the indices of the free species and a right-hand side that holds the others fixed
+
+    :param model: model module
+    :param p: parameter vector
+    :param hold_inputs: if true, the input species are held fixed
+    :return: indices of the free species, right-hand side function with the held species fixed
+    """
+    held = [model.SPECIES.index(v) for v in model.INPUTS] if hold_inputs else []
+    free = np.array([i for i in range(len(model.SPECIES)) if i not in held], dtype=int)
+
+    def held_rhs(t, x):
+        dx = model.rhs(t, x, p)
+        dx[held] = 0
+        return dx
+    return free, held_rhs
+
+
+def newton(model: ModuleType, p: np.ndarray, x: np.ndarray, free: np.ndarray, max_iterations: int,
+           rtol: float, atol: float) -> Tuple[np.ndarray, bool, int]:
+    """Damped Newton iteration on the free species of a model, keeping all levels non-negative
+
+    :param model: model module
+    :param p: parameter vector
+    :param x: starting state vector
+    :param free: indices of the species to solve for
+    :param max_iterations: maximum number of Newton iterations
+    :param rtol: relative tolerance on the Newton step
+    :param atol: absolute tolerance on the Newton step
+    :return: final state, whether it converged, number of iterations taken
+    """
+    x = x.copy()
+    residual = model.rhs(0, x, p)[free]
+    for iteration in range(1, max_iterations + 1):
+        jacobian = model.jacobian(0, x, p).toarray()[np.ix_(free, free)]
+        try:
+            step = np.linalg.solve(jacobian, -residual)
+        except np.linalg.LinAlgError:
+            return x, False, iteration
+        # A Newton step within tolerance means that x is already at the fixed point
+        if np.all(np.abs(step) <= rtol * np.abs(x[free]) + atol):
+            return x, True, iteration
+        # Halve the step until the residual decreases
+        norm = np.linalg.norm(residual)
+        damping = 1.0
+        while damping > 1e-4:
+            candidate = x.copy()
+            candidate[free] = np.maximum(0, x[free] + damping * step)
+            candidate_residual = model.rhs(0, candidate, p)[free]
+            if np.linalg.norm(candidate_residual) < norm:
+                break
+            damping /= 2
+        else:
+            return x, False, iteration
+        x, residual = candidate, candidate_residual
+    return x, False, max_iterations
+
+
+def find_steady_state(model: ModuleType, parameters: Dict[str, float], initial: Dict[str, float],
+                      hold_inputs: bool = True, initial_guess: Optional[np.ndarray] = None,
+                      max_iterations: int = 50, rtol: float = 1e-8, atol: float = 1e-6,
+                      fallback_time: float = 1000) -> SteadyState:
+    """Find the fixed point of a model directly with damped Newton on its generated RHS and Jacobian,
+    falling back to time integration only if Newton fails
+
+    In the generated models the vectors are diluted like every other species, so the only fixed point
+    of the full system has all species at zero. By default the inputs (e.g., V1 and V2) are therefore held
+    at their initial values, which gives the steady state for a fixed vector dose.
+
+    :param model: model module
+    :param parameters: dictionary of parameter names and values
+    :param initial: initial values of the model inputs
+    :param hold_inputs: if true, hold the input species at their initial values
+    :param initial_guess: starting state vector for Newton; defaults to the initial state
+    :param max_iterations: maximum number of Newton iterations per attempt
+    :param rtol: relative tolerance on the Newton step
+    :param atol: absolute tolerance on the Newton step
+    :param fallback_time: hours to integrate before trying Newton again, if the first attempt fails
+    :return: steady state
+    """
+    p = model.pack_parameters(parameters)
+    x0 = model.pack_initial(initial)
+    if initial_guess is not None:
+        guess = np.array(initial_guess, dtype=float)
+        # Inputs are held at their initial values rather than their guessed values
+        inputs = [model.SPECIES.index(v) for v in model.INPUTS]
+        guess[inputs] = x0[inputs]
+        x0 = guess
+    free, held_rhs = held_system(model, p, hold_inputs)
+
+    x, converged, iterations = newton(model, p, x0, free, max_iterations, rtol, atol)
+    if converged:
+        return SteadyState(x, True, iterations, False)
+
+    # Newton failed: integrate toward the fixed point, then polish the result with Newton
+    solution = solve_ivp(held_rhs, (0, fallback_time), x0, method='BDF',
+                         jac=lambda t, x: held_jacobian(model, p, x, free))
+    x = solution.y[:, -1]
+    x, converged, more_iterations = newton(model, p, x, free, max_iterations, rtol, atol)
+    return SteadyState(x, converged, iterations + more_iterations, True)
+
+
+def held_jacobian(model: ModuleType, p: np.ndarray, x: np.ndarray, free: np.ndarray) -> np.ndarray:
+    """Jacobian of a model with all but the free species held fixed
+
+    :param model: model module
+    :param p: parameter vector
+    :param x: state vector
+    :param free: indices of the free species
+    :return: dense Jacobian, with zero rows for the held species
+    """
+    jacobian = np.zeros((len(model.SPECIES), len(model.SPECIES)))
+    jacobian[free, :] = model.jacobian(0, x, p).toarray()[free, :]
+    return jacobian
+
+
+def steady_state_outputs(model: ModuleType, parameters: Dict[str, float], initial: Dict[str, float],
+                         **kwargs) -> np.ndarray:
+    """Get the levels of the model outputs (e.g., GFP) at steady state
+
+    :param model: model module
+    :param parameters: dictionary of parameter names and values
+    :param initial: initial values of the model inputs
+    :param kwargs: additional arguments for find_steady_state
+    :return: output levels, in the order of model.OUTPUTS
+    """
+    state = find_steady_state(model, parameters, initial, **kwargs)
+    if not state.converged:
+        raise RuntimeError(f'Could not find steady state of {model.__name__}')
+    return state.x[model.OUTPUT_INDICES]
+
+
+def fold_repression(model: ModuleType, parameters: Dict[str, float], initial_off: Dict[str, float],
+                    initial_on: Dict[str, float], **kwargs) -> np.ndarray:
+    """Compute the steady-state fold repression of the outputs, i.e. the ratio of gRNA off to gRNA on
+
+    :param model: model module
+    :param parameters: dictionary of parameter names and values
+    :param initial_off: initial values of the model inputs with the gRNA off (e.g., V1 = 0)
+    :param initial_on: initial values of the model inputs with the gRNA on
+    :param kwargs: additional arguments for find_steady_state
+    :return: fold repression of each output, in the order of model.OUTPUTS
+    """
+    return (steady_state_outputs(model, parameters, initial_off, **kwargs)
+            / steady_state_outputs(model, parameters, initial_on, **kwargs))
@@ -1,4 +1,6 @@
 % This file generates paper compares of all circuits with basal parameters
+% (the simulations are reused from the result cache when already computed,
+% see cachedSimulation.m)
 
 base_parameters;
 base_interference_matrix;
@@ -18,7 +20,7 @@ y_complete = cell(n_models,1);
 fprintf('Simulating with base parameters');
 for i=1:n_models
     try
-        [time_interval, species_names{i}, y_out(i,:), y_complete{i}] = models{i,MODEL_FUN}(time,parameters,initial,1);
+        [time_interval, species_names{i}, y_out(i,:), y_complete{i}] = cachedSimulation(models{i,MODEL_FUN},time,parameters,initial,1);
         fprintf('%s. \n', models{i});
     catch
         fprintf('%s! \n', models{i});